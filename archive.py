@@ -0,0 +1,303 @@
+# archive.py
+"""
+Archival tiering: attendance older than a horizon and separated employees (with all their
+attendance / separation / exam rows) move out of the hot tables into an archive database
+next to DB_FILE (<db>_archive.db), in batches of ARCHIVE_BATCH rows / employees per transaction.
+Each batch runs on the writer thread (writer.call()), so moves never race other writes for the lock.
+Rows keep their ids (AUTOINCREMENT never reuses them), so main + archive unions stay unique on id.
+
+Moves run with db_state.mode = 'archive', so they are not journaled for sync (archiving is
+local housekeeping, not a deletion). main.archive_state records the span of dates moved per table
+(attendance_min_date / attendance_max_date, separation_min_date / separation_max_date), whether the
+rows went by age (archive_attendance()) or with a separated employee (archive_separated()).
+report_sources() attaches the archive only when a requested date range overlaps that span; its
+unions skip archive rows whose id is also in main (e.g. after restoring an older backup).
+Employees removed with employee.delete_employee() are archived with archive_reason 'deleted': their history
+is kept but left out of reports, as before.
+"""
+import os
+from datetime import date, timedelta
+import db
+from db import get_conn, ensure_date_str
+import employee
+import writer
+
+ARCHIVE_HORIZON_DAYS = 730      # attendance older than this moves to the archive
+SEPARATED_GRACE_DAYS = 90       # separated staff move this long after their end/separation date
+ARCHIVE_BATCH = 5000
+
+ATTENDANCE_COLUMNS = ["id", "p_no", "date", "status"]
+SEPARATION_COLUMNS = ["id", "p_no", "name", "separation_date", "reason"]
+EXAM_COLUMNS = ["id", "p_no", "name", "exam_type", "exam_date", "marks"]
+
+_ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS archive.employees (
+        p_no TEXT PRIMARY KEY, name TEXT, phone TEXT, dob TEXT, doj TEXT, end_date TEXT,
+        ticket_no TEXT, shop TEXT, category TEXT, archived_at TEXT, archive_reason TEXT)""",
+    """CREATE TABLE IF NOT EXISTS archive.attendance (
+        id INTEGER PRIMARY KEY, p_no TEXT NOT NULL, date TEXT NOT NULL, status TEXT NOT NULL,
+        UNIQUE (p_no, date))""",
+    """CREATE TABLE IF NOT EXISTS archive.separation (
+        id INTEGER PRIMARY KEY, p_no TEXT NOT NULL, name TEXT, separation_date TEXT NOT NULL, reason TEXT)""",
+    """CREATE TABLE IF NOT EXISTS archive.exam_marks (
+        id INTEGER PRIMARY KEY, p_no TEXT NOT NULL, name TEXT, exam_type TEXT NOT NULL, exam_date TEXT, marks REAL)""",
+    "CREATE INDEX IF NOT EXISTS archive.idx_attendance_date ON attendance(date)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_separation_date ON separation(separation_date)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_separation_pno ON separation(p_no)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_exam_marks_pno ON exam_marks(p_no)",
+]
+
+
+def archive_path(db_file=None):
+    """Archive database for db_file (default DB_FILE): <stem>_archive.db in the same folder."""
+    db_file = db_file or db.DB_FILE
+    stem, _ = os.path.splitext(os.path.abspath(db_file))
+    return stem + "_archive.db"
+
+
+def _get_state(cur, key):
+    cur.execute("SELECT value FROM archive_state WHERE key = ?", (key,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _raise_state(cur, key, value):
+    """archive_state[key] = max(current, value) (ISO dates compare as strings)."""
+    if value is None:
+        return
+    cur.execute("""
+        INSERT INTO archive_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)
+    """, (key, value))
+
+
+def _lower_state(cur, key, value):
+    """archive_state[key] = min(current, value)."""
+    if value is None:
+        return
+    cur.execute("""
+        INSERT INTO archive_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = MIN(value, excluded.value)
+    """, (key, value))
+
+
+def _record_span(cur, table, date_col, where):
+    """Widen the archived date span of table by the rows of main.table matching where."""
+    cur.execute(f"SELECT MIN({date_col}), MAX({date_col}) FROM main.{table} WHERE {where}")
+    oldest, newest = cur.fetchone()
+    _lower_state(cur, f"{table}_min_date", oldest)
+    _raise_state(cur, f"{table}_max_date", newest)
+
+
+# ---------------------------
+# Reads
+# ---------------------------
+
+def report_sources(date_from=None, table="attendance", date_to=None):
+    """
+    Decide whether a report over `table` ('attendance' or 'separation') for date_from..date_to
+    (either end open when None) needs archived rows. Returns (attach, sources):
+      attach  -> {"archive": path} for db.get_conn(attach), or None
+      sources -> {"employees": sql, table: sql} table expressions to put after FROM/JOIN
+    Without the archive the expressions are just the plain table names.
+    """
+    sources = {"employees": "employees", table: table}
+    with get_conn() as conn:
+        cur = conn.cursor()
+        oldest, newest = _get_state(cur, f"{table}_min_date"), _get_state(cur, f"{table}_max_date")
+    if newest is None or (date_from and ensure_date_str(date_from) > newest):
+        return None, sources
+    # archives made before the span had a lower end have no min: treat as reaching back indefinitely
+    if oldest is not None and date_to and ensure_date_str(date_to) < oldest:
+        return None, sources
+    path = archive_path()
+    if not os.path.exists(path):
+        return None, sources
+    cols = ", ".join({"attendance": ATTENDANCE_COLUMNS, "separation": SEPARATION_COLUMNS}[table])
+    deleted = "(SELECT p_no FROM archive.employees WHERE archive_reason = 'deleted')"
+    sources[table] = (f"(SELECT {cols} FROM main.{table} UNION ALL "
+                      f"SELECT {cols} FROM archive.{table} WHERE p_no NOT IN {deleted} "
+                      f"AND id NOT IN (SELECT id FROM main.{table}))")
+    sources["employees"] = ("(SELECT p_no, name FROM main.employees UNION ALL "
+                            "SELECT p_no, name FROM archive.employees WHERE archive_reason <> 'deleted' "
+                            "AND p_no NOT IN (SELECT p_no FROM main.employees))")
+    return {"archive": path}, sources
+
+
+def archive_stats():
+    """Row counts in the archive database plus the archive_state markers."""
+    path = archive_path()
+    out = {"path": path, "exists": os.path.exists(path)}
+    with get_conn({"archive": path} if out["exists"] else None) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT key, value FROM archive_state")
+        out["state"] = dict(cur.fetchall())
+        if out["exists"]:
+            for t in ("employees", "attendance", "separation", "exam_marks"):
+                cur.execute(f"SELECT COUNT(*) FROM archive.{t}")
+                out[t] = cur.fetchone()[0]
+    return out
+
+
+# ---------------------------
+# Moves
+# ---------------------------
+
+def attach_archive(cur, db_file=None):
+    """ATTACH the archive of db_file (default DB_FILE) as 'archive' on cur and create its tables; outside a transaction."""
+    cur.execute("ATTACH DATABASE ? AS archive", (archive_path(db_file),))
+    for sql in _ARCHIVE_SCHEMA:
+        cur.execute(sql)
+    cur.connection.commit()
+
+
+def _open_for_move():
+    conn = db._connect()
+    cur = conn.cursor()
+    cur.execute("PRAGMA foreign_keys = ON")
+    attach_archive(cur)
+    return conn, cur
+
+
+def _run_move(fn, *args):
+    """
+    fn(conn, cur, *args) on the writer thread (writer.call()) with its own connection that has the
+    archive attached. Each batch is a separate call, so interactive writes go in between batches.
+    """
+    def run():
+        conn, cur = _open_for_move()
+        try:
+            return fn(conn, cur, *args)
+        finally:
+            conn.close()
+    return writer.call(run).result()
+
+
+def _begin(cur, mode):
+    cur.execute("BEGIN IMMEDIATE")
+    if mode:
+        cur.execute("UPDATE db_state SET mode = ? WHERE id = 1", (mode,))
+
+
+def _commit(conn, cur, mode):
+    if mode:
+        cur.execute("UPDATE db_state SET mode = 'normal' WHERE id = 1")
+    conn.commit()
+
+
+def _attendance_batch(conn, cur, cutoff, batch_size):
+    """Move up to batch_size attendance rows dated before cutoff in one transaction; returns rows moved."""
+    cols = ", ".join(ATTENDANCE_COLUMNS)
+    _begin(cur, "archive")
+    try:
+        cur.execute("DROP TABLE IF EXISTS temp._archive_batch")
+        cur.execute("CREATE TEMP TABLE _archive_batch AS SELECT id FROM main.attendance WHERE date < ? LIMIT ?",
+                    (cutoff, int(batch_size)))
+        cur.execute("SELECT COUNT(*) FROM _archive_batch")
+        n = cur.fetchone()[0]
+        if n:
+            cur.execute(f"INSERT OR REPLACE INTO archive.attendance ({cols}) "
+                        f"SELECT {cols} FROM main.attendance WHERE id IN (SELECT id FROM _archive_batch)")
+            _record_span(cur, "attendance", "date", "id IN (SELECT id FROM _archive_batch)")
+            cur.execute("DELETE FROM main.attendance WHERE id IN (SELECT id FROM _archive_batch)")
+        cur.execute("DROP TABLE temp._archive_batch")
+        _commit(conn, cur, "archive")
+    except Exception:
+        conn.rollback()
+        raise
+    return n
+
+
+def archive_attendance(before=None, horizon_days=ARCHIVE_HORIZON_DAYS, batch_size=ARCHIVE_BATCH, progress=None):
+    """
+    Move attendance rows dated before `before` (default: today - horizon_days) to the archive,
+    batch_size rows per transaction. progress: optional callable(moved_so_far). Returns rows moved.
+    """
+    cutoff = ensure_date_str(before) if before else (date.today() - timedelta(days=horizon_days)).isoformat()
+    moved = 0
+    while True:
+        n = _run_move(_attendance_batch, cutoff, batch_size)
+        if not n:
+            break
+        moved += n
+        if progress:
+            progress(moved)
+    return moved
+
+
+def move_employees_in(cur, p_no_sql, reason, params=()):
+    """
+    Inside cur's open transaction (archive attached, see attach_archive()), move the employees whose
+    p_no the query p_no_sql returns, with all their attendance / separation / exam rows, to the
+    archive under archive_reason `reason`. Returns the number of employees moved.
+    """
+    cur.execute("DROP TABLE IF EXISTS temp._archive_emps")
+    cur.execute("CREATE TEMP TABLE _archive_emps (p_no TEXT PRIMARY KEY)")
+    cur.execute(f"INSERT OR IGNORE INTO _archive_emps (p_no) {p_no_sql}", params)
+    in_batch = "p_no IN (SELECT p_no FROM _archive_emps)"
+    emp_cols = ", ".join(employee.EMPLOYEE_COLUMNS)
+    cur.execute(f"INSERT OR REPLACE INTO archive.employees ({emp_cols}, archived_at, archive_reason) "
+                f"SELECT {emp_cols}, datetime('now'), ? FROM main.employees WHERE {in_batch}", (reason,))
+    moved = cur.rowcount
+    for table, cols in (("attendance", ATTENDANCE_COLUMNS), ("separation", SEPARATION_COLUMNS),
+                        ("exam_marks", EXAM_COLUMNS)):
+        c = ", ".join(cols)
+        cur.execute(f"INSERT OR REPLACE INTO archive.{table} ({c}) SELECT {c} FROM main.{table} WHERE {in_batch}")
+    if reason != "deleted":
+        # reports over these dates must now look in the archive too
+        _record_span(cur, "attendance", "date", in_batch)
+        _record_span(cur, "separation", "separation_date", in_batch)
+    # cascades to attendance / separation / exam_marks
+    cur.execute(f"DELETE FROM main.employees WHERE {in_batch}")
+    cur.execute("DROP TABLE temp._archive_emps")
+    return moved
+
+
+def _move_employees(conn, cur, p_nos, mode, reason):
+    """Move the employees in p_nos and all their rows to the archive in one transaction."""
+    _begin(cur, mode)
+    try:
+        cur.execute("DROP TABLE IF EXISTS temp._archive_list")
+        cur.execute("CREATE TEMP TABLE _archive_list (p_no TEXT)")
+        cur.executemany("INSERT INTO _archive_list (p_no) VALUES (?)", [(str(p),) for p in p_nos])
+        moved = move_employees_in(cur, "SELECT p_no FROM _archive_list", reason)
+        cur.execute("DROP TABLE temp._archive_list")
+        _commit(conn, cur, mode)
+    except Exception:
+        conn.rollback()
+        raise
+    return moved
+
+
+def archive_separated(before=None, grace_days=SEPARATED_GRACE_DAYS, batch_size=ARCHIVE_BATCH, progress=None):
+    """
+    Move employees whose end_date or separation_date is before `before`
+    (default: today - grace_days) to the archive with all their rows,
+    batch_size employees per transaction. Returns the number of employees moved.
+    """
+    cutoff = ensure_date_str(before) if before else (date.today() - timedelta(days=grace_days)).isoformat()
+    moved = 0
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT p_no FROM main.employees e
+            WHERE (e.end_date >= '0000' AND e.end_date < ?)
+               OR EXISTS (SELECT 1 FROM main.separation s WHERE s.p_no = e.p_no AND s.separation_date < ?)
+        """, (cutoff, cutoff))
+        p_nos = [r[0] for r in cur.fetchall()]
+    for i in range(0, len(p_nos), int(batch_size)):
+        moved += _run_move(_move_employees, p_nos[i:i + int(batch_size)], "archive", "separated")
+        if progress:
+            progress(moved)
+    if moved:
+        employee.invalidate_employee_cache()
+    return moved
+
+
+def archive_employees(p_nos):
+    """
+    Remove employees from the hot tables but keep their history in the archive (archive_reason 'deleted',
+    not shown in reports). Unlike the bulk moves this is journaled, so synced offices see the delete.
+    Returns the number of employees moved.
+    """
+    return _run_move(_move_employees, p_nos, None, "deleted")
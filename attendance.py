@@ -1,9 +1,16 @@
 # attendance.py
-from db import get_conn, ensure_date_str
+from db import get_conn, ensure_date_str, fetch
 import pandas as pd
-from utils import load_dataframe_from_file, map_columns_case_insensitive
-from datetime import datetime, timedelta
+from utils import (load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file,
+                   stream_dataframe_to_file, normalize_date_series, normalize_id_series)
+from datetime import datetime, timedelta, date
+import calendar
+import numpy as np
 import employee
+import archive
+import import_batch
+import result_cache
+import writer
 import random
 
 VALID_STATUSES = {"present": "Present", "p": "Present",
@@ -11,6 +18,11 @@ VALID_STATUSES = {"present": "Present", "p": "Present",
                   "leave": "Leave", "l": "Leave"}
 
 
+# attendance is UNIQUE (p_no, date); a manual edit detaches the row from its import batch
+_UPSERT_ATTENDANCE_SQL = ("INSERT INTO attendance (p_no, date, status) VALUES (?, ?, ?) "
+                          "ON CONFLICT(p_no, date) DO UPDATE SET status = excluded.status, batch_id = NULL")
+
+
 def normalize_status(s):
     if s is None:
         return None
@@ -18,38 +30,37 @@ def normalize_status(s):
     return VALID_STATUSES.get(s, s.capitalize())
 
 
-def mark_attendance(p_no, date_str, status):
-    date_norm = ensure_date_str(date_str)
-    status_norm = normalize_status(status)
-    if not status_norm:
-        raise ValueError("Invalid status")
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("INSERT INTO attendance (p_no, date, status) VALUES (?, ?, ?)",
-                    (str(p_no), date_norm, status_norm))
-        conn.commit()
+def mark_attendance(p_no, date_str, status, wait=True):
+    return update_attendance(p_no, date_str, status, wait=wait)
 
 
-def update_attendance(p_no, date_str, status):
+def update_attendance(p_no, date_str, status, wait=True):
     """
-    Replace existing attendance for p_no + date, then insert new record.
+    Set the attendance status for p_no + date (one row per p_no/date, replaced if present).
+    Written by the writer thread; wait=False returns its Future instead of blocking.
     """
     date_norm = ensure_date_str(date_str)
     status_norm = normalize_status(status)
     if not status_norm:
         raise ValueError("Invalid status")
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM attendance WHERE p_no = ? AND date = ?", (str(p_no), date_norm))
-        cur.execute("INSERT INTO attendance (p_no, date, status) VALUES (?, ?, ?)",
-                    (str(p_no), date_norm, status_norm))
-        conn.commit()
+    params = (str(p_no), date_norm, status_norm)
+
+    def op(cur):
+        cur.execute(_UPSERT_ATTENDANCE_SQL, params)
+    return writer.execute(op, wait=wait)
+
+
+def _report_conn(date_from=None, date_to=None):
+    """Connection + {table: sql} sources for a report over date_from..date_to (archive attached if it overlaps)."""
+    attach, sources = archive.report_sources(date_from, "attendance", date_to)
+    return get_conn(attach), sources
 
 
 def get_leave_count_for_employee(p_no, date_from=None, date_to=None):
-    with get_conn() as conn:
+    report_conn, src = _report_conn(date_from, date_to)
+    with report_conn as conn:
         cur = conn.cursor()
-        q = "SELECT COUNT(*) FROM attendance WHERE p_no = ? AND status = 'Leave'"
+        q = f"SELECT COUNT(*) FROM {src['attendance']} WHERE p_no = ? AND status = 'Leave'"
         params = [str(p_no)]
         if date_from:
             q += " AND date >= ?"
@@ -62,9 +73,10 @@ def get_leave_count_for_employee(p_no, date_from=None, date_to=None):
 
 
 def get_absent_count_for_employee(p_no, date_from=None, date_to=None):
-    with get_conn() as conn:
+    report_conn, src = _report_conn(date_from, date_to)
+    with report_conn as conn:
         cur = conn.cursor()
-        q = "SELECT COUNT(*) FROM attendance WHERE p_no = ? AND status = 'Absent'"
+        q = f"SELECT COUNT(*) FROM {src['attendance']} WHERE p_no = ? AND status = 'Absent'"
         params = [str(p_no)]
         if date_from:
             q += " AND date >= ?"
@@ -76,119 +88,231 @@ def get_absent_count_for_employee(p_no, date_from=None, date_to=None):
         return cur.fetchone()[0]
 
 
-def find_employees_with_leave_count(target_count, date_from=None, date_to=None):
+def find_employees_with_leave_count(target_count, date_from=None, date_to=None, form="records"):
     """
-    Returns list of p_no with leave_count == target_count within date range.
+    Returns rows (p_no, name, leave_count) with leave_count == target_count within date range.
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        q = """
-        SELECT e.p_no, e.name, COUNT(a.id) as leave_count
-        FROM employees e
-        LEFT JOIN attendance a ON e.p_no = a.p_no AND a.status = 'Leave'
-        WHERE 1=1
-        """
-        params = []
-        if date_from:
-            q += " AND a.date >= ?"
-            params.append(ensure_date_str(date_from))
-        if date_to:
-            q += " AND a.date <= ?"
-            params.append(ensure_date_str(date_to))
-        q += " GROUP BY e.p_no HAVING leave_count = ? ORDER BY e.name"
-        params.append(int(target_count))
-        cur.execute(q, params)
-        rows = cur.fetchall()
-    return [{"p_no": r[0], "name": r[1], "leave_count": r[2]} for r in rows]
-
-
-def find_employees_with_absent_count(target_count, date_from=None, date_to=None):
+    attach, src = archive.report_sources(date_from, "attendance", date_to)
+    q = f"""
+    SELECT e.p_no, e.name, COUNT(a.id) as leave_count
+    FROM {src['employees']} e
+    LEFT JOIN {src['attendance']} a ON e.p_no = a.p_no AND a.status = 'Leave'
+    WHERE 1=1
     """
-    Returns list of p_no with absent_count == target_count within date range.
+    params = []
+    if date_from:
+        q += " AND a.date >= ?"
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        q += " AND a.date <= ?"
+        params.append(ensure_date_str(date_to))
+    q += " GROUP BY e.p_no HAVING leave_count = ? ORDER BY e.name"
+    params.append(int(target_count))
+    return fetch(q, params, form=form, attach=attach)
+
+
+def find_employees_with_absent_count(target_count, date_from=None, date_to=None, form="records"):
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        q = """
-        SELECT e.p_no, e.name, COUNT(a.id) as absent_count
-        FROM employees e
-        LEFT JOIN attendance a ON e.p_no = a.p_no AND a.status = 'Absent'
-        WHERE 1=1
-        """
-        params = []
-        if date_from:
-            q += " AND a.date >= ?"
-            params.append(ensure_date_str(date_from))
-        if date_to:
-            q += " AND a.date <= ?"
-            params.append(ensure_date_str(date_to))
-        q += " GROUP BY e.p_no HAVING absent_count = ? ORDER BY e.name"
-        params.append(int(target_count))
-        cur.execute(q, params)
-        rows = cur.fetchall()
-    return [{"p_no": r[0], "name": r[1], "absent_count": r[2]} for r in rows]
-
-
-def get_attendance_summary(date_from=None, date_to=None, sort_by=None):
+    Returns rows (p_no, name, absent_count) with absent_count == target_count within date range.
+    """
+    attach, src = archive.report_sources(date_from, "attendance", date_to)
+    q = f"""
+    SELECT e.p_no, e.name, COUNT(a.id) as absent_count
+    FROM {src['employees']} e
+    LEFT JOIN {src['attendance']} a ON e.p_no = a.p_no AND a.status = 'Absent'
+    WHERE 1=1
+    """
+    params = []
+    if date_from:
+        q += " AND a.date >= ?"
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        q += " AND a.date <= ?"
+        params.append(ensure_date_str(date_to))
+    q += " GROUP BY e.p_no HAVING absent_count = ? ORDER BY e.name"
+    params.append(int(target_count))
+    return fetch(q, params, form=form, attach=attach)
+
+
+@result_cache.cached("attendance", "employees")
+def get_attendance_summary(date_from=None, date_to=None, sort_by=None, form="records"):
     """
     Returns summary with counts of Present/Absent/Leave per employee in range.
     sort_by: None or 'absent' or 'leave' (descending)
+    form: 'records' (p_no, name, present, absent, leave), 'dicts', 'tuples', 'frame' or 'arrays' (db.fetch()).
+    Served from result_cache until attendance or employees change.
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        q = """
-        SELECT e.p_no, e.name,
-            SUM(CASE WHEN a.status='Present' THEN 1 ELSE 0 END) as present_count,
-            SUM(CASE WHEN a.status='Absent' THEN 1 ELSE 0 END) as absent_count,
-            SUM(CASE WHEN a.status='Leave' THEN 1 ELSE 0 END) as leave_count
-        FROM employees e
-        LEFT JOIN attendance a ON e.p_no = a.p_no
-        WHERE 1=1
-        """
-        params = []
-        if date_from:
-            q += " AND a.date >= ?"
-            params.append(ensure_date_str(date_from))
-        if date_to:
-            q += " AND a.date <= ?"
-            params.append(ensure_date_str(date_to))
-        q += " GROUP BY e.p_no, e.name"
-        if sort_by == "absent":
-            q += " ORDER BY absent_count DESC"
-        elif sort_by == "leave":
-            q += " ORDER BY leave_count DESC"
-        else:
-            q += " ORDER BY e.name"
-        cur.execute(q, params)
-        rows = cur.fetchall()
-    results = []
-    for r in rows:
-        results.append({
-            "p_no": r[0],
-            "name": r[1],
-            "present": r[2],
-            "absent": r[3],
-            "leave": r[4]
-        })
-    return results
-
-
-def get_attendance_for_date(date_value):
+    attach, src = archive.report_sources(date_from, "attendance", date_to)
+    q = f"""
+    SELECT e.p_no, e.name,
+        SUM(CASE WHEN a.status='Present' THEN 1 ELSE 0 END) as present,
+        SUM(CASE WHEN a.status='Absent' THEN 1 ELSE 0 END) as absent,
+        SUM(CASE WHEN a.status='Leave' THEN 1 ELSE 0 END) as leave
+    FROM {src['employees']} e
+    LEFT JOIN {src['attendance']} a ON e.p_no = a.p_no
+    WHERE 1=1
+    """
+    params = []
+    if date_from:
+        q += " AND a.date >= ?"
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        q += " AND a.date <= ?"
+        params.append(ensure_date_str(date_to))
+    q += " GROUP BY e.p_no, e.name"
+    if sort_by == "absent":
+        q += " ORDER BY absent DESC"
+    elif sort_by == "leave":
+        q += " ORDER BY leave DESC"
+    else:
+        q += " ORDER BY e.name"
+    return fetch(q, params, form=form, attach=attach)
+
+
+@result_cache.cached("attendance", "employees")
+def get_attendance_for_date(date_value, shop=None, category=None, form="records"):
     """
-    Return list of dicts for every employee with status on given date.
+    Return a row for every employee with status on given date.
     date_value may be a date string or date object. Returned status is 'Present'/'Absent'/'Leave' or 'Not Recorded'.
+    shop/category: only current employees of that shop / category (the muster roll of one shop).
+    form: 'records' (p_no, name, status), 'dicts', 'tuples', 'frame' or 'arrays' (db.fetch()).
     """
     date_norm = ensure_date_str(date_value)
-    with get_conn() as conn:
-        cur = conn.cursor()
-        q = """
-        SELECT e.p_no, e.name, COALESCE(a.status, 'Not Recorded') as status
-        FROM employees e
-        LEFT JOIN attendance a ON e.p_no = a.p_no AND a.date = ?
-        ORDER BY e.p_no
-        """
-        cur.execute(q, (date_norm,))
-        rows = cur.fetchall()
-    return [{"p_no": r[0], "name": r[1], "status": r[2]} for r in rows]
+    attach, src = archive.report_sources(date_norm, "attendance", date_norm)
+    q = f"""
+    SELECT e.p_no, e.name, COALESCE(a.status, 'Not Recorded') as status
+    FROM {src['employees']} e
+    LEFT JOIN {src['attendance']} a ON e.p_no = a.p_no AND a.date = ?
+    WHERE 1=1
+    """
+    params = [date_norm]
+    # shop / category live on the current employees table only
+    if shop:
+        q += " AND e.p_no IN (SELECT p_no FROM main.employees WHERE shop = ?)"
+        params.append(shop)
+    if category:
+        q += " AND e.p_no IN (SELECT p_no FROM main.employees WHERE category = ?)"
+        params.append(category)
+    q += " ORDER BY e.p_no"
+    return fetch(q, params, form=form, attach=attach)
+
+
+def save_muster(date_value, statuses, wait=True):
+    """
+    Save a muster roll for one date in a single write: statuses maps p_no -> status
+    ('Present'/'Absent'/'Leave' or P/A/L; None or 'Not Recorded' removes the day's row).
+    Every status is checked before anything is written; an unknown one raises ValueError.
+    Returns {"saved": rows upserted, "cleared": rows removed}; wait=False returns the Future.
+    """
+    date_norm = ensure_date_str(date_value)
+    upserts, clears = [], []
+    for p_no, status in statuses.items():
+        if status is None or str(status).strip().lower() in ("", "not recorded"):
+            clears.append((str(p_no), date_norm))
+            continue
+        status_norm = normalize_status(status)
+        if status_norm not in ("Present", "Absent", "Leave"):
+            raise ValueError(f"Invalid status for {p_no}: {status}")
+        upserts.append((str(p_no), date_norm, status_norm))
+
+    def op(cur):
+        cur.executemany(_UPSERT_ATTENDANCE_SQL, upserts)
+        cur.executemany("DELETE FROM attendance WHERE p_no = ? AND date = ?", clears)
+        return {"saved": len(upserts), "cleared": cur.rowcount if clears else 0}
+    return writer.execute(op, wait=wait)
+
+
+def export_attendance_summary(path, date_from=None, date_to=None, sort_by=None):
+    """
+    Export get_attendance_summary() for the given range to CSV / XLSX / JSON.
+    """
+    df = get_attendance_summary(date_from=date_from, date_to=date_to, sort_by=sort_by, form="frame")
+    save_dataframe_to_file(df, path)
+    return path
+
+
+# status -> code in a muster register cell; days without a row stay blank
+MUSTER_CODES = {"Present": "P", "Absent": "A", "Leave": "L"}
+
+
+def _month_bounds(month):
+    """(first day, number of days) of month: 'YYYY-MM', any date string in it, or a date / datetime."""
+    if isinstance(month, str):
+        text = month.strip()
+        try:
+            first = datetime.strptime(text[:7], "%Y-%m").date()
+        except ValueError:
+            first = datetime.strptime(ensure_date_str(text), "%Y-%m-%d").date().replace(day=1)
+    elif hasattr(month, "year") and hasattr(month, "month"):
+        first = date(month.year, month.month, 1)
+    else:
+        raise ValueError(f"Invalid month: {month!r}. Use YYYY-MM or a date")
+    return first, calendar.monthrange(first.year, first.month)[1]
+
+
+@result_cache.cached("attendance", "employees")
+def muster_register(month, shop=None, category=None):
+    """
+    Monthly muster register as a DataFrame: one row per employee (p_no, name), one column per
+    day ('01'..'31') holding P / A / L ('' when nothing is recorded), then the totals
+    present, absent, leave and not_recorded.
+    The month comes from one query (employees joined to their attendance rows of the month on the
+    (p_no, date) index); the grid is filled with NumPy in one scatter.
+    shop/category: only current employees of that shop / category, as in get_attendance_for_date().
+    """
+    first, days = _month_bounds(month)
+    date_from = first.isoformat()
+    date_to = first.replace(day=days).isoformat()
+    attach, src = archive.report_sources(date_from, "attendance", date_to)
+    q = f"""
+    SELECT e.p_no, e.name, COALESCE(CAST(substr(a.date, 9, 2) AS INTEGER), 0) AS day,
+        CASE a.status WHEN 'Present' THEN 1 WHEN 'Absent' THEN 2 WHEN 'Leave' THEN 3 ELSE 0 END AS code
+    FROM {src['employees']} e
+    LEFT JOIN {src['attendance']} a ON a.p_no = e.p_no AND a.date >= ? AND a.date <= ?
+    WHERE 1=1
+    """
+    params = [date_from, date_to]
+    if shop:
+        q += " AND e.p_no IN (SELECT p_no FROM main.employees WHERE shop = ?)"
+        params.append(shop)
+    if category:
+        q += " AND e.p_no IN (SELECT p_no FROM main.employees WHERE category = ?)"
+        params.append(category)
+    q += " ORDER BY e.p_no"
+    cols = fetch(q, params, form="arrays", attach=attach, categorical=())
+
+    day_cols = [f"{d:02d}" for d in range(1, days + 1)]
+    p_no = cols["p_no"]
+    if not len(p_no):
+        return pd.DataFrame(columns=["p_no", "name"] + day_cols + ["present", "absent", "leave", "not_recorded"])
+    # rows arrive ordered by p_no: a new employee starts wherever p_no changes; employees without
+    # attendance in the month come back once with day 0
+    new = np.r_[True, p_no[1:] != p_no[:-1]]
+    starts = np.flatnonzero(new)
+    row = np.cumsum(new) - 1
+    day = cols["day"].astype(np.int64)
+    hit = day > 0
+    codes = np.zeros((len(starts), days), dtype=np.int8)
+    codes[row[hit], day[hit] - 1] = cols["code"][hit]
+
+    grid = np.array(["", "P", "A", "L"], dtype=object)[codes]
+    df = pd.DataFrame(grid, columns=day_cols)
+    df.insert(0, "name", cols["name"][starts])
+    df.insert(0, "p_no", p_no[starts])
+    for label, c in (("present", 1), ("absent", 2), ("leave", 3), ("not_recorded", 0)):
+        df[label] = (codes == c).sum(axis=1)
+    return df
+
+
+def export_muster_register(month, shop=None, category=None, path=None):
+    """
+    Write muster_register(month, shop, category) to path (.csv / .xlsx streamed, .json as usual).
+    Returns the path.
+    """
+    if not path:
+        raise ValueError("path is required")
+    stream_dataframe_to_file(muster_register(month, shop=shop, category=category), path)
+    return path
 
 
 def _attempt_infer_column(df, want):
@@ -219,6 +343,10 @@ def bulk_upload_attendance(filepath, create_missing=False):
     Expects at least: p_no, date, status. Uses utils to map columns.
     If create_missing=True then missing employees (p_no not in employees table)
     will be created automatically (name column used if available).
+
+    The file is validated column-wise and written as one writer op and one import batch
+    (import_batch.py): rows are staged in a temp table, the statuses they replace are saved for
+    rollback_batch(), and a single upsert applies them. For repeated p_no + date rows the last wins.
     Returns tuple: (inserted_attendance_rows, created_employee_count)
     """
     df = load_dataframe_from_file(filepath)
@@ -240,87 +368,74 @@ def bulk_upload_attendance(filepath, create_missing=False):
         missing = [k for k in ("p_no","date","status") if not mapping.get(k)]
         raise ValueError(f"bulk_upload_attendance: required columns missing or not detected: {missing}")
 
-    inserted = 0
-    created = 0
-    skipped = 0
-
-    for idx, row in df.iterrows():
-        try:
-            p_raw = row.get(mapping.get("p_no")) if mapping.get("p_no") in df.columns else row.get(mapping.get("p_no"), None)
-            d_raw = row.get(mapping.get("date")) if mapping.get("date") in df.columns else row.get(mapping.get("date"), None)
-            s_raw = row.get(mapping.get("status")) if mapping.get("status") in df.columns else row.get(mapping.get("status"), None)
-
-            # Skip rows missing required fields
-            if pd.isna(p_raw) or pd.isna(d_raw):
-                skipped += 1
-                continue
-
-            p_str = str(p_raw).strip()
-
-            # normalize/validate date
-            try:
-                d_norm = ensure_date_str(d_raw)
-            except Exception as e:
-                skipped += 1
-                print(f"bulk_upload_attendance skip row {idx}: invalid date {d_raw} -> {e}")
-                continue
-
-            # normalize/validate status
-            status_norm = normalize_status(s_raw)
-            if not status_norm:
-                skipped += 1
-                print(f"bulk_upload_attendance skip row {idx}: invalid status '{s_raw}'")
-                continue
-
-            # check if employee exists
-            with get_conn() as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT COUNT(*) FROM employees WHERE p_no = ?", (p_str,))
-                exists = cur.fetchone()[0] > 0
-
-            if not exists and create_missing:
-                # try to get name from file, otherwise create placeholder
-                name = None
-                name_col = mapping.get("name")
-                if name_col and name_col in df.columns:
-                    nm = row.get(name_col)
-                    if not pd.isna(nm):
-                        name = str(nm).strip()
-                if not name:
-                    name = f"Employee_{p_str}"
-                # create minimal employee record
-                try:
-                    employee.add_employee(p_no=p_str, name=name)
-                    created += 1
-                except Exception as e:
-                    # failed to create employee — skip this attendance row
-                    skipped += 1
-                    print(f"bulk_upload_attendance: failed to create employee {p_str}: {e}")
-                    continue
-
-            # Ensure the employee exists now
-            with get_conn() as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT COUNT(*) FROM employees WHERE p_no = ?", (p_str,))
-                exists_after = cur.fetchone()[0] > 0
-            if not exists_after:
-                skipped += 1
-                continue
-
-            # Use update_attendance to replace any existing entry for that p_no/date
-            try:
-                update_attendance(p_str, d_norm, status_norm)
-                inserted += 1
-            except Exception as e:
-                skipped += 1
-                print(f"bulk_upload_attendance skip row {idx}: {e}")
-
-        except Exception as e:
-            skipped += 1
-            print("bulk_upload_attendance outer skip:", idx, e)
-
+    name_col = mapping.get("name")
+    frame = pd.DataFrame({
+        "p_no": df[mapping["p_no"]],
+        "date": df[mapping["date"]],
+        "status": df[mapping["status"]],
+        "name": df[name_col] if name_col in df.columns else None,
+    })
+    total = len(frame)
+    frame = frame[frame["p_no"].notna() & frame["date"].notna()]
+    frame["p_no"] = normalize_id_series(frame["p_no"])
+    frame["date"] = normalize_date_series(frame["date"])
+    # each distinct raw status is normalized once
+    codes = {v: normalize_status(v) for v in frame["status"].dropna().unique()}
+    frame["status"] = frame["status"].map(codes)
+    frame = frame[frame["date"].notna() & frame["status"].notna() & (frame["status"] != "") & (frame["p_no"] != "")]
+    invalid = total - len(frame)
+    frame = frame.drop_duplicates(subset=["p_no", "date"], keep="last")
+
+    known = employee.known_p_nos()
+    unknown_mask = ~frame["p_no"].isin(known)
+    new_employees = []
+    unknown = 0
+    if unknown_mask.any():
+        if create_missing:
+            # name from the file when present, otherwise a placeholder
+            names = frame.loc[unknown_mask, ["p_no", "name"]].dropna(subset=["name"]).drop_duplicates("p_no")
+            named = {p: str(n).strip() for p, n in zip(names["p_no"], names["name"]) if str(n).strip()}
+            new_employees = [(p, named.get(p) or f"Employee_{p}")
+                             for p in frame.loc[unknown_mask, "p_no"].unique()]
+        else:
+            unknown = int(unknown_mask.sum())
+            frame = frame[~unknown_mask]
+
+    rows = list(zip(frame["p_no"], frame["date"], frame["status"]))
+
+    def write(cur):
+        created = 0
+        batch_id = import_batch.begin_batch(cur, "attendance", import_batch.source_name(filepath))
+        if new_employees:
+            cur.executemany("INSERT INTO employees (p_no, name, category, batch_id) VALUES (?, ?, 'Other', ?) "
+                            "ON CONFLICT(p_no) DO NOTHING", [(p, n, batch_id) for p, n in new_employees])
+            created = cur.rowcount
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS _attendance_stage (p_no TEXT, date TEXT, status TEXT)")
+        cur.execute("DELETE FROM temp._attendance_stage")
+        cur.executemany("INSERT INTO temp._attendance_stage VALUES (?, ?, ?)", rows)
+        import_batch.capture_attendance(cur, batch_id, "temp._attendance_stage")
+        # rows already holding the same status are left untouched (and unstamped)
+        cur.execute("""
+            INSERT INTO attendance (p_no, date, status, batch_id)
+            SELECT p_no, date, status, ? FROM temp._attendance_stage WHERE true
+            ON CONFLICT(p_no, date) DO UPDATE SET status = excluded.status, batch_id = excluded.batch_id
+            WHERE attendance.status IS NOT excluded.status
+        """, (batch_id,))
+        changed = cur.rowcount
+        cur.execute("DROP TABLE temp._attendance_stage")
+        import_batch.close_batch(cur, batch_id, changed + created)
+        return created
+
+    # one writer op: the whole file commits (or rolls back) as one unit
+    created = writer.execute(write)
+
+    if created:
+        employee.refresh_employee_cache([p for p, _ in new_employees])
+    inserted = len(rows)
+    skipped = invalid + unknown
     if skipped:
-        print(f"bulk_upload_attendance: inserted={inserted}, created={created}, skipped={skipped}")
+        print(f"bulk_upload_attendance: inserted={inserted}, created={created}, skipped={skipped} "
+              f"(invalid={invalid}, unknown p_no={unknown})")
     else:
         print(f"bulk_upload_attendance: inserted={inserted}, created={created}")
     return inserted, created
@@ -378,18 +493,21 @@ def auto_generate_attendance(date_from, date_to, present_pct=85, absent_pct=10,
     dates = list(_iter_dates_inclusive(date_from, date_to))
     inserted = 0
 
+    # queued without waiting, so the writer thread commits them in large groups
+    pending = []
     for emp in employees:
         p_no = emp.get("p_no")
         # for each date assign status by weighted random
         for d in dates:
             status = random.choices(status_choices, weights=weights, k=1)[0]
-            try:
-                # update_attendance will replace existing entry for that date
-                update_attendance(p_no, d, status)
-                inserted += 1
-            except Exception as e:
-                # skip problematic rows silently, but could log if needed
-                print(f"auto_generate_attendance: skip {p_no} {d}: {e}")
-                continue
+            # update_attendance will replace existing entry for that date
+            pending.append((p_no, d, update_attendance(p_no, d, status, wait=False)))
+    for p_no, d, fut in pending:
+        try:
+            fut.result()
+            inserted += 1
+        except Exception as e:
+            # skip problematic rows silently, but could log if needed
+            print(f"auto_generate_attendance: skip {p_no} {d}: {e}")
 
     return {"inserted": inserted, "employees_count": len(employees), "dates_count": len(dates)}
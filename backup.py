@@ -0,0 +1,287 @@
+# backup.py
+"""
+Online backups of the application database using sqlite3's backup API.
+
+- snapshot(label): whole-database copy in one backup step; used automatically before
+  destructive actions (delete all, delete employee, restore). Milliseconds for typical sizes.
+- start_backup(label): page-incremental copy in a background thread. Copies PAGES_PER_STEP
+  pages per step and sleeps between steps so writers are never blocked for long.
+- start_scheduler(hours): periodic background backups with rotation.
+- restore(path): verify a backup (integrity and schema version), migrate a copy of it next to the
+  live database and rename that copy over it (after a safety snapshot).
+
+Backups are plain SQLite files in BACKUP_DIR named <db>_<label>_<timestamp>.db; each label
+keeps its newest KEEP_PER_LABEL files. When the archive database exists it is copied alongside
+as <db>_<label>_<timestamp>_archive.db and restored with its backup.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+import archive
+import db
+import employee
+import migrations
+import result_cache
+import writer
+
+BACKUP_DIR = os.environ.get("EMP_BACKUP_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+KEEP_PER_LABEL = 10
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.005
+
+_NAME_RE = re.compile(r"^(?P<stem>.+)_(?P<label>[A-Za-z0-9-]+)_(?P<ts>\d{8}_\d{6}_\d{6})\.db$")
+
+_scheduler = {"thread": None, "stop": None}
+
+
+def _clean_label(label):
+    return re.sub(r"[^A-Za-z0-9-]+", "-", str(label or "manual")).strip("-") or "manual"
+
+
+def _backup_path(label):
+    stem = os.path.splitext(os.path.basename(db.DB_FILE))[0]
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(BACKUP_DIR, f"{stem}_{_clean_label(label)}_{ts}.db")
+
+
+def _copy(src_path, dest_path, pages=-1, progress=None):
+    """sqlite3 backup src_path -> dest_path. pages=-1 copies everything in one step."""
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        with dst:
+            src.backup(dst, pages=pages, progress=progress, sleep=STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+
+def list_backups(label=None):
+    """Return backups of the current database, newest first: dicts with path, label, created, size."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    stem = os.path.splitext(os.path.basename(db.DB_FILE))[0]
+    out = []
+    for name in os.listdir(BACKUP_DIR):
+        m = _NAME_RE.match(name)
+        if not m or m.group("stem") != stem:
+            continue
+        if label and m.group("label") != _clean_label(label):
+            continue
+        path = os.path.join(BACKUP_DIR, name)
+        out.append({"path": path, "label": m.group("label"),
+                    "created": datetime.strptime(m.group("ts"), "%Y%m%d_%H%M%S_%f"),
+                    "size": os.path.getsize(path)})
+    out.sort(key=lambda b: b["created"], reverse=True)
+    return out
+
+
+def rotate(label, keep=KEEP_PER_LABEL):
+    """Delete all but the newest keep backups with this label. Returns the removed paths."""
+    removed = []
+    for b in list_backups(label)[keep:]:
+        try:
+            os.remove(b["path"])
+            removed.append(b["path"])
+            if os.path.exists(archive.archive_path(b["path"])):
+                os.remove(archive.archive_path(b["path"]))
+        except OSError as e:
+            print("backup rotate skip:", b["path"], e)
+    return removed
+
+
+def backup_now(label="manual", pages=PAGES_PER_STEP, progress=None, keep=KEEP_PER_LABEL):
+    """
+    Back up DB_FILE (and its archive database, if any) into BACKUP_DIR and rotate the label.
+    pages: pages per step (-1 = all at once). progress: optional callable(remaining_pages, total_pages)
+    for the main database. Returns the backup path.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = _backup_path(label)
+    tmp = path + ".part"
+    archive_src, archive_tmp = archive.archive_path(), archive.archive_path(path) + ".part"
+    try:
+        # archive first: a backup file without its companion means the copy did not finish
+        if os.path.exists(archive_src):
+            _copy(archive_src, archive_tmp, pages=pages)
+            os.replace(archive_tmp, archive.archive_path(path))
+        _copy(db.DB_FILE, tmp, pages=pages,
+              progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+        os.replace(tmp, path)
+    finally:
+        for t in (tmp, archive_tmp):
+            if os.path.exists(t):
+                os.remove(t)
+    rotate(label, keep)
+    return path
+
+
+def snapshot(label="snapshot"):
+    """Fast whole-database backup (one step) before a destructive action. Returns the path."""
+    return backup_now(label, pages=-1)
+
+
+class BackupJob:
+    """Handle for a background backup: wait(), done, path, error, remaining/total pages."""
+
+    def __init__(self, label):
+        self.label = label
+        self.path = None
+        self.error = None
+        self.remaining = None
+        self.total = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _progress(self, remaining, total):
+        self.remaining, self.total = remaining, total
+
+
+def start_backup(label="manual", pages=PAGES_PER_STEP, on_done=None):
+    """
+    Run backup_now() in a daemon thread. on_done(job) is called from that thread when finished
+    (GUI callers should marshal back with widget.after). Returns the BackupJob.
+    """
+    job = BackupJob(label)
+
+    def run():
+        try:
+            job.path = backup_now(label, pages=pages, progress=job._progress)
+        except Exception as e:
+            job.error = e
+        finally:
+            job._done.set()
+            if on_done:
+                on_done(job)
+
+    threading.Thread(target=run, name="db-backup", daemon=True).start()
+    return job
+
+
+def start_scheduler(interval_hours=24, label="scheduled", keep=KEEP_PER_LABEL):
+    """Back up every interval_hours in the background (first run after one interval)."""
+    stop_scheduler()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval_hours * 3600):
+            try:
+                backup_now(label, keep=keep)
+            except Exception as e:
+                print("scheduled backup failed:", e)
+
+    t = threading.Thread(target=loop, name="db-backup-scheduler", daemon=True)
+    _scheduler.update(thread=t, stop=stop)
+    t.start()
+    return t
+
+
+def stop_scheduler():
+    if _scheduler["stop"] is not None:
+        _scheduler["stop"].set()
+    _scheduler.update(thread=None, stop=None)
+
+
+def verify_backup(path):
+    """
+    Raise ValueError unless path is a readable SQLite database that passes quick_check and whose
+    schema version (PRAGMA user_version) this application can open.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"Backup not found: {path}")
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute("SELECT COUNT(*) FROM employees").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Not a valid employee database: {e}")
+    if result != "ok":
+        raise ValueError(f"Backup failed integrity check: {result}")
+    if version > migrations.LATEST_VERSION:
+        raise ValueError(f"Backup schema version {version} is newer than this application "
+                         f"({migrations.LATEST_VERSION})")
+
+
+def _realign_archive():
+    """Drop archive rows that are also in the live database (restored from before they were archived)."""
+    conn = sqlite3.connect(db.DB_FILE)
+    try:
+        cur = conn.cursor()
+        archive.attach_archive(cur)
+        for table in ("attendance", "separation", "exam_marks"):
+            cur.execute(f"DELETE FROM archive.{table} WHERE id IN (SELECT id FROM main.{table})")
+        # 'deleted' markers stay: the p_no may have been reused by a new employee since
+        cur.execute("DELETE FROM archive.employees WHERE p_no IN (SELECT p_no FROM main.employees) "
+                    "AND archive_reason <> 'deleted'")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def restore(path):
+    """
+    Replace the live database with the backup at path.
+    The backup is checked first, then copied and migrated to a temporary file next to the live
+    database, which is renamed over it only once that succeeded; a failure at any step leaves the
+    live database as it was. The archive database is restored from the backup's companion file when
+    there is one; either way archived rows that are back in the restored database are dropped from
+    the archive, so nothing is counted twice. A 'pre-restore' snapshot is taken first; returns its path.
+    """
+    verify_backup(path)
+    safety = snapshot("pre-restore")
+    conn = sqlite3.connect(db.DB_FILE)
+    try:
+        versions = dict(conn.execute("SELECT table_name, version FROM table_versions").fetchall())
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'").fetchone()
+        journal_seq = row[0] if row else 0
+    except sqlite3.DatabaseError:
+        versions, journal_seq = {}, 0
+    finally:
+        conn.close()
+
+    tmp = db.DB_FILE + ".restore"
+    archive_live = archive.archive_path()
+    archive_saved, archive_tmp = archive.archive_path(path), archive_live + ".restore"
+    try:
+        if os.path.exists(archive_saved):
+            _copy(archive_saved, archive_tmp)
+        _copy(path, tmp)
+        db.init_db(tmp)   # backups from older versions get migrated
+        conn = sqlite3.connect(tmp)
+        try:
+            # version counters and journal seq must keep increasing, or caches keyed on them would
+            # serve pre-restore results and peers would skip the journal entries written from now on
+            for table, v in versions.items():
+                conn.execute("UPDATE table_versions SET version = MAX(version, ?) + 1 WHERE table_name = ?",
+                             (v, table))
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'change_journal'", (journal_seq,))
+            conn.commit()
+        finally:
+            conn.close()
+        # long-lived connections would keep reading the replaced file
+        writer.shutdown()
+        result_cache.close_probe()
+        if os.path.exists(archive_tmp):
+            os.replace(archive_tmp, archive_live)
+        os.replace(tmp, db.DB_FILE)
+    finally:
+        for t in (tmp, archive_tmp):
+            if os.path.exists(t):
+                os.remove(t)
+    if os.path.exists(archive_live):
+        _realign_archive()
+    result_cache.clear()
+    employee.invalidate_employee_cache()
+    return safety
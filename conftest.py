@@ -0,0 +1,17 @@
+"""
+Shared pytest fixtures: every behavioural test runs against its own scratch database.
+"""
+import pytest
+import db
+from testing import reset_module_state
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """An initialized database in tmp_path as db.DB_FILE; module caches and the writer are reset around it."""
+    path = str(tmp_path / "test.db")
+    reset_module_state()
+    monkeypatch.setattr(db, "DB_FILE", path)
+    db.init_db()
+    yield path
+    reset_module_state()
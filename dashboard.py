@@ -0,0 +1,170 @@
+# dashboard.py
+"""
+Plant attendance dashboard: daily present / absent / leave percentages per shop or category,
+read from the daily_shop_stats aggregate (see migrations._m010_daily_shop_stats) instead of the
+attendance table. A year of data for a whole plant is a few thousand aggregate rows, whatever
+the headcount.
+
+Percentages are of the attendance rows recorded for the day (present + absent + leave + other).
+"""
+import os
+import pandas as pd
+from db import get_conn, ensure_date_str, fetch
+import archive
+import migrations
+import writer
+
+GROUP_BY_CHOICES = ("shop", "category", "plant")
+METRICS = ("present_pct", "absent_pct", "leave_pct")
+COUNT_COLUMNS = ["present", "absent", "leave", "total"]
+
+# line colours for draw_trend_chart(), reused in order
+CHART_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b",
+                "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
+
+
+def _add_percentages(df):
+    for col in ("present", "absent", "leave"):
+        df[f"{col}_pct"] = (df[col] * 100.0 / df["total"].where(df["total"] > 0)).round(1).fillna(0.0)
+    return df
+
+
+def _stats_query(select_group, date_from, date_to, shop, category, group_by_date):
+    if select_group not in GROUP_BY_CHOICES:
+        raise ValueError(f"Unsupported group_by: {select_group}. Use one of {list(GROUP_BY_CHOICES)}")
+    group_expr = "'All'" if select_group == "plant" else select_group
+    where, params = [], []
+    if date_from:
+        where.append("date >= ?")
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        where.append("date <= ?")
+        params.append(ensure_date_str(date_to))
+    if shop:
+        where.append("shop = ?")
+        params.append(shop)
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    keys = (["date"] if group_by_date else []) + ["grp"]
+    sql = (f"SELECT {'date, ' if group_by_date else ''}{group_expr} AS grp, SUM(present) AS present, "
+           f"SUM(absent) AS absent, SUM(leave) AS leave, SUM(total) AS total FROM daily_shop_stats")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" GROUP BY {', '.join(keys)} HAVING SUM(total) > 0 ORDER BY {', '.join(keys)}"
+    df = fetch(sql, params, form="frame", categorical=())
+    return _add_percentages(df.rename(columns={"grp": select_group}))
+
+
+def daily_shop_stats(date_from=None, date_to=None, group_by="shop", shop=None, category=None):
+    """
+    Daily counts and percentages per group for an inclusive date range.
+    group_by: 'shop', 'category' or 'plant' (one 'All' group); shop / category filter first.
+    Returns a DataFrame: date, <group_by>, present, absent, leave, total, present_pct, absent_pct, leave_pct.
+    Employees without a shop / category are grouped under ''.
+    """
+    return _stats_query(group_by, date_from, date_to, shop, category, group_by_date=True)
+
+
+def period_shop_stats(date_from=None, date_to=None, group_by="shop", shop=None, category=None):
+    """Same as daily_shop_stats() but totalled over the whole range: one row per group."""
+    return _stats_query(group_by, date_from, date_to, shop, category, group_by_date=False)
+
+
+def order_groups(groups, preferred):
+    """Groups in the order of preferred (e.g. the shops in app_settings.json), unlisted ones after."""
+    rank = {g: i for i, g in enumerate(preferred or [])}
+    return sorted(groups, key=lambda g: (rank.get(g, len(rank)), str(g)))
+
+
+def rebuild_daily_shop_stats():
+    """
+    Recount daily_shop_stats from attendance (plus archived attendance of archived separated
+    employees, which the aggregate keeps). Only needed if the counters were edited by hand.
+    Returns the number of aggregate rows.
+    """
+    path = archive.archive_path()
+    attach = None
+    attendance_src, employees_src = "attendance", "employees"
+    if os.path.exists(path):
+        attach = {"archive": path}
+        cols = ", ".join(archive.ATTENDANCE_COLUMNS)
+        deleted = "(SELECT p_no FROM archive.employees WHERE archive_reason = 'deleted')"
+        attendance_src = (f"(SELECT {cols} FROM main.attendance UNION ALL "
+                          f"SELECT {cols} FROM archive.attendance WHERE p_no NOT IN {deleted} "
+                          "AND id NOT IN (SELECT id FROM main.attendance))")
+        employees_src = ("(SELECT p_no, shop, category FROM main.employees UNION ALL "
+                         "SELECT p_no, shop, category FROM archive.employees WHERE archive_reason <> 'deleted' "
+                         "AND p_no NOT IN (SELECT p_no FROM main.employees))")
+
+    def rebuild():
+        with get_conn(attach) as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            migrations.backfill_daily_shop_stats(cur, attendance_src, employees_src)
+            cur.execute("SELECT COUNT(*) FROM daily_shop_stats")
+            return cur.fetchone()[0]
+
+    # its own connection (the archive is attached), run on the writer thread between groups
+    return writer.call(rebuild).result()
+
+# ---------------------------
+# Chart
+# ---------------------------
+
+def draw_trend_chart(canvas, df, group_col, metric="present_pct", groups=None, title=None):
+    """
+    Draw one line per group of df (output of daily_shop_stats()) on a tk Canvas:
+    metric (0-100 %) against date, with axes and a legend. groups fixes the line order.
+    """
+    canvas.delete("all")
+    canvas.update_idletasks()
+    width = max(canvas.winfo_width(), 400)
+    height = max(canvas.winfo_height(), 250)
+    left, right, top, bottom = 48, 150, 24, 32
+    plot_w, plot_h = width - left - right, height - top - bottom
+    if title:
+        canvas.create_text(left, 4, text=title, anchor="nw")
+    if df is None or df.empty:
+        canvas.create_text(width // 2, height // 2, text="No attendance in this range")
+        return
+
+    dates = sorted(df["date"].unique())
+    x_of = {d: left + (plot_w * i / max(len(dates) - 1, 1)) for i, d in enumerate(dates)}
+    lo = max(0.0, float(df[metric].min()) // 10 * 10)
+    hi = min(100.0, (float(df[metric].max()) // 10 + 1) * 10)
+    if hi <= lo:
+        lo, hi = max(0.0, hi - 10), hi
+
+    def y_of(v):
+        return top + plot_h * (1 - (v - lo) / (hi - lo))
+
+    # axes, y grid every 10% (or 2% for narrow ranges), ~8 date labels
+    canvas.create_line(left, top, left, top + plot_h, left + plot_w, top + plot_h)
+    step = 10 if hi - lo > 20 else 2
+    v = lo
+    while v <= hi + 1e-9:
+        y = y_of(v)
+        canvas.create_line(left, y, left + plot_w, y, fill="#e6e6e6")
+        canvas.create_text(left - 4, y, text=f"{v:g}%", anchor="e")
+        v += step
+    for d in dates[::max(len(dates) // 8, 1)]:
+        canvas.create_text(x_of[d], top + plot_h + 4, text=d, anchor="n")
+
+    groups = list(groups) if groups is not None else list(df[group_col].unique())
+    by_group = dict(tuple(df.groupby(group_col, sort=False)))
+    for i, g in enumerate(groups):
+        part = by_group.get(g)
+        if part is None:
+            continue
+        color = CHART_COLORS[i % len(CHART_COLORS)]
+        points = []
+        for d, val in zip(part["date"], part[metric]):
+            points += [x_of[d], y_of(val)]
+        if len(points) >= 4:
+            canvas.create_line(*points, fill=color, width=1.5)
+        else:
+            canvas.create_oval(points[0] - 2, points[1] - 2, points[0] + 2, points[1] + 2, fill=color, outline=color)
+        ly = top + 16 * i
+        canvas.create_line(left + plot_w + 10, ly, left + plot_w + 28, ly, fill=color, width=3)
+        canvas.create_text(left + plot_w + 32, ly, text=str(g) or "(none)", anchor="w")
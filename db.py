@@ -1,110 +1,120 @@
 # db.py
 import sqlite3
 import os
+import json
+import base64
+import collections
+import functools
 from contextlib import contextmanager
 from datetime import datetime
+import gc
 import hashlib
+import keyword
+import uuid
+import pandas as pd
+import query_profiler
+import migrations
 
 DB_FILE = os.path.join(os.path.dirname(__file__), "employee_data.db")
 
+# tables whose row changes are counted in table_versions
+VERSIONED_TABLES = ("employees", "attendance", "separation", "exam_marks")
+
+# natural key per data table; change_journal.row_key is json_array() of these columns
+JOURNAL_KEYS = {
+    "employees": ("p_no",),
+    "attendance": ("p_no", "date"),
+    "separation": ("p_no", "separation_date"),
+    "exam_marks": ("p_no", "exam_type", "exam_date"),
+}
+
+# result shapes accepted by fetch() / rows_to_form() and the list / summary functions built on them
+RESULT_FORMS = ("records", "dicts", "tuples", "frame", "arrays")
+# low-cardinality text columns kept as pandas categoricals in the columnar forms
+CATEGORICAL_COLUMNS = frozenset({"status", "shop", "category", "exam_type"})
+# rows converted per step when building a columnar result
+FETCH_CHUNK = 50_000
+# seconds a connection waits on a locked database before "database is locked" (sqlite3 busy timeout)
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# epoch milliseconds, evaluated inside SQLite
+_NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
 def _hash_password(username, password):
     # simple username+password hash (not for production)
     return hashlib.sha256(f"{username}::{password}".encode("utf-8")).hexdigest()
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-
-    # Enable foreign keys
-    cur.execute("PRAGMA foreign_keys = ON")
-
-    # Employees
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS employees (
-        p_no TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        phone TEXT,
-        dob TEXT,
-        doj TEXT,
-        end_date TEXT,
-        ticket_no TEXT,
-        shop TEXT
-    )
-    """)
-
-    # Attendance records
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS attendance (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        p_no TEXT NOT NULL,
-        date TEXT NOT NULL,
-        status TEXT NOT NULL,
-        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
-    )
-    """)
-
-    # Separation records
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS separation (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        p_no TEXT NOT NULL,
-        name TEXT,
-        separation_date TEXT NOT NULL,
-        reason TEXT,
-        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
-    )
-    """)
-
-    # Exam marks
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS exam_marks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        p_no TEXT NOT NULL,
-        name TEXT,
-        exam_type TEXT NOT NULL,
-        exam_date TEXT,
-        marks REAL,
-        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
-    )
-    """)
-
-    # Users table for authentication (simple)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password_hash TEXT NOT NULL,
-        role TEXT NOT NULL
-    )
-    """)
-
-    conn.commit()
-
-    # ensure at least one admin user exists
-    cur.execute("SELECT COUNT(*) FROM users")
-    count = cur.fetchone()[0]
-    if count == 0:
-        # default admin (please change after first login)
-        default_user = "admin"
-        default_pass = "admin123"
-        ph = _hash_password(default_user, default_pass)
-        cur.execute("INSERT OR REPLACE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                    (default_user, ph, "admin"))
-        conn.commit()
-        print("Default admin created -> username: admin  password: admin123  (change it immediately)")
+def _connect(path=None):
+    """
+    Open a connection to path (default DB_FILE) that waits up to BUSY_TIMEOUT_SECONDS for a lock.
+    With EMP_QUERY_PROFILER=1 connections are instrumented by query_profiler (timings,
+    histograms, slow log).
+    """
+    return query_profiler.connect(path or DB_FILE, timeout=BUSY_TIMEOUT_SECONDS)
+
+def new_site_id():
+    return uuid.uuid4().hex
+
+def init_db(path=None, progress=None):
+    """
+    Bring path (default DB_FILE) to the current schema by running the pending migrations
+    (see migrations.py) and make sure an admin user exists.
+    progress: optional callable(message) for migration progress.
+    """
+    conn = _connect(path)
+    try:
+        migrations.migrate(conn, progress)
+        cur = conn.cursor()
 
-    conn.close()
+        # ensure at least one admin user exists
+        cur.execute("SELECT COUNT(*) FROM users")
+        count = cur.fetchone()[0]
+        if count == 0:
+            # default admin (please change after first login)
+            default_user = "admin"
+            default_pass = "admin123"
+            ph = _hash_password(default_user, default_pass)
+            cur.execute("INSERT OR REPLACE INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                        (default_user, ph, "admin"))
+            conn.commit()
+            print("Default admin created -> username: admin  password: admin123  (change it immediately)")
+    finally:
+        conn.close()
 
 @contextmanager
-def get_conn():
-    conn = sqlite3.connect(DB_FILE)
+def get_conn(attach=None):
+    """
+    Connection to DB_FILE, committed and closed on exit. If the block raises, the open
+    transaction is rolled back instead, so nothing it wrote since the last commit is kept.
+    attach: optional {schema_name: path} of databases to ATTACH (e.g. archive.report_sources()).
+    """
+    conn = _connect()
     try:
         # enable foreign keys for each connection
         conn.execute("PRAGMA foreign_keys = ON")
+        for schema, path in (attach or {}).items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
         yield conn
-    finally:
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
 
+def get_table_versions(*tables):
+    """
+    Return (version, ...) for the given tables (default: all VERSIONED_TABLES), read from table_versions.
+    The tuple changes whenever any row of those tables is inserted, updated or deleted.
+    """
+    tables = tables or VERSIONED_TABLES
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT table_name, version FROM table_versions WHERE table_name IN ("
+                    + ", ".join("?" * len(tables)) + ")", tables)
+        found = dict(cur.fetchall())
+    return tuple(found.get(t, 0) for t in tables)
+
 def ensure_date_str(dt):
     """
     Accepts date-like input (datetime/date/string) and normalizes to YYYY-MM-DD string.
@@ -126,6 +136,174 @@ def ensure_date_str(dt):
     except Exception:
         return str(dt)
 
+# ---- Result forms ----------
+class Record:
+    """
+    Mixin for immutable result rows. Each column list gets a namedtuple-based class from
+    record_type(): index access, unpacking, Treeview values=, and row.name read as fast as a
+    plain namedtuple. The mixin adds the dict-row API existing callers use: row["name"],
+    row.get("name", default), keys() / items() and dict(row). Otherwise a row behaves as the
+    tuple it is: iteration, len() and `in` see the values, as for a namedtuple; test for a column
+    with `"name" in row.keys()`.
+    No per-instance __dict__: a row costs what its tuple costs.
+    """
+    __slots__ = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in zip(self._fields, self))})"
+
+_record_types = {}
+
+def record_type(columns, name="Row"):
+    """
+    The Record class for a column list (cached per column tuple); cls._make(row_tuple) builds one.
+    Columns that are not valid identifiers, or clash with the Record / tuple methods, get a
+    positional attribute name (_<index>) but keep their name as a key.
+    """
+    columns = tuple(columns)
+    cls = _record_types.get((name, columns))
+    if cls is None:
+        fields = [c if c.isidentifier() and not keyword.iskeyword(c) and not hasattr(Record, c)
+                  and not hasattr(tuple, c) else "_" for c in columns]
+        base = collections.namedtuple(name, fields, rename=True)
+        # _fields keeps the real column names (pandas.DataFrame(rows) reads them)
+        cls = type(name, (Record, base), {"__slots__": (), "_fields": columns,
+                                          "_index": {c: i for i, c in enumerate(columns)}})
+        _record_types[(name, columns)] = cls
+    return cls
+
+def _columnar(chunks, columns, form, categorical):
+    """Build a 'frame' / 'arrays' result from an iterable of row-tuple chunks, one chunk at a time."""
+    frames = [pd.DataFrame.from_records(c, columns=columns) for c in chunks if c]
+    if not frames:
+        df = pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+    else:
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    for c in columns:
+        if c in categorical:
+            df[c] = df[c].astype("category")
+    if form == "frame":
+        return df
+    return {c: (df[c].array if isinstance(df[c].dtype, pd.CategoricalDtype) else df[c].to_numpy()) for c in columns}
+
+def rows_to_form(rows, columns, form="dicts", categorical=CATEGORICAL_COLUMNS):
+    """
+    Shape fetched row tuples as:
+    - 'records': list of Record rows (see record_type())
+    - 'dicts': list of {column: value}
+    - 'tuples': list of tuples in column order
+    - 'frame': pandas DataFrame, categorical columns as category dtype
+    - 'arrays': {column: NumPy array}; categorical columns as pandas.Categorical
+    """
+    if form == "records":
+        # the new tuples cannot form cycles; without this, collections triggered by the
+        # allocations dominate building a large result
+        paused = gc.isenabled()
+        gc.disable()
+        try:
+            return list(map(functools.partial(tuple.__new__, record_type(columns)), rows))
+        finally:
+            if paused:
+                gc.enable()
+    if form == "dicts":
+        return [dict(zip(columns, r)) for r in rows]
+    if form == "tuples":
+        return [tuple(r) for r in rows]
+    if form not in RESULT_FORMS:
+        raise ValueError(f"Unsupported result form: {form}. Use one of {list(RESULT_FORMS)}")
+    return _columnar((rows[i:i + FETCH_CHUNK] for i in range(0, len(rows), FETCH_CHUNK)), columns, form, categorical)
+
+def fetch(sql, params=(), form="dicts", attach=None, categorical=CATEGORICAL_COLUMNS):
+    """
+    Run a SELECT and return its rows in the given form (see rows_to_form()).
+    The columnar forms are built FETCH_CHUNK rows at a time, so neither a list of every row
+    tuple nor per-row dicts are held next to the result.
+    """
+    if form not in RESULT_FORMS:
+        raise ValueError(f"Unsupported result form: {form}. Use one of {list(RESULT_FORMS)}")
+    with get_conn(attach) as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        columns = [d[0] for d in cur.description]
+        if form in ("records", "dicts", "tuples"):
+            return rows_to_form(cur.fetchall(), columns, form)
+        return _columnar(iter(lambda: cur.fetchmany(FETCH_CHUNK), []), columns, form, categorical)
+
+# ---- Keyset pagination ----------
+def encode_page_cursor(sort_key, descending, last_value, last_id):
+    """Opaque next-page token: the sort order plus the (sort value, id) of the last row served."""
+    payload = json.dumps([sort_key, bool(descending), last_value, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_page_cursor(token, sort_key, descending):
+    try:
+        sk, desc, value, last_id = json.loads(base64.urlsafe_b64decode(str(token).encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    if sk != sort_key or bool(desc) != bool(descending):
+        raise ValueError("Page cursor does not match the requested sort order")
+    return value, last_id
+
+def fetch_keyset_page(table, columns, where_clauses, params, sort_key, sort_expr,
+                      descending=False, cursor=None, page_size=500, attach=None, form="dicts"):
+    """
+    Run a keyset-paginated SELECT over `table` (which must have an integer `id`; a parenthesised
+    subquery works too, with attach naming the databases it reads, see get_conn()).
+    Rows are ordered by (sort_expr, id); a cursor resumes strictly after the last row
+    of the previous page, so each page is an index range scan instead of an OFFSET.
+    Returns (rows in the given form, see rows_to_form(); next_cursor or None when this was the last page).
+    """
+    page_size = max(1, int(page_size))
+    where = list(where_clauses)
+    params = list(params)
+    if cursor:
+        value, last_id = decode_page_cursor(cursor, sort_key, descending)
+        op = "<" if descending else ">"
+        # the plain bound lets SQLite seek expression indexes; the row value does the exact cut
+        where.append(f"{sort_expr} {op}= ? AND ({sort_expr}, id) {op} (?, ?)")
+        params += [value, value, last_id]
+    direction = "DESC" if descending else "ASC"
+    sql = f"SELECT {', '.join(columns)}, {sort_expr} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort_expr} {direction}, id {direction} LIMIT ?"
+    params.append(page_size + 1)
+    with get_conn(attach) as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_page_cursor(sort_key, descending, last[-1], last[columns.index("id")])
+    return rows_to_form([r[:-1] for r in rows], columns, form), next_cursor
+
 # ---- User helpers ----------
 def create_user(username, password, role="user"):
     ph = _hash_password(username, password)
@@ -1,25 +1,151 @@
+import re
+import threading
+from collections import OrderedDict
 import pandas as pd
-from db import get_conn, ensure_date_str
-from utils import load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file
+import db
+import archive
+import import_batch
+import writer
+from db import get_conn, ensure_date_str, fetch
+from utils import (load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file,
+                   normalize_date_series, normalize_id_series)
+
+EMPLOYEE_COLUMNS = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
 
 # ---------------------------
-# Employee Management Functions
+# Employee directory cache
 # ---------------------------
+# In-memory read-through cache of employee rows keyed by p_no (LRU, bounded).
+# It is filled by a single SELECT and kept in step by add/delete/bulk functions below.
+# When the whole table fits ("complete"), negative lookups are answered without SQLite too.
+
+DIRECTORY_MAX_SIZE = 200000
+
+_directory = OrderedDict()
+_directory_lock = threading.RLock()
+_directory_state = {"db_file": None, "loaded": False, "complete": False}
+_directory_stats = {"hits": 0, "misses": 0, "loads": 0, "invalidations": 0}
+
+
+def _directory_reset():
+    _directory.clear()
+    _directory_state.update(db_file=db.DB_FILE, loaded=False, complete=False)
+
+
+def _directory_ready():
+    """Make sure the cache belongs to the current DB_FILE and has been loaded once."""
+    if _directory_state["db_file"] != db.DB_FILE:
+        _directory_reset()
+    if not _directory_state["loaded"]:
+        load_employee_directory()
+
 
-def _ensure_category_column():
+def _directory_put(row):
+    _directory[row["p_no"]] = row
+    _directory.move_to_end(row["p_no"])
+    while len(_directory) > DIRECTORY_MAX_SIZE:
+        _directory.popitem(last=False)
+        _directory_state["complete"] = False
+
+
+def load_employee_directory():
+    """
+    (Re)load the directory with one query. If the table has more than DIRECTORY_MAX_SIZE
+    rows only the first DIRECTORY_MAX_SIZE are kept and lookups for others fall back to SQLite.
+    """
+    with _directory_lock:
+        _directory_reset()
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT " + ", ".join(EMPLOYEE_COLUMNS) + " FROM employees ORDER BY p_no LIMIT ?",
+                        (DIRECTORY_MAX_SIZE + 1,))
+            rows = cur.fetchall()
+        complete = len(rows) <= DIRECTORY_MAX_SIZE
+        for r in rows[:DIRECTORY_MAX_SIZE]:
+            _directory[r[0]] = dict(zip(EMPLOYEE_COLUMNS, r))
+        _directory_state.update(loaded=True, complete=complete)
+        _directory_stats["loads"] += 1
+
+
+def invalidate_employee_cache(p_no=None):
     """
-    Ensure the 'category' column exists in the employees table.
-    If not present, add it via ALTER TABLE. Safe to call repeatedly.
+    Drop one p_no from the directory, or everything when p_no is None
+    (e.g. after the database was modified outside this module).
+    """
+    with _directory_lock:
+        _directory_stats["invalidations"] += 1
+        if p_no is None:
+            _directory_reset()
+        else:
+            _directory.pop(str(p_no), None)
+            _directory_state["complete"] = False
+
+
+def refresh_employee_cache(p_nos):
     """
+    Re-read the given employees (chunked IN queries) and update their cached rows;
+    used after set-based writes that change employee columns in bulk.
+    """
+    keys = sorted({str(p) for p in p_nos})
+    with _directory_lock:
+        if not keys or not _directory_state["loaded"] or _directory_state["db_file"] != db.DB_FILE:
+            return
+    fresh = {}
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(keys), 900):
+            chunk = keys[i:i + 900]
+            cur.execute("SELECT " + ", ".join(EMPLOYEE_COLUMNS) + " FROM employees WHERE p_no IN ("
+                        + ", ".join("?" * len(chunk)) + ")", chunk)
+            for r in cur.fetchall():
+                fresh[r[0]] = dict(zip(EMPLOYEE_COLUMNS, r))
+    with _directory_lock:
+        for k in keys:
+            if k in fresh:
+                _directory_put(fresh[k])
+            else:
+                _directory.pop(k, None)
+
+
+def employee_cache_stats():
+    """Return hit/miss counters and size information for the directory cache."""
+    with _directory_lock:
+        lookups = _directory_stats["hits"] + _directory_stats["misses"]
+        return dict(_directory_stats,
+                    size=len(_directory),
+                    complete=_directory_state["complete"],
+                    hit_rate=(_directory_stats["hits"] / lookups) if lookups else 0.0)
+
+
+def known_p_nos():
+    """
+    Return the set of all p_no values in the employees table without per-row queries:
+    from the directory when it is complete, otherwise with a single SELECT.
+    """
+    with _directory_lock:
+        _directory_ready()
+        if _directory_state["complete"]:
+            return set(_directory.keys())
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(employees)")
-        cols = [r[1] for r in cur.fetchall()]  # second field is column name
-        if "category" not in cols:
-            cur.execute("ALTER TABLE employees ADD COLUMN category TEXT")
-            conn.commit()
+        cur.execute("SELECT p_no FROM employees")
+        return {r[0] for r in cur.fetchall()}
+
+
+def employee_exists(p_no):
+    return get_employee(p_no) is not None
 
 
+def get_employee_name(p_no):
+    """Return the stored name for p_no (or None) via the directory cache."""
+    emp = get_employee(p_no)
+    return emp.get("name") if emp else None
+
+
+# ---------------------------
+# Employee Management Functions
+# ---------------------------
+
 def _normalize_category(cat):
     """
     Normalize category: if None/empty/'none' -> 'Other', otherwise return trimmed value.
@@ -34,33 +160,48 @@ def _normalize_category(cat):
     return s
 
 
-def add_employee(p_no, name, phone=None, dob=None, doj=None, end_date=None, ticket_no=None, shop=None, category=None):
+def add_employee(p_no, name, phone=None, dob=None, doj=None, end_date=None, ticket_no=None, shop=None, category=None,
+                 wait=True):
     """
     Add a new employee to the database.
     category: optional, one of NEEM, NTTF, BTECH, MTECH or None.
               If None or 'none', stored as 'Other'.
+    Written by the writer thread; wait=False returns its Future instead of blocking.
     """
     dob = ensure_date_str(dob)
     doj = ensure_date_str(doj)
     end_date = ensure_date_str(end_date)
     category = _normalize_category(category)
 
-    # make sure column exists
-    _ensure_category_column()
+    values = (str(p_no), name, phone, dob, doj, end_date, ticket_no, shop, category)
+    db_file = db.DB_FILE
 
-    with get_conn() as conn:
-        cur = conn.cursor()
+    def op(cur):
+        # upsert rather than INSERT OR REPLACE: REPLACE deletes the old row first, which
+        # cascades and wipes the employee's attendance / exam / separation history
         cur.execute("""
-            INSERT OR REPLACE INTO employees
+            INSERT INTO employees
             (p_no, name, phone, dob, doj, end_date, ticket_no, shop, category)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (str(p_no), name, phone, dob, doj, end_date, ticket_no, shop, category))
-        conn.commit()
+            ON CONFLICT(p_no) DO UPDATE SET
+                name = excluded.name, phone = excluded.phone, dob = excluded.dob, doj = excluded.doj,
+                end_date = excluded.end_date, ticket_no = excluded.ticket_no, shop = excluded.shop,
+                category = excluded.category, batch_id = NULL
+        """, values)
 
+    def after(_):
+        with _directory_lock:
+            if _directory_state["loaded"] and _directory_state["db_file"] == db_file:
+                _directory_put(dict(zip(EMPLOYEE_COLUMNS, values)))
 
-def list_employees(order_by=None, order_dir="ascending", shop=None, category=None):
+    return writer.execute(op, after, wait=wait)
+
+
+def list_employees(order_by=None, order_dir="ascending", shop=None, category=None, form="records"):
     """
-    Return employees as list of dicts with optional filtering and ordering.
+    Return employees as a list of rows with optional filtering and ordering.
+    - form: 'records' (db.Record: row["name"], row.get("name"), row.name), 'dicts', 'tuples',
+      'frame' or 'arrays' (see db.fetch())
     - order_by: None or list/str of columns to order by (allowed: p_no,name,phone,dob,doj,end_date,ticket_no,shop,category)
     - order_dir: "ascending" or "descending"
     - shop: optional exact shop name to filter by (string). If None or empty -> no shop filter.
@@ -68,110 +209,166 @@ def list_employees(order_by=None, order_dir="ascending", shop=None, category=Non
     """
     allowed = {"p_no","name","phone","dob","doj","end_date","ticket_no","shop","category"}
     order_dir_sql = "ASC" if str(order_dir).strip().lower() != "descending" else "DESC"
+    select_cols = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
+
+    base_sql = "SELECT " + ", ".join(select_cols) + " FROM employees"
+
+    # Build WHERE clause for filters
+    where_clauses = []
+    params = []
+    if shop:
+        where_clauses.append("shop = ?")
+        params.append(shop)
+    if category:
+        where_clauses.append("category = ?")
+        params.append(category)
+
+    where_clause = ""
+    if where_clauses:
+        where_clause = " WHERE " + " AND ".join(where_clauses)
+
+    # Build ORDER BY if requested
+    order_clause = ""
+    if order_by:
+        # normalize to list
+        if isinstance(order_by, str):
+            order_list = [order_by]
+        else:
+            order_list = list(order_by)
+        clean_order = []
+        for col in order_list:
+            c = str(col).strip()
+            if c and c in allowed:
+                clean_order.append(c)
+        if clean_order:
+            order_clause = " ORDER BY " + ", ".join([f"{c} {order_dir_sql}" for c in clean_order])
+
+    # Fallback: if no order clause, keep p_no ordering for stable output
+    if not order_clause:
+        order_clause = " ORDER BY p_no"
+
+    sql = base_sql + where_clause + order_clause
+    return fetch(sql, params, form=form)
+
+
+def distinct_employee_values(column):
+    """
+    Return the sorted distinct non-empty values of 'shop' or 'category' in the employees table.
+    """
+    if column not in ("shop", "category"):
+        raise ValueError("column must be 'shop' or 'category'")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT DISTINCT {column} FROM employees WHERE {column} IS NOT NULL AND {column} <> '' ORDER BY {column}")
+        return [r[0] for r in cur.fetchall()]
+
 
+SEARCH_COLUMNS = ("p_no", "name", "phone", "ticket_no")
+# bm25 column weights for SEARCH_COLUMNS: identifier hits outrank name hits
+SEARCH_WEIGHTS = (10.0, 1.0, 2.0, 5.0)
+
+
+def _fts_query(text):
+    """'ram 12' -> '"ram"* AND "12"*' (every term must prefix-match some indexed column)."""
+    terms = re.findall(r"\w+", str(text or ""))
+    return " AND ".join(f'"{t}"*' for t in terms)
+
+
+def search_employees(query, limit=50, shop=None, category=None):
+    """
+    Search employees by p_no, name, phone and ticket_no as the user types.
+    Every word of query must prefix-match one of those columns; an exact p_no comes first,
+    then rows ranked by relevance (employees_fts, see migrations._m011_employees_fts).
+    shop / category: optional exact filters as in list_employees().
+    Returns up to limit employee dicts. Falls back to LIKE scans when FTS5 is unavailable.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    where, params = [], []
+    if shop:
+        where.append("e.shop = ?")
+        params.append(shop)
+    if category:
+        where.append("e.category = ?")
+        params.append(category)
+    cols = ", ".join("e." + c for c in EMPLOYEE_COLUMNS)
     with get_conn() as conn:
         cur = conn.cursor()
-        # Check if 'category' exists
-        cur.execute("PRAGMA table_info(employees)")
-        cols_info = cur.fetchall()
-        col_names = [r[1] for r in cols_info]
-        has_category = "category" in col_names
-
-        if has_category:
-            select_cols = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'")
+        if cur.fetchone():
+            sql = (f"SELECT {cols} FROM employees_fts f JOIN employees e ON e.rowid = f.rowid "
+                   f"WHERE employees_fts MATCH ?{''.join(' AND ' + w for w in where)} "
+                   f"ORDER BY e.p_no = ? DESC, bm25(employees_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) LIMIT ?")
+            cur.execute(sql, [match] + params + [str(query).strip(), int(limit)])
         else:
-            select_cols = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop"]
-
-        base_sql = "SELECT " + ", ".join(select_cols) + " FROM employees"
-
-        # Build WHERE clause for filters
-        where_clauses = []
-        params = []
-        if shop:
-            where_clauses.append("shop = ?")
-            params.append(shop)
-        if category and has_category:
-            where_clauses.append("category = ?")
-            params.append(category)
-        # if category filter requested but table lacks column, ignore category filter
-
-        where_clause = ""
-        if where_clauses:
-            where_clause = " WHERE " + " AND ".join(where_clauses)
-
-        # Build ORDER BY if requested
-        order_clause = ""
-        if order_by:
-            # normalize to list
-            if isinstance(order_by, str):
-                order_list = [order_by]
-            else:
-                order_list = list(order_by)
-            clean_order = []
-            for col in order_list:
-                c = str(col).strip()
-                if c and c in allowed:
-                    if c == "category" and not has_category:
-                        continue
-                    clean_order.append(c)
-            if clean_order:
-                order_clause = " ORDER BY " + ", ".join([f"{c} {order_dir_sql}" for c in clean_order])
-
-        # Fallback: if no order clause, keep p_no ordering for stable output
-        if not order_clause:
-            order_clause = " ORDER BY p_no"
-
-        sql = base_sql + where_clause + order_clause
-        cur.execute(sql, params)
+            for term in re.findall(r"\w+", str(query)):
+                where.append("(" + " OR ".join(f"e.{c} LIKE ?" for c in SEARCH_COLUMNS) + ")")
+                params += [f"{term}%" if c != "name" else f"%{term}%" for c in SEARCH_COLUMNS]
+            cur.execute(f"SELECT {cols} FROM employees e WHERE {' AND '.join(where)} "
+                        f"ORDER BY e.p_no = ? DESC, e.p_no LIMIT ?", params + [str(query).strip(), int(limit)])
         rows = cur.fetchall()
-    cols = select_cols
-    return [dict(zip(cols, r)) for r in rows]
+    return [dict(zip(EMPLOYEE_COLUMNS, r)) for r in rows]
 
 
 def get_employee(p_no):
     """
     Return a single employee dict or None.
+    Served from the employee directory cache; only misses on an incomplete cache query SQLite.
     """
+    key = str(p_no)
+    with _directory_lock:
+        _directory_ready()
+        row = _directory.get(key)
+        if row is not None:
+            _directory.move_to_end(key)
+            _directory_stats["hits"] += 1
+            return dict(row)
+        if _directory_state["complete"]:
+            # whole table is cached -> authoritative "not found"
+            _directory_stats["hits"] += 1
+            return None
+        _directory_stats["misses"] += 1
     with get_conn() as conn:
         cur = conn.cursor()
-        # attempt to select category if exists
-        cur.execute("PRAGMA table_info(employees)")
-        cols_info = cur.fetchall()
-        col_names = [r[1] for r in cols_info]
-        if "category" in col_names:
-            cur.execute("SELECT p_no, name, phone, dob, doj, end_date, ticket_no, shop, category FROM employees WHERE p_no = ?", (str(p_no),))
-            row = cur.fetchone()
-            if row:
-                cols = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
-                return dict(zip(cols, row))
-        else:
-            cur.execute("SELECT p_no, name, phone, dob, doj, end_date, ticket_no, shop FROM employees WHERE p_no = ?", (str(p_no),))
-            row = cur.fetchone()
-            if row:
-                cols = ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop"]
-                return dict(zip(cols, row))
-    return None
+        cur.execute("SELECT " + ", ".join(EMPLOYEE_COLUMNS) + " FROM employees WHERE p_no = ?", (key,))
+        r = cur.fetchone()
+    if not r:
+        return None
+    row = dict(zip(EMPLOYEE_COLUMNS, r))
+    with _directory_lock:
+        _directory_put(row)
+    return dict(row)
 
 
-def delete_employee(p_no):
+def delete_employee(p_no, wait=True):
     """
-    Delete a single employee by p_no.
+    Delete a single employee by p_no. The employee and their attendance / separation / exam
+    history move to the archive database (archive.archive_employees()) instead of being destroyed.
+    Runs on the writer thread (writer.call()); wait=False returns its Future.
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM employees WHERE p_no = ?", (str(p_no),))
-        conn.commit()
+    def archive_one():
+        moved = archive.archive_employees([str(p_no)])
+        with _directory_lock:
+            _directory.pop(str(p_no), None)
+        return moved
 
+    fut = writer.call(archive_one)
+    return fut.result() if wait else fut
 
-def delete_all_employees():
+
+def delete_all_employees(wait=True):
     """
     Delete ALL employees from the table.
     Use with caution — this clears the employees table entirely.
     """
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM employees")
-        conn.commit()
+    def after(_):
+        with _directory_lock:
+            _directory_reset()
+            # the table is now empty, so an empty directory is complete
+            _directory_state.update(loaded=True, complete=True)
+
+    return writer.execute(lambda cur: cur.execute("DELETE FROM employees").rowcount, after, wait=wait)
 
 
 def bulk_upload_employees(filepath):
@@ -180,7 +377,11 @@ def bulk_upload_employees(filepath):
     Required columns: p_no, name
     Optional: phone, dob, doj, end_date, ticket_no, shop, category
 
-    Returns number of inserted/updated rows.
+    The file is normalized column-wise (rows without p_no or name are skipped and reported), then
+    written as one writer op and one import batch (import_batch.py): the employees it changes are
+    saved for rollback_batch() and a single upsert applies them. For repeated p_no the last row wins.
+    Returns the number of employees inserted or changed (rows identical to the stored employee
+    are not counted).
     """
     df = load_dataframe_from_file(filepath)
     if df is None or df.empty:
@@ -189,41 +390,70 @@ def bulk_upload_employees(filepath):
     mapping = map_columns_case_insensitive(df,
         ["p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
     )
-    inserted = 0
-    for i, row in df.iterrows():
-        try:
-            p_col = mapping.get("p_no")
-            n_col = mapping.get("name")
-            if p_col is None or n_col is None:
-                # required columns missing in this file
-                continue
-            p = row[p_col]
-            n = row[n_col]
-            if pd.isna(p) or pd.isna(n):
-                continue
-            phone = row[mapping.get("phone")] if mapping.get("phone") else None
-            dob = row[mapping.get("dob")] if mapping.get("dob") else None
-            doj = row[mapping.get("doj")] if mapping.get("doj") else None
-            end_date = row[mapping.get("end_date")] if mapping.get("end_date") else None
-            ticket = row[mapping.get("ticket_no")] if mapping.get("ticket_no") else None
-            shop = row[mapping.get("shop")] if mapping.get("shop") else None
-            category = row[mapping.get("category")] if mapping.get("category") else None
-
-            # Normalize category
-            category = _normalize_category(category) if category is not None else "Other"
-
-            add_employee(p, n, phone, dob, doj, end_date, ticket, shop, category)
-            inserted += 1
-        except Exception as e:
-            print("bulk_upload_employees skip:", i, e)
-    return inserted
+    p_col = mapping.get("p_no")
+    n_col = mapping.get("name")
+    if p_col is None or n_col is None:
+        # required columns missing in this file
+        return 0
+    total = len(df)
+    df = df[df[p_col].notna() & df[n_col].notna()]
+    frame = pd.DataFrame({"p_no": normalize_id_series(df[p_col])}, index=df.index)
+    frame["name"] = df[n_col].astype(object)
+    for key in ("phone", "ticket_no", "shop"):
+        col = mapping.get(key)
+        # blank optional cells arrive as NaN
+        frame[key] = df[col].astype(object).where(df[col].notna(), None) if col else None
+    for key in ("dob", "doj", "end_date"):
+        col = mapping.get(key)
+        frame[key] = normalize_date_series(df[col]) if col else None
+    cat_col = mapping.get("category")
+    if cat_col:
+        raw = df[cat_col].astype(object).where(df[cat_col].notna(), None)
+        # each distinct raw category is normalized once
+        codes = {v: _normalize_category(v) for v in raw.dropna().unique()}
+        frame["category"] = raw.map(lambda v: codes[v] if v is not None else "Other")
+    else:
+        frame["category"] = "Other"
+    frame = frame[frame["p_no"] != ""].drop_duplicates(subset="p_no", keep="last")
+    skipped = total - len(frame)
+    if skipped:
+        print(f"bulk_upload_employees: skipped {skipped} rows (missing p_no / name or repeated p_no)")
+    if frame.empty:
+        return 0
+    frame = frame[EMPLOYEE_COLUMNS].astype(object)
+    rows = list(frame.itertuples(index=False, name=None))
+
+    cols = ", ".join(EMPLOYEE_COLUMNS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in EMPLOYEE_COLUMNS[1:])
+    changed_cond = " OR ".join(f"employees.{c} IS NOT excluded.{c}" for c in EMPLOYEE_COLUMNS[1:])
+
+    def write(cur):
+        batch_id = import_batch.begin_batch(cur, "employees", import_batch.source_name(filepath))
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS _employee_stage ({cols})")
+        cur.execute("DELETE FROM temp._employee_stage")
+        cur.executemany(f"INSERT INTO temp._employee_stage VALUES ({', '.join('?' * len(EMPLOYEE_COLUMNS))})", rows)
+        import_batch.capture_employees(cur, batch_id, "temp._employee_stage")
+        # upsert rather than INSERT OR REPLACE (see add_employee); unchanged rows stay unstamped
+        cur.execute(f"""
+            INSERT INTO employees ({cols}, batch_id)
+            SELECT {cols}, ? FROM temp._employee_stage WHERE true
+            ON CONFLICT(p_no) DO UPDATE SET {updates}, batch_id = excluded.batch_id
+            WHERE {changed_cond}
+        """, (batch_id,))
+        written = cur.rowcount
+        import_batch.close_batch(cur, batch_id, written)
+        cur.execute("DROP TABLE temp._employee_stage")
+        return written
+
+    written = writer.execute(write)
+    refresh_employee_cache(frame["p_no"])
+    return written
 
 
 def export_employees(path):
     """
     Export employees list to a file (CSV, XLSX, JSON).
     """
-    rows = list_employees()
-    df = pd.DataFrame(rows)
+    df = list_employees(form="frame")
     save_dataframe_to_file(df, path)
     return path
@@ -1,9 +1,17 @@
 # exam.py
 import os
 from datetime import datetime
+import numpy as np
 import pandas as pd
+import db
 from db import get_conn, ensure_date_str
-from utils import load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file
+import employee
+import import_batch
+import result_cache
+import typeahead
+import writer
+from utils import (load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file,
+                   normalize_date_series, normalize_id_series)
 
 # --- UI imports for the new window helpers ---
 import tkinter as tk
@@ -113,27 +121,28 @@ def normalize_exam_type(raw):
     # unknown format -> fallback to raw label but prefix Other_ to avoid collision
     return f"Other_{s.replace(' ', '_')}"
 
-def add_exam_mark(p_no, name, exam_type, exam_date, marks):
+def add_exam_mark(p_no, name, exam_type, exam_date, marks, wait=True):
     """
     Insert a single exam row. exam_type is expected to be a canonical string (like 'NEEM_Sem1')
     but we will accept raw strings and normalize them.
     exam_date may be date/datetime/string — ensure_date_str will normalize.
+    If name is empty it is filled from the employee directory cache.
+    Returns the new row id; wait=False returns the writer Future instead.
     """
     etype = normalize_exam_type(exam_type) or exam_type
     d = ensure_date_str(exam_date)
+    if not name:
+        name = employee.get_employee_name(p_no)
     marks_val = None
     if marks is not None and (not (isinstance(marks, float) and pd.isna(marks))):
         try:
             marks_val = float(marks)
         except Exception:
             marks_val = marks  # keep raw if cannot cast
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO exam_marks (p_no, name, exam_type, exam_date, marks) VALUES (?, ?, ?, ?, ?)",
-            (str(p_no), name, etype, d, marks_val)
-        )
-        conn.commit()
+    params = (str(p_no), name, etype, d, marks_val)
+    return writer.execute(lambda cur: cur.execute(
+        "INSERT INTO exam_marks (p_no, name, exam_type, exam_date, marks) VALUES (?, ?, ?, ?, ?)", params
+    ).lastrowid, wait=wait)
 
 def add_structured_exam(p_no, name, group, part, exam_date, marks):
     """
@@ -148,199 +157,304 @@ def add_structured_exam(p_no, name, group, part, exam_date, marks):
     exam_type = _exam_type_key(group, part)
     add_exam_mark(p_no, name, exam_type, exam_date, marks)
 
+EXAM_MARK_COLUMNS = ["id", "p_no", "name", "exam_type", "exam_date", "marks"]
+# sort key -> SQL expression (must match the idx_exam_marks_* indexes)
+EXAM_SORT_KEYS = {"exam_date": "IFNULL(exam_date, '')", "p_no": "p_no", "id": "id"}
+
+def query_exam_marks(p_no=None, date_from=None, date_to=None, exam_type=None,
+                     sort_by="exam_date", descending=True, page_size=500, cursor=None, form="records"):
+    """
+    Keyset-paginated, filtered exam records.
+    - p_no: exact employee id
+    - date_from / date_to: inclusive exam_date range (rows without a date are excluded when set)
+    - exam_type: raw or canonical exam type, or a list of them
+    - sort_by: one of EXAM_SORT_KEYS; ties broken by id
+    - cursor: next_cursor from the previous page (None for the first page)
+    - form: row shape, 'records' (db.Record, with dict-style row["col"] / .get()) by default; see db.rows_to_form()
+    Returns {"rows": [row, ...], "next_cursor": str or None}.
+    """
+    if sort_by not in EXAM_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort_by}. Use one of {sorted(EXAM_SORT_KEYS)}")
+    where, params = [], []
+    if p_no:
+        where.append("p_no = ?")
+        params.append(str(p_no))
+    if exam_type:
+        types = [exam_type] if isinstance(exam_type, str) else list(exam_type)
+        types = [normalize_exam_type(t) or t for t in types]
+        where.append("exam_type IN (" + ", ".join("?" * len(types)) + ")")
+        params += types
+    if date_from or date_to:
+        where.append("exam_date IS NOT NULL")
+    if date_from:
+        where.append("IFNULL(exam_date, '') >= ?")
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        where.append("IFNULL(exam_date, '') <= ?")
+        params.append(ensure_date_str(date_to))
+    rows, next_cursor = db.fetch_keyset_page("exam_marks", EXAM_MARK_COLUMNS, where, params,
+                                             sort_by, EXAM_SORT_KEYS[sort_by], descending=descending,
+                                             cursor=cursor, page_size=page_size, form=form)
+    return {"rows": rows, "next_cursor": next_cursor}
+
+def iter_exam_marks(page_size=5000, **filters):
+    """Yield pages (lists of rows) of query_exam_marks() until the history is exhausted."""
+    cursor = None
+    while True:
+        page = query_exam_marks(page_size=page_size, cursor=cursor, **filters)
+        if page["rows"]:
+            yield page["rows"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
 def list_exam_marks(limit=500):
-    """Return recent exam records for inspection."""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, p_no, name, exam_type, exam_date, marks FROM exam_marks ORDER BY exam_date DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-    cols = ["id", "p_no", "name", "exam_type", "exam_date", "marks"]
-    return [dict(zip(cols, r)) for r in rows]
-
-def delete_exam_record(rec_id):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM exam_marks WHERE id = ?", (rec_id,))
-        conn.commit()
+    """Return recent exam records for inspection (first page of query_exam_marks)."""
+    return query_exam_marks(page_size=limit)["rows"]
 
-def bulk_upload_exams(filepath, force_group=None, force_part=None):
+def delete_exam_record(rec_id, wait=True):
+    return writer.execute(lambda cur: cur.execute("DELETE FROM exam_marks WHERE id = ?", (rec_id,)).rowcount,
+                          wait=wait)
+
+# column names accepted for p_no when the mapping does not find one
+P_NO_ALIASES = ("p_no", "pno", "p.no", "pn", "id", "employeeid", "empid")
+
+def ingest_exams(filepath, force_group=None, force_part=None):
     """
-    Bulk upload exam rows from CSV/XLSX/JSON.
-    If force_group and force_part provided, all inserted rows will be assigned that exam_type.
-    Required per-row: p_no (or equivalent), exam_date (and optionally name, marks).
-    Returns number of successfully inserted rows.
+    Columnar exam ingest from CSV/XLSX/JSON.
+    The column mapping is resolved once for the file. exam_type is a constant when
+    force_group/force_part are given, otherwise each distinct raw value is normalized once
+    and mapped over the column. Marks are coerced with pd.to_numeric, dates normalized
+    column-wise, p_no validated against the employee directory, and all accepted rows are
+    written with one executemany in a single writer op, stamped with one import batch
+    (import_batch.rollback_batch undoes the upload).
+    Returns {"inserted": int, "rejected": [{"row": index, "p_no": ..., "reason": ...}, ...]}.
     """
+    forced_type = None
+    if force_group and force_part:
+        if force_group not in EXAM_GROUPS:
+            raise ValueError("Unknown exam group: " + str(force_group))
+        if force_part not in EXAM_GROUPS[force_group]:
+            raise ValueError(f"Invalid part '{force_part}' for group '{force_group}'")
+        forced_type = _exam_type_key(force_group, force_part)
+
     df = load_dataframe_from_file(filepath)
     if df is None or df.empty:
-        return 0
+        return {"inserted": 0, "rejected": []}
 
     mapping = map_columns_case_insensitive(df, ["p_no", "name", "exam_type", "exam_date", "marks"])
-    inserted = 0
-    for i, row in df.iterrows():
-        try:
-            # pick values using mapping if available
-            p_val = None
-            if mapping.get("p_no") in df.columns:
-                p_val = row[mapping.get("p_no")]
-            else:
-                # attempt to find a likely column
-                for col in df.columns:
-                    if str(col).lower() in ("p_no", "pno", "p.no", "pn", "id", "employeeid", "empid"):
-                        p_val = row[col]; break
-
-            if pd.isna(p_val):
-                continue
-
-            name_val = row[mapping.get("name")] if mapping.get("name") in df.columns else None
-            et_raw = row[mapping.get("exam_type")] if mapping.get("exam_type") in df.columns else None
-            ed_raw = row[mapping.get("exam_date")] if mapping.get("exam_date") in df.columns else None
-            marks_val = row[mapping.get("marks")] if mapping.get("marks") in df.columns else None
-
-            if pd.isna(ed_raw):
-                # exam_date mandatory for insertion (we require date or it won't insert)
-                continue
-
-            if force_group and force_part:
-                # use forced structured exam
-                add_structured_exam(p_no=str(p_val).strip(),
-                                    name=(None if (pd.isna(name_val)) else str(name_val).strip()),
-                                    group=force_group,
-                                    part=force_part,
-                                    exam_date=ed_raw,
-                                    marks=(None if (pd.isna(marks_val)) else marks_val))
-            else:
-                # Normalize exam_type to canonical like "NEEM_Sem1" if present in file
-                if pd.isna(et_raw):
-                    # skip if we don't know exam type
-                    continue
-                et_key = normalize_exam_type(et_raw)
-                add_exam_mark(p_no=str(p_val).strip(),
-                              name=(None if (pd.isna(name_val)) else str(name_val).strip()),
-                              exam_type=et_key,
-                              exam_date=ed_raw,
-                              marks=(None if (pd.isna(marks_val)) else marks_val))
-            inserted += 1
-        except Exception as e:
-            print("bulk_upload_exams skip:", i, e)
-            continue
+    p_col = mapping.get("p_no")
+    if p_col not in df.columns:
+        p_col = next((c for c in df.columns if str(c).lower() in P_NO_ALIASES), None)
+    missing = [k for k, col in (("p_no", p_col), ("exam_date", mapping.get("exam_date"))) if col is None]
+    if forced_type is None and not mapping.get("exam_type"):
+        missing.append("exam_type")
+    if missing:
+        raise ValueError(f"bulk_upload_exams: required columns missing or not detected: {missing}")
+
+    def column(key):
+        col = mapping.get(key)
+        return df[col] if col in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    p_nos = normalize_id_series(df[p_col])
+    dates = normalize_date_series(column("exam_date"))
+    names = column("name").map(lambda v: None if v is None or pd.isna(v) else str(v).strip())
+    marks_raw = column("marks")
+    marks = pd.to_numeric(marks_raw, errors="coerce")
+    if forced_type is not None:
+        types = pd.Series(forced_type, index=df.index, dtype=object)
+    else:
+        et_raw = column("exam_type")
+        canon = {v: normalize_exam_type(v) for v in et_raw.dropna().unique()}
+        types = et_raw.map(canon)
+
+    reason = pd.Series([None] * len(df), index=df.index, dtype=object)
+    def reject(mask, why):
+        reason[mask & reason.isna()] = why
+    reject(p_nos.isna() | (p_nos == ""), "missing p_no")
+    reject(dates.isna(), "missing exam_date")
+    reject(types.isna(), "missing exam_type")
+    blank_marks = marks_raw.isna() | (marks_raw.astype(str).str.strip() == "")
+    reject(marks.isna() & ~blank_marks, "invalid marks")
+    reject(~p_nos.isin(employee.known_p_nos()), "unknown p_no")
+
+    ok = reason.isna()
+    missing_name = ok & names.isna()
+    if missing_name.any():
+        names[missing_name] = p_nos[missing_name].map(employee.get_employee_name)
+    marks_out = marks.astype(object).where(marks.notna(), None)
+    rows = list(zip(p_nos[ok], names[ok], types[ok], dates[ok], marks_out[ok]))
+    if rows:
+        def write(cur):
+            batch_id = import_batch.begin_batch(cur, "exams", import_batch.source_name(filepath))
+            cur.executemany(
+                "INSERT INTO exam_marks (p_no, name, exam_type, exam_date, marks, batch_id) VALUES (?, ?, ?, ?, ?, ?)",
+                [r + (batch_id,) for r in rows])
+            import_batch.close_batch(cur, batch_id, len(rows))
 
-    return inserted
+        writer.execute(write)
+
+    rejected = [{"row": idx, "p_no": p_nos[idx], "reason": reason[idx]} for idx in reason.index[~ok]]
+    if rejected:
+        print(f"bulk_upload_exams: inserted={len(rows)}, rejected={len(rejected)}")
+    return {"inserted": len(rows), "rejected": rejected}
+
+def bulk_upload_exams(filepath, force_group=None, force_part=None):
+    """
+    Bulk upload exam rows from CSV/XLSX/JSON.
+    If force_group and force_part provided, all inserted rows will be assigned that exam_type.
+    Required per-row: p_no (or equivalent), exam_date (and optionally name, marks).
+    A file without a p_no or exam_date column (or exam_type, unless forced) raises ValueError.
+    Returns number of successfully inserted rows (see ingest_exams for the rejected-rows report).
+    """
+    return ingest_exams(filepath, force_group=force_group, force_part=force_part)["inserted"]
+
+def format_rejected_report(rejected, limit=10):
+    """Short human-readable summary of ingest_exams()['rejected'] for message boxes."""
+    if not rejected:
+        return ""
+    counts = {}
+    for r in rejected:
+        counts[r["reason"]] = counts.get(r["reason"], 0) + 1
+    lines = [f"Rejected {len(rejected)} row(s): " + ", ".join(f"{k}={v}" for k, v in counts.items())]
+    for r in rejected[:limit]:
+        lines.append(f"  row {r['row']}: p_no={r['p_no']} ({r['reason']})")
+    if len(rejected) > limit:
+        lines.append(f"  ... and {len(rejected) - limit} more")
+    return "\n".join(lines)
 
 def bulk_upload_for(group, part, filepath):
     """
     Convenience: bulk upload rows and force exam_type to given structured group+part.
-    Returns number inserted and a message string.
+    Raises ValueError for an unknown group / part or a file without p_no / exam_date columns.
+    Returns number of successfully inserted rows, as bulk_upload_exams() does
+    (ingest_exams(filepath, group, part) also reports the rejected rows).
     """
     if group not in EXAM_GROUPS:
         raise ValueError("Unknown exam group: " + str(group))
     if part not in EXAM_GROUPS[group]:
         raise ValueError(f"Invalid part '{part}' for group '{group}'")
-    cnt = bulk_upload_exams(filepath, force_group=group, force_part=part)
-    return cnt
+    return bulk_upload_exams(filepath, force_group=group, force_part=part)
+
+def _pivot_columns(part_keys, column_prefix=True):
+    cols = ["p_no", "name"]
+    for g, partk in part_keys:
+        label = f"{g}_{partk}" if column_prefix else partk
+        cols.append(f"{label}_marks")
+        cols.append(f"{label}_date")
+    return cols
+
+PIVOT_FORMS = ("dicts", "frame")
 
-def pivot_exam_summary():
+@result_cache.cached("employees", "exam_marks")
+def pivot_exam_summary(form="dicts"):
     """
     Return list[dict] where each dict has:
       p_no, name, and for each group+part two keys:
         <Group>_<Part>_marks, <Group>_<Part>_date
     Ensures canonical columns are present even if empty.
     Also includes employees with no exam records (left-join behavior).
+    Reads only exam_latest (one row per p_no + exam_type), so the cost is bounded by
+    employees x parts rather than by the size of the exam history.
+    form="frame" returns the same table as a DataFrame (missing values as NaN).
     """
-    # fetch exam records
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT p_no, name, exam_type, exam_date, marks FROM exam_marks")
-        rows = cur.fetchall()
-
-    # Build a DataFrame if rows exist
-    if rows:
-        df = pd.DataFrame(rows, columns=["p_no", "name", "exam_type", "exam_date", "marks"])
-    else:
-        df = pd.DataFrame(columns=["p_no", "name", "exam_type", "exam_date", "marks"])
-
-    # normalize and parse
-    if not df.empty:
-        df["exam_type_norm"] = df["exam_type"].apply(lambda x: normalize_exam_type(x) if pd.notna(x) else None)
-        def split_norm(x):
-            if not isinstance(x, str):
-                return (None, None)
-            if "_" in x:
-                g, p = x.split("_", 1)
-                return (g, p)
-            return (None, None)
-        df[["group", "part"]] = df["exam_type_norm"].apply(lambda x: pd.Series(split_norm(x)))
-        df["exam_date_parsed"] = pd.to_datetime(df["exam_date"], errors="coerce")
-        df["p_no"] = df["p_no"].astype(str)
-        df["name"] = df["name"].fillna("").astype(str)
+    latest = db.fetch("""
+        SELECT p_no, name, exam_type, exam_date, marks FROM exam_latest
+        ORDER BY IFNULL(exam_date, '') DESC, mark_id DESC
+    """, form="frame")
+    emps = db.fetch("SELECT p_no, name FROM employees", form="frame")
+    return _build_pivot(latest, emps, _all_part_keys(), form=form)
+
+@result_cache.cached("employees", "exam_marks")
+def pivot_exam_group(group, shop=None, category=None, form="dicts"):
+    """
+    Pivot for a single exam group, e.g. Induction -> PreTest/PostTest.
+    Returns list[dict] with p_no, name and <Part>_marks / <Part>_date for the group's parts only.
+    The group filter is pushed into SQL: exam_latest rows of the group's canonical types, plus any
+    stored non-canonical type (e.g. raw legacy types copied by the migrations), which _build_pivot()
+    normalizes exactly as pivot_exam_summary() does, so both pivots show the same marks.
+    shop / category optionally restrict to matching employees (exact match).
+    form: 'dicts' or 'frame' as in pivot_exam_summary().
+    """
+    if group not in EXAM_GROUPS:
+        raise ValueError("Unknown exam group: " + str(group))
+    part_keys = [(group, p) for p in EXAM_GROUPS[group]]
+    types = [_exam_type_key(g, p) for g, p in part_keys]
+    canonical = [_exam_type_key(g, p) for g, p in _all_part_keys()]
+
+    emp_where, emp_params = [], []
+    if shop:
+        emp_where.append("e.shop = ?")
+        emp_params.append(shop)
+    if category:
+        emp_where.append("e.category = ?")
+        emp_params.append(category)
+    emp_filter = (" AND " + " AND ".join(emp_where)) if emp_where else ""
+
+    if emp_where:
+        # restricted to matching employees -> inner join
+        sql = ("SELECT l.p_no, l.name, l.exam_type, l.exam_date, l.marks FROM exam_latest l "
+               "JOIN employees e ON e.p_no = l.p_no" + emp_filter + " WHERE ")
     else:
-        df["exam_type_norm"] = pd.Series(dtype=str)
-        df["group"] = pd.Series(dtype=str)
-        df["part"] = pd.Series(dtype=str)
-        df["exam_date_parsed"] = pd.Series(dtype="datetime64[ns]")
-
-    data = {}
-    canonical_parts = _all_part_keys()
-    if not df.empty:
-        df_sorted = df.sort_values(by=["p_no", "group", "exam_date_parsed"], ascending=[True, True, False])
-        for _, r in df_sorted.iterrows():
-            p = r["p_no"]
-            name = r["name"]
-            grp = r.get("group") or (r.get("exam_type_norm") and r["exam_type_norm"].split("_",1)[0])
-            part = r.get("part")
-            if not grp or not part:
-                continue
-            ed = None if pd.isna(r["exam_date_parsed"]) else r["exam_date_parsed"].date().isoformat()
-            marks = None if pd.isna(r["marks"]) else r["marks"]
-            if p not in data:
-                rec = {"p_no": p, "name": name or ""}
-                for g, partk in canonical_parts:
-                    rec[f"{g}_{partk}_marks"] = None
-                    rec[f"{g}_{partk}_date"] = None
-                data[p] = rec
-            marks_key = f"{grp}_{part}_marks"
-            date_key = f"{grp}_{part}_date"
-            if data[p].get(marks_key) is None:
-                data[p][marks_key] = marks
-                data[p][date_key] = ed
-            if not data[p]["name"] and name:
-                data[p]["name"] = name
-
-    # include employees even if they have no exam rows
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT p_no, name FROM employees")
-        for e_pno, e_name in cur.fetchall():
-            e_pno = str(e_pno)
-            if e_pno not in data:
-                rec = {"p_no": e_pno, "name": e_name or ""}
-                for g, partk in canonical_parts:
-                    rec[f"{g}_{partk}_marks"] = None
-                    rec[f"{g}_{partk}_date"] = None
-                data[e_pno] = rec
-
-    out = [data[k] for k in sorted(data.keys())]
-    return out
+        sql = "SELECT l.p_no, l.name, l.exam_type, l.exam_date, l.marks FROM exam_latest l WHERE "
+    sql += ("(l.exam_type IN (" + ", ".join("?" * len(types)) + ") "
+            "OR l.exam_type NOT IN (" + ", ".join("?" * len(canonical)) + ")) "
+            "ORDER BY IFNULL(l.exam_date, '') DESC, l.mark_id DESC")
+    latest = db.fetch(sql, emp_params + types + canonical, form="frame")
+    emps = db.fetch("SELECT e.p_no, e.name FROM employees e WHERE 1=1" + emp_filter, emp_params, form="frame")
+    return _build_pivot(latest, emps, part_keys, column_prefix=False, form=form)
+
+def _build_pivot(latest, emps, part_keys, column_prefix=True, form="dicts"):
+    """
+    Shared pivot builder for an exam_latest frame (p_no, name, exam_type, exam_date, marks),
+    newest first, and an employees frame (p_no, name). Raw exam types are normalized once per
+    distinct value; when two raw types map to the same canonical part the newest row wins.
+    Output columns are <Group>_<Part>_marks/_date (or <Part>_marks/_date with column_prefix=False),
+    one row per p_no sorted by p_no. Built column-wise: no per-employee dicts unless form='dicts'.
+    """
+    if form not in PIVOT_FORMS:
+        raise ValueError(f"Unsupported pivot form: {form}. Use one of {list(PIVOT_FORMS)}")
+    wanted = {_exam_type_key(g, p): (f"{g}_{p}" if column_prefix else p) for g, p in part_keys}
+    labels = list(wanted.values())
+    cols = _pivot_columns(part_keys, column_prefix)
+    df = latest.astype({"exam_type": object})
+    canon = {et: wanted.get(normalize_exam_type(et)) for et in df["exam_type"].dropna().unique()}
+    df["key"] = df["exam_type"].map(canon)
+    df = df[df["key"].notna()].drop_duplicates(subset=["p_no", "key"], keep="first")
+    exam_pno = df["p_no"].astype(str).to_numpy(object)
+    parsed = pd.to_datetime(df["exam_date"], errors="coerce")
+    dates = parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None).to_numpy(object)
+    marks = df["marks"].astype(object).where(df["marks"].notna(), None).to_numpy(object)
+
+    emp_pno = emps["p_no"].astype(str).to_numpy(object)
+    p_nos = np.unique(np.concatenate([emp_pno, exam_pno]))
+    # employee names take precedence; the newest exam-row name only fills in for unknown or unnamed p_no
+    names = {}
+    for p, name in zip(df["p_no"].astype(str).tolist()[::-1], df["name"].tolist()[::-1]):
+        if isinstance(name, str) and name:
+            names[p] = name
+    for p, name in zip(emp_pno.tolist(), emps["name"].tolist()):
+        if isinstance(name, str) and name:
+            names[p] = name
+
+    # one (employee x column) object matrix; each exam row lands in its marks / date cell
+    grid = np.full((len(p_nos), len(cols)), None, dtype=object)
+    grid[:, 0] = p_nos
+    grid[:, 1] = [names.get(p, "") for p in p_nos.tolist()]
+    if len(exam_pno):
+        rows = np.searchsorted(p_nos, exam_pno)
+        slot = 2 + 2 * pd.Index(labels).get_indexer(df["key"])
+        grid[rows, slot] = marks
+        grid[rows, slot + 1] = dates
+    if form == "frame":
+        return pd.DataFrame(grid, columns=cols)
+    return [dict(zip(cols, r)) for r in grid.tolist()]
 
 def export_exam_summary(path):
     """
     Export the pivot to CSV / XLSX / JSON depending on extension.
     """
-    pivot = pivot_exam_summary()
-    canonical_parts = _all_part_keys()
-    cols = ["p_no", "name"]
-    for g, partk in canonical_parts:
-        cols.append(f"{g}_{partk}_marks")
-        cols.append(f"{g}_{partk}_date")
-
-    if not pivot:
-        df = pd.DataFrame(columns=cols)
-    else:
-        df = pd.DataFrame(pivot)
-        for c in cols:
-            if c not in df.columns:
-                df[c] = None
-        df = df[cols]
-
+    df = pivot_exam_summary(form="frame")
     save_dataframe_to_file(df, path)
     return path
 
@@ -371,6 +485,7 @@ def open_exam_window(parent=None, group="Induction"):
     ttk.Label(frm, text="Name (optional)").grid(row=0, column=2, sticky="w", padx=4, pady=4)
     name_e = ttk.Entry(frm, width=30)
     name_e.grid(row=0, column=3, padx=4, pady=4)
+    typeahead.attach_autocomplete(pno_e, name_entry=name_e)
 
     parts = EXAM_GROUPS[group]
     widgets = {}
@@ -392,6 +507,11 @@ def open_exam_window(parent=None, group="Induction"):
         if not pno:
             messagebox.showerror("Required", "P. No is required to save exam entries.", parent=win)
             return
+        try:
+            pno = typeahead.validate_p_no(pno)
+        except ValueError as e:
+            messagebox.showerror("Unknown employee", str(e), parent=win)
+            return
         name = name_e.get().strip() or None
         saved = 0
         errors = []
@@ -462,6 +582,14 @@ def open_marks_window(parent=None, group="Induction"):
     # Controls: refresh and export
     ctrl = ttk.Frame(frm)
     ctrl.pack(side="top", fill="x", pady=(0,6))
+    ttk.Label(ctrl, text="Shop").pack(side="left", padx=(4, 2))
+    shop_cb = ttk.Combobox(ctrl, values=[""] + employee.distinct_employee_values("shop"), state="readonly", width=18)
+    shop_cb.pack(side="left", padx=2)
+    ttk.Label(ctrl, text="Category").pack(side="left", padx=(8, 2))
+    cat_cb = ttk.Combobox(ctrl, values=[""] + employee.distinct_employee_values("category"), state="readonly", width=12)
+    cat_cb.pack(side="left", padx=2)
+    shop_cb.bind("<<ComboboxSelected>>", lambda e: _populate())
+    cat_cb.bind("<<ComboboxSelected>>", lambda e: _populate())
     refresh_btn = ttk.Button(ctrl, text="Refresh", command=lambda: _populate())
     refresh_btn.pack(side="left", padx=4)
     export_btn = ttk.Button(ctrl, text="Export", command=lambda: _export())
@@ -499,32 +627,18 @@ def open_marks_window(parent=None, group="Induction"):
         tv.heading(c, text=header)
         tv.column(c, width=120, anchor="w")
 
+    def _group_rows():
+        return pivot_exam_group(group, shop=shop_cb.get() or None, category=cat_cb.get() or None)
+
     def _populate():
         # Clear
         for r in tv.get_children():
             tv.delete(r)
-        pivot = pivot_exam_summary()
-        # build rows with only group columns
-        for row in pivot:
-            pno = row.get("p_no")
-            name = row.get("name")
-            vals = [pno, name]
-            for part in parts:
-                vals.append(row.get(f"{group}_{part}_marks"))
-                vals.append(row.get(f"{group}_{part}_date"))
-            tv.insert("", "end", values=vals)
+        for row in _group_rows():
+            tv.insert("", "end", values=[row.get(c) for c in cols])
 
     def _export():
-        pivot = pivot_exam_summary()
-        # create DataFrame with only group columns
-        rows_out = []
-        for row in pivot:
-            rec = {"p_no": row.get("p_no"), "name": row.get("name")}
-            for part in parts:
-                rec[f"{part}marks"] = row.get(f"{group}_{part}_marks")
-                rec[f"{part}date"] = row.get(f"{group}_{part}_date")
-            rows_out.append(rec)
-        df = pd.DataFrame(rows_out)
+        df = pd.DataFrame(_group_rows(), columns=cols)
         path = filedialog.asksaveasfilename(defaultextension=".csv",
                                             filetypes=[("CSV",".csv"),("Excel",".xlsx"),("JSON","*.json")])
         if not path:
@@ -581,8 +695,11 @@ def open_bulk_upload_window(parent=None, group="Induction", part=None):
             messagebox.showerror("No file", "Please choose a file to upload.", parent=win); return
         sel_part = part_var.get()
         try:
-            cnt = bulk_upload_for(group, sel_part, fp)
-            messagebox.showinfo("Bulk Upload", f"Inserted {cnt} rows for {group} {sel_part}.", parent=win)
+            report = ingest_exams(fp, force_group=group, force_part=sel_part)
+            msg = f"Inserted {report['inserted']} rows for {group} {sel_part}."
+            if report["rejected"]:
+                msg += "\n\n" + format_rejected_report(report["rejected"])
+            messagebox.showinfo("Bulk Upload", msg, parent=win)
             win.destroy()
         except Exception as e:
             messagebox.showerror("Upload Error", f"Failed to upload: {e}", parent=win)
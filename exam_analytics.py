@@ -0,0 +1,281 @@
+# exam_analytics.py
+"""
+Exam statistics over the latest attempt per (p_no, exam_type) (exam_latest) joined with employees:
+pass rates, mean / median / percentiles per exam type, group, shop, category or cohort,
+and Induction pre/post-test improvement.
+
+Results are cached per argument set and reused until employees or exam_marks change
+(see result_cache.py).
+"""
+import pandas as pd
+from db import get_conn, fetch
+import employee
+import exam
+import result_cache
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+PASS_MARK = 40.0
+
+# columns exam_stats() can group by; "cohort" is the exam month (YYYY-MM)
+GROUP_BY_CHOICES = ("exam_type", "exam_group", "shop", "category", "cohort")
+# columns induction_improvement() can group by; "cohort" is the PreTest month (YYYY-MM)
+IMPROVEMENT_GROUP_BY = ("cohort", "shop", "category")
+
+PRE_TEST = exam._exam_type_key("Induction", "PreTest")
+POST_TEST = exam._exam_type_key("Induction", "PostTest")
+
+STATS_COLUMNS = ["count", "passed", "pass_rate", "mean", "median", "p25", "p75", "p90", "min", "max"]
+IMPROVEMENT_COLUMNS = ["count", "pre_mean", "post_mean", "mean_gain", "median_gain", "improved_pct",
+                       "pre_pass_rate", "post_pass_rate"]
+
+# ---------------------------
+# Result cache (see result_cache.py)
+# ---------------------------
+
+def _cached(name, args, compute):
+    """
+    Return compute() for (name, args), reusing the previous result while the
+    employees / exam_marks versions are unchanged.
+    """
+    return result_cache.memoize(f"exam_analytics.{name}", ("employees", "exam_marks"), args, compute)
+
+
+def clear_cache():
+    result_cache.clear("exam_analytics.")
+
+
+def cache_stats():
+    return result_cache.cache_stats("exam_analytics.")
+
+# ---------------------------
+# SQL helpers
+# ---------------------------
+
+def _filters(exam_group=None, shop=None, category=None):
+    """Build WHERE fragments over exam_latest l / employees e."""
+    where, params = [], []
+    if exam_group:
+        if exam_group not in exam.EXAM_GROUPS:
+            raise ValueError("Unknown exam group: " + str(exam_group))
+        types = [exam._exam_type_key(exam_group, p) for p in exam.EXAM_GROUPS[exam_group]]
+        where.append("l.exam_type IN (" + ", ".join("?" * len(types)) + ")")
+        params.extend(types)
+    if shop:
+        where.append("e.shop = ?")
+        params.append(shop)
+    if category:
+        where.append("e.category = ?")
+        params.append(category)
+    return where, params
+
+
+# SQL expressions for the exam_stats() group keys (over exam_latest l / employees e)
+_GROUP_EXPR = {
+    "exam_type": "l.exam_type",
+    "exam_group": "CASE WHEN instr(l.exam_type, '_') > 0 "
+                  "THEN substr(l.exam_type, 1, instr(l.exam_type, '_') - 1) ELSE l.exam_type END",
+    "shop": "IFNULL(e.shop, '')",
+    "category": "IFNULL(e.category, '')",
+    "cohort": "IFNULL(substr(l.exam_date, 1, 7), '')",
+}
+
+
+def _latest_marks_frame(group_by, exam_group=None, shop=None, category=None):
+    """Latest non-null marks per (p_no, exam_type) with their group key, as a DataFrame (marks, <group_by>)."""
+    where, params = _filters(exam_group, shop, category)
+    where.insert(0, "l.marks IS NOT NULL")
+    # only join employees when a shop/category key or filter needs it
+    join = " LEFT JOIN employees e ON e.p_no = l.p_no" if (shop or category or group_by in ("shop", "category")) else ""
+    sql = ("SELECT l.marks, " + _GROUP_EXPR[group_by] + " AS " + group_by
+           + " FROM exam_latest l" + join + " WHERE " + " AND ".join(where))
+    return fetch(sql, params, form="frame", categorical=())
+
+
+def _frame_records(df, key):
+    out = []
+    for k, row in df.iterrows():
+        rec = {key: k}
+        for c in df.columns:
+            v = row[c]
+            rec[c] = None if pd.isna(v) else (int(v) if c in ("count", "passed") else round(float(v), 2))
+        out.append(rec)
+    return out
+
+# ---------------------------
+# Public API
+# ---------------------------
+
+def exam_stats(group_by="exam_type", exam_group=None, shop=None, category=None, pass_mark=PASS_MARK):
+    """
+    Statistics of the latest marks per employee and exam type, grouped by group_by
+    (one of GROUP_BY_CHOICES). Optional filters: exam_group, shop, category (exact match).
+    Returns list[dict] with group_by + STATS_COLUMNS, sorted by the group key;
+    pass_rate is the percentage of marks >= pass_mark.
+    """
+    if group_by not in GROUP_BY_CHOICES:
+        raise ValueError("group_by must be one of " + ", ".join(GROUP_BY_CHOICES))
+    pass_mark = float(pass_mark)
+
+    def compute():
+        df = _latest_marks_frame(group_by, exam_group, shop, category)
+        if df.empty:
+            return []
+        df[group_by] = df[group_by].astype("category")
+        g = df.groupby(group_by, sort=True, observed=True)["marks"]
+        stats = g.agg(["count", "mean", "median", "min", "max"])
+        stats["passed"] = (df["marks"] >= pass_mark).groupby(df[group_by], observed=True).sum()
+        stats["pass_rate"] = 100.0 * stats["passed"] / stats["count"]
+        q = g.quantile([0.25, 0.75, 0.9]).unstack()
+        stats["p25"], stats["p75"], stats["p90"] = q[0.25], q[0.75], q[0.9]
+        return _frame_records(stats[STATS_COLUMNS], group_by)
+
+    return _cached("exam_stats", (group_by, exam_group, shop, category, pass_mark), compute)
+
+
+def induction_improvement(group_by="cohort", shop=None, category=None, pass_mark=PASS_MARK):
+    """
+    Induction PreTest -> PostTest comparison for employees who have both, grouped by group_by
+    (one of IMPROVEMENT_GROUP_BY). Returns list[dict] with group_by + IMPROVEMENT_COLUMNS;
+    gains are PostTest - PreTest marks, improved_pct is the share with a positive gain.
+    """
+    if group_by not in IMPROVEMENT_GROUP_BY:
+        raise ValueError("group_by must be one of " + ", ".join(IMPROVEMENT_GROUP_BY))
+    pass_mark = float(pass_mark)
+
+    def compute():
+        where, params = _filters(None, shop, category)
+        where.insert(0, "l.exam_type IN (?, ?)")
+        sql = """
+            SELECT l.p_no,
+                   MAX(CASE WHEN l.exam_type = ? THEN l.marks END) AS pre,
+                   MAX(CASE WHEN l.exam_type = ? THEN l.marks END) AS post,
+                   IFNULL(MAX(CASE WHEN l.exam_type = ? THEN substr(l.exam_date, 1, 7) END), '') AS cohort,
+                   IFNULL(e.shop, '') AS shop, IFNULL(e.category, '') AS category
+            FROM exam_latest l LEFT JOIN employees e ON e.p_no = l.p_no
+            WHERE """ + " AND ".join(where) + """
+            GROUP BY l.p_no
+            HAVING pre IS NOT NULL AND post IS NOT NULL"""
+        with get_conn() as conn:
+            df = pd.read_sql_query(sql, conn, params=[PRE_TEST, POST_TEST, PRE_TEST, PRE_TEST, POST_TEST] + params)
+        if df.empty:
+            return []
+        df["gain"] = df["post"] - df["pre"]
+        g = df.groupby(group_by, sort=True)
+        stats = g.agg(count=("p_no", "count"), pre_mean=("pre", "mean"), post_mean=("post", "mean"),
+                      mean_gain=("gain", "mean"), median_gain=("gain", "median"))
+        stats["improved_pct"] = 100.0 * (df["gain"] > 0).groupby(df[group_by]).mean()
+        stats["pre_pass_rate"] = 100.0 * (df["pre"] >= pass_mark).groupby(df[group_by]).mean()
+        stats["post_pass_rate"] = 100.0 * (df["post"] >= pass_mark).groupby(df[group_by]).mean()
+        return _frame_records(stats[IMPROVEMENT_COLUMNS], group_by)
+
+    return _cached("induction_improvement", (group_by, shop, category, pass_mark), compute)
+
+
+def rank_exam_marks(exam_type, shop=None, category=None, limit=None):
+    """
+    Rank employees on one exam type by their latest marks (highest first) using SQL window functions.
+    Returns list[dict]: p_no, name, marks, exam_date, rank, percentile (0-100, share of marks at or below).
+    """
+    exam_type = exam.normalize_exam_type(exam_type)
+    where, params = _filters(None, shop, category)
+    where[:0] = ["l.exam_type = ?", "l.marks IS NOT NULL"]
+    sql = """
+        SELECT l.p_no, COALESCE(e.name, l.name) AS name, l.marks, l.exam_date,
+               RANK() OVER (ORDER BY l.marks DESC) AS rank,
+               ROUND(100.0 * CUME_DIST() OVER (ORDER BY l.marks), 1) AS percentile
+        FROM exam_latest l LEFT JOIN employees e ON e.p_no = l.p_no
+        WHERE """ + " AND ".join(where) + """
+        ORDER BY l.marks DESC, l.p_no"""
+    if limit:
+        sql += " LIMIT " + str(int(limit))
+
+    def compute():
+        return fetch(sql, [exam_type] + params)
+
+    return _cached("rank_exam_marks", (exam_type, shop, category, limit), compute)
+
+# ---------------------------
+# GUI: Stats window
+# ---------------------------
+
+def open_stats_window(parent=None):
+    """
+    Toplevel with exam statistics (grouped per selection) and the Induction improvement table.
+    """
+    win = tk.Toplevel(parent) if parent is not None else tk.Toplevel()
+    win.title("Exam Statistics")
+    win.geometry("1100x520")
+
+    ctrl = ttk.Frame(win)
+    ctrl.pack(side="top", fill="x", padx=8, pady=6)
+    ttk.Label(ctrl, text="View").pack(side="left")
+    view_cb = ttk.Combobox(ctrl, values=["Statistics", "Induction Improvement"], state="readonly", width=20)
+    view_cb.set("Statistics")
+    view_cb.pack(side="left", padx=4)
+    ttk.Label(ctrl, text="Group by").pack(side="left", padx=(8, 2))
+    group_by_cb = ttk.Combobox(ctrl, values=list(GROUP_BY_CHOICES), state="readonly", width=12)
+    group_by_cb.set("exam_type")
+    group_by_cb.pack(side="left", padx=2)
+    ttk.Label(ctrl, text="Exam group").pack(side="left", padx=(8, 2))
+    group_cb = ttk.Combobox(ctrl, values=[""] + list(exam.EXAM_GROUPS.keys()), state="readonly", width=10)
+    group_cb.pack(side="left", padx=2)
+    ttk.Label(ctrl, text="Shop").pack(side="left", padx=(8, 2))
+    shop_cb = ttk.Combobox(ctrl, values=[""] + employee.distinct_employee_values("shop"), state="readonly", width=14)
+    shop_cb.pack(side="left", padx=2)
+    ttk.Label(ctrl, text="Category").pack(side="left", padx=(8, 2))
+    cat_cb = ttk.Combobox(ctrl, values=[""] + employee.distinct_employee_values("category"), state="readonly", width=10)
+    cat_cb.pack(side="left", padx=2)
+    ttk.Label(ctrl, text="Pass mark").pack(side="left", padx=(8, 2))
+    pass_e = ttk.Entry(ctrl, width=6)
+    pass_e.insert(0, f"{PASS_MARK:g}")
+    pass_e.pack(side="left", padx=2)
+
+    tree_frame = ttk.Frame(win)
+    tree_frame.pack(fill="both", expand=True, padx=8, pady=4)
+    tv = ttk.Treeview(tree_frame, show="headings")
+    vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tv.yview)
+    tv.configure(yscroll=vsb.set)
+    tv.pack(side="left", fill="both", expand=True)
+    vsb.pack(side="right", fill="y")
+
+    def _on_view(*_):
+        improvement = view_cb.get() == "Induction Improvement"
+        group_by_cb.configure(values=list(IMPROVEMENT_GROUP_BY if improvement else GROUP_BY_CHOICES))
+        if group_by_cb.get() not in group_by_cb.cget("values"):
+            group_by_cb.set("cohort" if improvement else "exam_type")
+        group_cb.configure(state="disabled" if improvement else "readonly")
+        _populate()
+
+    def _populate(*_):
+        try:
+            pass_mark = float(pass_e.get() or PASS_MARK)
+        except ValueError:
+            messagebox.showerror("Invalid", "Pass mark must be a number.", parent=win)
+            return
+        key = group_by_cb.get()
+        shop, category = shop_cb.get() or None, cat_cb.get() or None
+        if view_cb.get() == "Induction Improvement":
+            rows = induction_improvement(key, shop=shop, category=category, pass_mark=pass_mark)
+            cols = [key] + IMPROVEMENT_COLUMNS
+        else:
+            rows = exam_stats(key, exam_group=group_cb.get() or None, shop=shop, category=category, pass_mark=pass_mark)
+            cols = [key] + STATS_COLUMNS
+        for r in tv.get_children():
+            tv.delete(r)
+        tv["columns"] = cols
+        for c in cols:
+            tv.heading(c, text=c)
+            tv.column(c, width=160 if c == key else 80, anchor="w")
+        for row in rows:
+            tv.insert("", "end", values=["" if row.get(c) is None else row.get(c) for c in cols])
+
+    view_cb.bind("<<ComboboxSelected>>", _on_view)
+    for cb in (group_by_cb, group_cb, shop_cb, cat_cb):
+        cb.bind("<<ComboboxSelected>>", _populate)
+    pass_e.bind("<Return>", _populate)
+    ttk.Button(ctrl, text="Refresh", command=_populate).pack(side="left", padx=6)
+
+    _populate()
+    return win
@@ -0,0 +1,188 @@
+# import_batch.py
+"""
+Provenance and undo for bulk uploads.
+
+Each bulk_upload_* run opens an import_batch row inside its write transaction and stamps its
+batch_id on every row it inserts or changes. Before an upsert overwrites existing rows, the old
+values are copied to attendance_undo / employees_undo, and only rows whose values actually
+change are copied. Separations and exam marks are insert-only, so their batch_id alone is
+enough to undo them.
+
+rollback_batch(batch_id) reverts a whole upload with a handful of set-based statements on the
+batch_id indexes, whatever its size. Rows edited after the upload (which clears or replaces
+their batch_id) keep the later edit, and employees the upload created are kept while rows entered
+since (attendance, exams, separations from another batch or typed in) still refer to them;
+rollback_preview() reports how many before anything is changed.
+"""
+from db import get_conn
+import employee
+import writer
+
+KINDS = ("employees", "attendance", "separations", "exams")
+EMPLOYEE_VALUE_COLUMNS = ["name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category"]
+BATCH_COLUMNS = ["batch_id", "kind", "source", "rows", "status", "created_at", "rolled_back_at"]
+CHILD_TABLES = ("attendance", "exam_marks", "separation")
+
+# employees.p_no has rows that did not come from batch ? (deleting the employee would cascade them)
+_HAS_LATER_ROWS = " OR ".join(
+    f"EXISTS (SELECT 1 FROM {t} d WHERE d.p_no = employees.p_no AND d.batch_id IS NOT ?)" for t in CHILD_TABLES)
+
+
+def source_name(filepath):
+    """What to record as a batch's source: the path, or DataFrame.attrs['source'] for pre-parsed frames."""
+    if isinstance(filepath, str):
+        return filepath
+    attrs = getattr(filepath, "attrs", None) or {}
+    return attrs.get("source")
+
+
+def begin_batch(cur, kind, source=None):
+    """Create an import_batch row on cur (inside the caller's write transaction); returns batch_id."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown import kind: {kind}. Use one of {list(KINDS)}")
+    cur.execute("INSERT INTO import_batch (kind, source, created_at) VALUES (?, ?, datetime('now'))",
+                (kind, source))
+    return cur.lastrowid
+
+
+def close_batch(cur, batch_id, rows):
+    """Record the row count; a batch that wrote nothing is dropped again."""
+    if rows:
+        cur.execute("UPDATE import_batch SET rows = ? WHERE batch_id = ?", (rows, batch_id))
+    else:
+        cur.execute("DELETE FROM import_batch WHERE batch_id = ?", (batch_id,))
+
+
+def capture_attendance(cur, batch_id, stage):
+    """
+    Copy the attendance rows that stage (a table of p_no, date, status) is about to change into
+    attendance_undo. Rows whose status would stay the same are left alone.
+    """
+    cur.execute(f"""
+        INSERT OR IGNORE INTO attendance_undo (batch_id, p_no, date, status, prev_batch_id)
+        SELECT ?, a.p_no, a.date, a.status, a.batch_id
+        FROM {stage} s JOIN attendance a ON a.p_no = s.p_no AND a.date = s.date
+        WHERE a.status IS NOT s.status
+    """, (batch_id,))
+
+
+def capture_employees(cur, batch_id, stage, columns=EMPLOYEE_VALUE_COLUMNS):
+    """
+    Copy the employees that stage (p_no plus the given columns) is about to change into
+    employees_undo. The whole old row is kept so a rollback restores it as it was.
+    """
+    changed = " OR ".join(f"e.{c} IS NOT s.{c}" for c in columns)
+    cols = ", ".join(EMPLOYEE_VALUE_COLUMNS)
+    cur.execute(f"""
+        INSERT OR IGNORE INTO employees_undo (batch_id, p_no, {cols}, prev_batch_id)
+        SELECT ?, e.p_no, {", ".join("e." + c for c in EMPLOYEE_VALUE_COLUMNS)}, e.batch_id
+        FROM {stage} s JOIN employees e ON e.p_no = s.p_no
+        WHERE {changed}
+    """, (batch_id,))
+
+
+def list_batches(limit=100, kind=None):
+    """Most recent import batches as dicts (BATCH_COLUMNS)."""
+    sql = f"SELECT {', '.join(BATCH_COLUMNS)} FROM import_batch"
+    params = []
+    if kind:
+        sql += " WHERE kind = ?"
+        params.append(kind)
+    sql += " ORDER BY batch_id DESC LIMIT ?"
+    params.append(int(limit))
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return [dict(zip(BATCH_COLUMNS, r)) for r in cur.fetchall()]
+
+
+def rollback_preview(batch_id):
+    """
+    What rollback_batch(batch_id) would remove, without changing anything: rows per table still
+    carrying the batch id, plus employees_kept (created by the batch but with rows entered since)
+    and later_rows (those rows, which keep the employee).
+    """
+    params = (batch_id,) * len(CHILD_TABLES)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        out = {}
+        for table in CHILD_TABLES + ("employees",):
+            cur.execute(f"SELECT COUNT(*) FROM {table} WHERE batch_id = ?", (batch_id,))
+            out[table] = cur.fetchone()[0]
+        cur.execute(f"SELECT COUNT(*) FROM employees WHERE batch_id = ? AND ({_HAS_LATER_ROWS})",
+                    (batch_id,) + params)
+        out["employees_kept"] = cur.fetchone()[0]
+        out["later_rows"] = 0
+        for table in CHILD_TABLES:
+            cur.execute(f"""
+                SELECT COUNT(*) FROM {table} d JOIN employees e ON e.p_no = d.p_no
+                WHERE e.batch_id = ? AND d.batch_id IS NOT ?
+            """, (batch_id, batch_id))
+            out["later_rows"] += cur.fetchone()[0]
+        out["employees"] -= out["employees_kept"]
+    return out
+
+
+def rollback_batch(batch_id):
+    """
+    Revert everything import batch batch_id wrote:
+    - exam marks and separations it inserted are deleted
+    - attendance statuses it replaced are restored, attendance rows it inserted deleted
+    - employees it changed get their old values back; employees it created are deleted, except
+      those with attendance / exams / separations entered since, which are kept (employees_kept)
+    Rows changed again after the upload are left as they are now.
+    Returns {table: rows affected}. Raises ValueError for unknown or already rolled back batches.
+    """
+    cols = ", ".join(EMPLOYEE_VALUE_COLUMNS)
+
+    def op(cur):
+        cur.execute("SELECT status FROM import_batch WHERE batch_id = ?", (batch_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Unknown import batch: {batch_id}")
+        if row[0] != "active":
+            raise ValueError(f"Import batch {batch_id} is already {row[0]}")
+        counts = {}
+
+        # employees it updated: back to their old values
+        cur.execute(f"""
+            UPDATE employees SET ({cols}, batch_id) =
+                (SELECT {cols}, u.prev_batch_id FROM employees_undo u
+                 WHERE u.batch_id = ? AND u.p_no = employees.p_no)
+            WHERE batch_id = ? AND p_no IN (SELECT p_no FROM employees_undo WHERE batch_id = ?)
+        """, (batch_id, batch_id, batch_id))
+        counts["employees_restored"] = cur.rowcount
+
+        # attendance it replaced: old status back in place (rows set again since keep the later value)
+        cur.execute("""
+            UPDATE attendance SET (status, batch_id) =
+                (SELECT u.status, u.prev_batch_id FROM attendance_undo u
+                 WHERE u.batch_id = ? AND u.p_no = attendance.p_no AND u.date = attendance.date)
+            WHERE batch_id = ? AND EXISTS (SELECT 1 FROM attendance_undo u WHERE u.batch_id = ?
+                                           AND u.p_no = attendance.p_no AND u.date = attendance.date)
+        """, (batch_id, batch_id, batch_id))
+        counts["attendance_restored"] = cur.rowcount
+
+        # rows still carrying the batch id were inserted by it
+        for table in ("exam_marks", "separation", "attendance"):
+            cur.execute(f"DELETE FROM {table} WHERE batch_id = ?", (batch_id,))
+            counts[table] = cur.rowcount
+
+        # whatever employees still carry the batch id were created by it; deleting one that later
+        # rows refer to would cascade them, so those stay as ordinary employees
+        cur.execute(f"UPDATE employees SET batch_id = NULL WHERE batch_id = ? AND ({_HAS_LATER_ROWS})",
+                    (batch_id,) * (len(CHILD_TABLES) + 1))
+        counts["employees_kept"] = cur.rowcount
+        cur.execute("DELETE FROM employees WHERE batch_id = ?", (batch_id,))
+        counts["employees"] = cur.rowcount
+
+        cur.execute("DELETE FROM attendance_undo WHERE batch_id = ?", (batch_id,))
+        cur.execute("DELETE FROM employees_undo WHERE batch_id = ?", (batch_id,))
+        cur.execute("UPDATE import_batch SET status = 'rolled_back', rolled_back_at = datetime('now') "
+                    "WHERE batch_id = ?", (batch_id,))
+        return counts
+
+    counts = writer.execute(op)
+    if counts["employees"] or counts["employees_restored"]:
+        employee.invalidate_employee_cache()
+    return counts
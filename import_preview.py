@@ -0,0 +1,349 @@
+# import_preview.py
+"""
+Import preview: read only the first PREVIEW_ROWS rows of an upload file (pandas nrows,
+openpyxl read-only mode for .xlsx) and report what the bulk uploader would do with it -
+column mapping, dtypes, date formats, status vocabulary, share of known p_no and an
+estimated row count - so a wrong file is rejected in well under a second.
+
+While the preview dialog is open the full file is parsed in a background thread
+(start_full_parse); confirming hands that DataFrame to the uploader, which accepts a
+DataFrame in place of a path (utils.load_dataframe_from_file).
+"""
+import os
+import threading
+import time
+import pandas as pd
+from utils import (SUPPORTED_EXT, DATE_FORMATS, load_dataframe_from_file, map_columns_case_insensitive,
+                   normalize_id_series)
+import employee
+import attendance
+import exam
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+PREVIEW_ROWS = 200
+
+# per upload kind: columns the uploader maps, the ones it cannot do without, and date columns
+KINDS = {
+    "employees": {"columns": employee.EMPLOYEE_COLUMNS, "required": ("p_no", "name"),
+                  "dates": ("dob", "doj", "end_date")},
+    "attendance": {"columns": ["p_no", "date", "status", "name"], "required": ("p_no", "date", "status"),
+                   "dates": ("date",)},
+    "separations": {"columns": ["p_no", "name", "separation_date", "reason"],
+                    "required": ("p_no", "separation_date"), "dates": ("separation_date",)},
+    "exams": {"columns": ["p_no", "name", "exam_type", "exam_date", "marks"],
+              "required": ("p_no", "exam_date", "exam_type"), "dates": ("exam_date",)},
+}
+# below these shares of the sample a problem is an error rather than a warning
+MIN_DATE_SHARE = 0.5
+MIN_STATUS_SHARE = 0.5
+KNOWN_STATUSES = {"Present", "Absent", "Leave"}
+
+
+# ---------------------------
+# Sampling
+# ---------------------------
+
+def _read_xlsx_sample(path, nrows):
+    """First nrows data rows of the active sheet via openpyxl read-only mode; also its declared row count."""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = list(ws.iter_rows(max_row=nrows + 1, values_only=True))
+        declared = ws.max_row
+    finally:
+        wb.close()
+    if not rows:
+        return pd.DataFrame(), 0
+    header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(rows[0])]
+    df = pd.DataFrame(rows[1:], columns=header).dropna(how="all")
+    return df, (declared - 1 if declared else None)
+
+
+def _csv_row_estimate(path, sample_rows):
+    """Estimate data rows of a CSV from the average byte size of its first sample_rows lines."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        sampled = 0
+        for _ in range(sample_rows):
+            line = f.readline()
+            if not line:
+                return sample_rows      # whole file was sampled
+            sampled += len(line)
+    if not sampled:
+        return 0
+    return int(round((size - len(header)) / (sampled / sample_rows)))
+
+
+def read_sample(path, nrows=PREVIEW_ROWS):
+    """
+    Return (sample DataFrame, estimated total rows, exact) reading at most nrows data rows.
+    exact is True when the estimate is a real count (small files, JSON).
+    """
+    _, ext = os.path.splitext(path.lower())
+    if ext not in SUPPORTED_EXT:
+        raise ValueError(f"Unsupported file type: {ext}. Supported: {SUPPORTED_EXT}")
+    if ext == ".csv":
+        df = pd.read_csv(path, nrows=nrows)
+        if len(df) < nrows:
+            return df, len(df), True
+        return df, _csv_row_estimate(path, len(df)), False
+    if ext == ".xlsx":
+        df, declared = _read_xlsx_sample(path, nrows)
+        if len(df) < nrows:
+            return df, len(df), True
+        return df, declared, False
+    if ext == ".xls":
+        df = pd.read_excel(path, nrows=nrows)
+        return df, (len(df) if len(df) < nrows else None), len(df) < nrows
+    # JSON has no cheap partial read; documents are small enough to count
+    df = pd.read_json(path)
+    return df.head(nrows), len(df), True
+
+
+# ---------------------------
+# Detection
+# ---------------------------
+
+def detect_mapping(df, kind):
+    """{canonical column: file column or None}, using the same rules as the kind's uploader."""
+    spec = KINDS[kind]
+    mapping = map_columns_case_insensitive(df, spec["columns"])
+    if kind == "attendance":
+        for key in ("p_no", "date", "status"):
+            if not mapping.get(key):
+                mapping[key] = attendance._attempt_infer_column(df, key)
+    if kind == "exams" and mapping.get("p_no") not in df.columns:
+        mapping["p_no"] = next((c for c in df.columns if str(c).lower() in exam.P_NO_ALIASES), None)
+    return mapping
+
+
+def detect_date_format(series):
+    """
+    Return (format, share parsed) for a sample column: the DATE_FORMATS entry matching most
+    values, 'datetime' for spreadsheet date cells, or (None, 0.0) when nothing parses.
+    """
+    s = series.dropna()
+    if s.empty:
+        return None, 0.0
+    if pd.api.types.is_datetime64_any_dtype(s) or all(hasattr(v, "year") for v in s):
+        return "datetime", 1.0
+    text = s.astype(str).str.strip().str.split(" ").str[0]
+    best, best_share = None, 0.0
+    for fmt in DATE_FORMATS:
+        share = float(pd.to_datetime(text, format=fmt, errors="coerce").notna().mean())
+        if share > best_share:
+            best, best_share = fmt, share
+    return best, best_share
+
+
+def preview_file(path, kind, nrows=PREVIEW_ROWS):
+    """
+    Sample path and check it against the uploader for kind (one of KINDS).
+    Returns a dict: path, kind, seconds, sample (DataFrame), estimated_rows, exact_rows, mapping,
+    missing, dtypes, date_formats {column: (format, share)}, statuses {raw: count},
+    unknown_statuses, known_p_no_share, errors, warnings, ok.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown import kind: {kind}. Use one of {sorted(KINDS)}")
+    t0 = time.perf_counter()
+    spec = KINDS[kind]
+    out = {"path": path, "kind": kind, "errors": [], "warnings": [], "mapping": {}, "missing": [],
+           "dtypes": {}, "date_formats": {}, "statuses": {}, "unknown_statuses": [],
+           "known_p_no_share": None, "estimated_rows": 0, "exact_rows": True, "sample": pd.DataFrame()}
+    try:
+        df, estimate, exact = read_sample(path, nrows)
+    except Exception as e:
+        out["errors"].append(f"Cannot read file: {e}")
+        return _finish(out, t0)
+    out.update(sample=df, estimated_rows=estimate, exact_rows=exact,
+               dtypes={str(c): str(t) for c, t in df.dtypes.items()})
+    if df.empty:
+        out["errors"].append("File has no data rows")
+        return _finish(out, t0)
+
+    mapping = detect_mapping(df, kind)
+    out["mapping"] = mapping
+    out["missing"] = [k for k in spec["required"] if not mapping.get(k)]
+    if out["missing"]:
+        out["errors"].append(f"Required columns missing or not detected: {out['missing']}")
+
+    for key in spec["dates"]:
+        col = mapping.get(key)
+        if not col:
+            continue
+        if df[col].isna().all():
+            continue
+        fmt, share = detect_date_format(df[col])
+        out["date_formats"][key] = (fmt, round(share, 3))
+        msg = (f"{key} ({col}): only {share:.0%} of sampled values parse as {fmt}" if fmt
+               else f"{key} ({col}): no sampled value matches a known date format {list(DATE_FORMATS)}")
+        if share < MIN_DATE_SHARE and key in spec["required"]:
+            out["errors"].append(msg)
+        elif share < 1.0:
+            out["warnings"].append(msg)
+
+    if kind == "attendance" and mapping.get("status"):
+        raw = df[mapping["status"]].dropna()
+        out["statuses"] = {str(k): int(v) for k, v in raw.astype(str).value_counts().items()}
+        normalized = raw.map(attendance.normalize_status)
+        unknown = sorted({str(r) for r, n in zip(raw, normalized) if n not in KNOWN_STATUSES})
+        out["unknown_statuses"] = unknown
+        share = float(normalized.isin(KNOWN_STATUSES).mean()) if len(raw) else 0.0
+        if unknown:
+            msg = f"status ({mapping['status']}): unrecognised values {unknown[:10]}"
+            (out["errors"] if share < MIN_STATUS_SHARE else out["warnings"]).append(msg)
+
+    if kind != "employees" and mapping.get("p_no"):
+        p_nos = normalize_id_series(df[mapping["p_no"]]).dropna()
+        if len(p_nos):
+            share = float(p_nos.isin(employee.known_p_nos()).mean())
+            out["known_p_no_share"] = round(share, 3)
+            if share < 1.0:
+                out["warnings"].append(f"{1 - share:.0%} of sampled p_no are not in Employees")
+    return _finish(out, t0)
+
+
+def _finish(out, t0):
+    out["ok"] = not out["errors"]
+    out["seconds"] = round(time.perf_counter() - t0, 3)
+    return out
+
+
+# ---------------------------
+# Background full parse
+# ---------------------------
+
+class ParseJob:
+    """Handle for a background parse: wait(), done, df, error."""
+
+    def __init__(self, path):
+        self.path = path
+        self.df = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+def start_full_parse(path):
+    """Parse the whole file with load_dataframe_from_file() in a daemon thread. Returns the ParseJob."""
+    job = ParseJob(path)
+
+    def run():
+        try:
+            job.df = load_dataframe_from_file(path)
+            # recorded as the import batch source (import_batch.source_name)
+            job.df.attrs["source"] = path
+        except Exception as e:
+            job.error = e
+        finally:
+            job._done.set()
+
+    threading.Thread(target=run, name="import-parse", daemon=True).start()
+    return job
+
+
+# ---------------------------
+# Dialog
+# ---------------------------
+
+def format_preview(report):
+    """Plain-text summary of preview_file() for dialogs and logs."""
+    lines = [f"File: {os.path.basename(report['path'])}  ({report['kind']})"]
+    est = report["estimated_rows"]
+    if est is not None:
+        lines.append(f"Rows: {est:,}" if report["exact_rows"] else f"Rows: about {est:,} (estimated)")
+    lines.append("Columns:")
+    for key, col in report["mapping"].items():
+        dtype = report["dtypes"].get(str(col), "") if col else ""
+        fmt = report["date_formats"].get(key)
+        extra = f", dates {fmt[0]} ({fmt[1]:.0%})" if fmt and fmt[0] else ""
+        lines.append(f"  {key:<16} <- {col if col else '(not found)'}" + (f"  [{dtype}{extra}]" if col else ""))
+    if report["statuses"]:
+        lines.append("Status values: " + ", ".join(f"{k} x{v}" for k, v in report["statuses"].items()))
+    if report["known_p_no_share"] is not None:
+        lines.append(f"Known p_no in sample: {report['known_p_no_share']:.0%}")
+    for e in report["errors"]:
+        lines.append("ERROR: " + e)
+    for w in report["warnings"]:
+        lines.append("Warning: " + w)
+    lines.append(f"(preview took {report['seconds']}s)")
+    return "\n".join(lines)
+
+
+def open_preview_dialog(parent, path, kind, on_import):
+    """
+    Preview path for kind, start the full parse in the background and ask for confirmation.
+    on_import(df) runs on the Tk thread once the user confirms and the parse has finished.
+    Files with preview errors cannot be imported.
+    """
+    report = preview_file(path, kind)
+    job = start_full_parse(path) if report["ok"] else None
+
+    win = tk.Toplevel(parent)
+    win.title(f"Import preview - {kind}")
+    win.transient(parent)
+    text = tk.Text(win, width=90, height=18, wrap="none")
+    text.insert("1.0", format_preview(report))
+    text.configure(state="disabled")
+    text.pack(side="top", fill="both", expand=True, padx=8, pady=8)
+
+    sample = report["sample"].head(20)
+    if not sample.empty:
+        cols = [str(c) for c in sample.columns]
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=8)
+        for c in cols:
+            tree.heading(c, text=c)
+            tree.column(c, width=110)
+        for row in sample.itertuples(index=False):
+            tree.insert("", "end", values=["" if pd.isna(v) else v for v in row])
+        tree.pack(side="top", fill="x", padx=8)
+
+    bottom = ttk.Frame(win)
+    bottom.pack(side="top", fill="x", padx=8, pady=8)
+    status = ttk.Label(bottom, text="Parsing file in the background..." if job else "Fix the errors above and try again.")
+    status.pack(side="left")
+    import_btn = ttk.Button(bottom, text="Import")
+    import_btn.pack(side="right", padx=4)
+    ttk.Button(bottom, text="Cancel", command=win.destroy).pack(side="right", padx=4)
+    if not job:
+        import_btn.configure(state="disabled")
+        return win
+
+    def poll_parse():
+        if not win.winfo_exists():
+            return
+        if job.done:
+            status.configure(text=f"Parse failed: {job.error}" if job.error else f"Parsed {len(job.df):,} rows.")
+            if job.error:
+                import_btn.configure(state="disabled")
+            return
+        win.after(100, poll_parse)
+
+    def do_import():
+        import_btn.configure(state="disabled")
+        status.configure(text="Waiting for the parse to finish...")
+
+        def wait_then_import():
+            if not job.done:
+                win.after(100, wait_then_import)
+                return
+            if job.error:
+                messagebox.showerror("Import", f"Could not parse file: {job.error}", parent=win)
+                return
+            win.destroy()
+            on_import(job.df)
+        wait_then_import()
+
+    import_btn.configure(command=do_import)
+    poll_parse()
+    return win
@@ -0,0 +1,275 @@
+# ingest.py
+"""
+Watch-folder ingest of attendance files dropped by the biometric terminals.
+
+poll_once(directory) applies only what is new since the checkpoint kept per file in ingest_log:
+- a file seen for the first time is fingerprinted (sha256) and uploaded; a byte-identical copy of
+  a file already ingested under another name is recorded but not applied again
+- a CSV / NDJSON file that grew (the bytes up to its checkpoint still hash the same) has only the
+  appended complete lines parsed; a trailing partial line waits for the next poll
+- any other change (rewritten, truncated, a spreadsheet saved again) re-applies the whole file
+- unchanged files cost one os.stat() per poll: size and mtime are compared before hashing
+- a file that failed to apply keeps its last good checkpoint and is tried again on every poll
+
+Rows go through attendance.bulk_upload_attendance(), which replaces the row per (p_no, date), so a
+chunk re-applied after a crash between the upload and the checkpoint write changes nothing. Both
+the upload and the checkpoint are written by the single writer (writer.py).
+
+Usage:
+    python ingest.py WATCH_DIR [--db DB] [--interval SECONDS] [--once] [--create-missing]
+    python ingest.py --status [--db DB]
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+import pandas as pd
+import db
+from db import get_conn
+import attendance
+import writer
+from utils import load_dataframe_from_file
+
+# the app starts a watcher on this folder when set (see main.App)
+WATCH_DIR = os.environ.get("EMP_INGEST_DIR")
+POLL_SECONDS = 10
+# whole-file formats are only read once they have not been written for this long
+SETTLE_SECONDS = 5
+HASH_CHUNK = 1 << 20
+
+APPENDABLE = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+WHOLE_FILE = {".xlsx", ".xls", ".json"}
+LOG_COLUMNS = ["path", "sha256", "prefix_sha256", "size", "mtime", "offset", "header", "rows",
+               "status", "error", "updated_at"]
+
+_watcher = {"thread": None, "stop": None}
+
+
+def _is_candidate(name):
+    if name.startswith((".", "~$")) or name.endswith((".tmp", ".part")):
+        return False
+    ext = os.path.splitext(name.lower())[1]
+    return ext in APPENDABLE or ext in WHOLE_FILE
+
+
+def _fingerprint(path, size, at=None):
+    """sha256 of the first size bytes of path, plus the hash of the first `at` bytes (or None)."""
+    h = hashlib.sha256()
+    prefix = None
+    done = 0
+    with open(path, "rb") as f:
+        while done < size:
+            want = min(HASH_CHUNK, size - done)
+            if at is not None and done < at < done + want:
+                want = at - done
+            block = f.read(want)
+            if not block:
+                break
+            h.update(block)
+            done += len(block)
+            if at is not None and done == at:
+                prefix = h.hexdigest()
+    return (prefix if at else None), h.hexdigest()
+
+
+def _read_lines(path, kind, start, end, header):
+    """
+    Parse the complete lines in bytes [start, end) of a CSV / NDJSON file.
+    Returns (DataFrame or None, new_offset, header); new_offset stops after the last newline.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    cut = data.rfind(b"\n")
+    if cut < 0:
+        return None, start, header
+    data = data[:cut + 1]
+    new_offset = start + len(data)
+    if kind == "ndjson":
+        lines = data.strip()
+        return (pd.read_json(io.BytesIO(lines), lines=True) if lines else None), new_offset, header
+    if start == 0:
+        first, _, _ = data.partition(b"\n")
+        header = first.decode("utf-8-sig").rstrip("\r")
+        body = data
+    else:
+        body = header.encode("utf-8") + b"\n" + data
+    df = pd.read_csv(io.BytesIO(body), encoding="utf-8-sig")
+    return (df if not df.empty else None), new_offset, header
+
+
+def _log_entry(cur, path):
+    cur.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM ingest_log WHERE path = ?", (path,))
+    row = cur.fetchone()
+    return dict(zip(LOG_COLUMNS, row)) if row else None
+
+
+def _save_entry(path, **fields):
+    cols = ["path"] + list(fields)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in fields)
+    writer.execute(lambda cur: cur.execute(f"""
+        INSERT INTO ingest_log ({', '.join(cols)}, updated_at) VALUES ({', '.join('?' * len(cols))}, datetime('now'))
+        ON CONFLICT(path) DO UPDATE SET {updates}, updated_at = excluded.updated_at
+    """, [path] + list(fields.values())))
+
+
+def ingest_file(path, create_missing=False):
+    """
+    Apply whatever is new in one file. Returns a dict: path, action, rows, inserted, created.
+    action: 'unchanged', 'waiting' (still being written), 'duplicate', 'appended', 'full' or 'error'.
+    """
+    path = os.path.abspath(path)
+    result = {"path": path, "action": "unchanged", "rows": 0, "inserted": 0, "created": 0}
+    st = os.stat(path)
+    with get_conn() as conn:
+        entry = _log_entry(conn.cursor(), path)
+    if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+        return result
+
+    ext = os.path.splitext(path.lower())[1]
+    kind = APPENDABLE.get(ext)
+    if kind is None and time.time() - st.st_mtime < SETTLE_SECONDS:
+        result["action"] = "waiting"
+        return result
+
+    resume = entry["offset"] if entry and kind and 0 < entry["offset"] <= st.st_size else None
+    prefix_sha, full_sha = _fingerprint(path, st.st_size, resume)
+    if entry and entry["sha256"] == full_sha:
+        _save_entry(path, size=st.st_size, mtime=st.st_mtime)
+        return result
+    if entry is None or entry["sha256"] is None:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT path FROM ingest_log WHERE sha256 = ? AND status = 'done' LIMIT 1", (full_sha,))
+            same = cur.fetchone()
+        if same:
+            _save_entry(path, sha256=full_sha, prefix_sha256=full_sha, size=st.st_size, mtime=st.st_mtime,
+                        offset=st.st_size, status="duplicate", error=f"same content as {same[0]}")
+            result["action"] = "duplicate"
+            return result
+
+    appended = resume is not None and prefix_sha == entry["prefix_sha256"]
+    start = entry["offset"] if appended else 0
+    header = entry["header"] if appended else None
+    try:
+        if kind:
+            df, offset, header = _read_lines(path, kind, start, st.st_size, header)
+        else:
+            df, offset = load_dataframe_from_file(path), st.st_size
+        if df is not None and not df.empty:
+            df.attrs["source"] = path
+            result["inserted"], result["created"] = attendance.bulk_upload_attendance(df, create_missing)
+            result["rows"] = len(df)
+    except Exception as e:
+        # keep the last good checkpoint (size / mtime / sha256 included) so the next poll retries
+        _save_entry(path, status="error", error=str(e))
+        result["action"] = "error"
+        result["error"] = str(e)
+        return result
+
+    offset_sha = full_sha if offset == st.st_size else _fingerprint(path, offset)[1]
+    rows = (entry["rows"] if appended else 0) + result["rows"]
+    _save_entry(path, sha256=full_sha, prefix_sha256=offset_sha, size=st.st_size, mtime=st.st_mtime,
+                offset=offset, header=header, rows=rows, status="done", error=None)
+    result["action"] = "appended" if appended else "full"
+    return result
+
+
+def poll_once(directory, create_missing=False):
+    """Ingest every candidate file in directory, oldest first. Returns the results that did something."""
+    names = [n for n in os.listdir(directory) if _is_candidate(n)]
+    paths = [os.path.join(directory, n) for n in names if os.path.isfile(os.path.join(directory, n))]
+    paths.sort(key=lambda p: (os.path.getmtime(p), p))
+    results = []
+    for p in paths:
+        try:
+            r = ingest_file(p, create_missing)
+        except OSError as e:
+            # vanished or locked mid-copy; picked up on a later poll
+            print(f"ingest: skip {p}: {e}")
+            continue
+        if r["action"] != "unchanged":
+            results.append(r)
+    return results
+
+
+def start_watcher(directory, interval=POLL_SECONDS, create_missing=False, on_result=None):
+    """
+    Poll directory every interval seconds in a daemon thread (first poll immediately).
+    on_result(result) is called from that thread for each file that did something.
+    """
+    stop_watcher()
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                for r in poll_once(directory, create_missing):
+                    print(f"ingest: {r['action']} {r['path']} rows={r['rows']}")
+                    if on_result:
+                        on_result(r)
+            except Exception as e:
+                print("ingest poll failed:", e)
+            if stop.wait(interval):
+                break
+
+    t = threading.Thread(target=loop, name="attendance-ingest", daemon=True)
+    _watcher.update(thread=t, stop=stop)
+    t.start()
+    return t
+
+
+def stop_watcher():
+    if _watcher["stop"] is not None:
+        _watcher["stop"].set()
+    _watcher.update(thread=None, stop=None)
+
+
+def ingest_status():
+    """ingest_log rows as dicts, most recently updated first."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM ingest_log ORDER BY updated_at DESC, path")
+        return [dict(zip(LOG_COLUMNS, r)) for r in cur.fetchall()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest attendance files dropped into a folder.")
+    parser.add_argument("directory", nargs="?", default=WATCH_DIR, help="folder to watch (default: $EMP_INGEST_DIR)")
+    parser.add_argument("--db", default=None, help="database (default: the application database)")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    parser.add_argument("--create-missing", action="store_true", help="create employees missing from the directory")
+    parser.add_argument("--status", action="store_true", help="show the ingest log")
+    args = parser.parse_args(argv)
+    if args.db:
+        db.DB_FILE = args.db
+    db.init_db()
+
+    if args.status:
+        for e in ingest_status():
+            print(f"{e['updated_at']}  {e['status']:<9} {e['rows']:>7} rows  offset {e['offset']:>10}  {e['path']}"
+                  + (f"  ({e['error']})" if e["error"] else ""))
+        return 0
+    if not args.directory:
+        parser.error("directory is required (or set EMP_INGEST_DIR)")
+    if not os.path.isdir(args.directory):
+        parser.error(f"not a directory: {args.directory}")
+
+    while True:
+        for r in poll_once(args.directory, args.create_missing):
+            print(f"{r['action']:<9} {r['path']}  rows={r['rows']} inserted={r['inserted']} created={r['created']}"
+                  + (f"  error: {r['error']}" if r.get("error") else ""))
+        if args.once:
+            return 0
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
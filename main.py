@@ -8,7 +8,18 @@ import json
 import random
 import db
 import auth
+import query_profiler
+import backup
+import archive
+import ingest
+import import_batch
+import result_cache
+import writer
 import employee, attendance, separation, exam
+import exam_analytics
+import dashboard
+import import_preview
+import typeahead
 from utils import load_dataframe_from_file, save_dataframe_to_file
 db.init_db()
 DEFAULT_SHOPS = [
@@ -17,6 +28,8 @@ DEFAULT_SHOPS = [
     "Maintenance", "Tool Room", "Machine Shop", "Electrical Shop"
 ]
 DEFAULT_CATEGORIES = ["NEEM", "NTTF", "BTECH", "MTECH"]
+EMPLOYEE_SEARCH_LIMIT = 500
+EMPLOYEE_SEARCH_DELAY_MS = 150
 SETTINGS_FILENAME = os.path.join(os.path.dirname(__file__), "app_settings.json")
 class LoginDialog(tk.Toplevel):
     def __init__(self, parent):
@@ -67,6 +80,9 @@ class App(tk.Tk):
         self.current_user = login.result["username"]
         self.user_role = login.result["role"]
         self.is_admin = (self.user_role == "admin")
+        backup.start_scheduler(interval_hours=24)
+        if ingest.WATCH_DIR and os.path.isdir(ingest.WATCH_DIR):
+            ingest.start_watcher(ingest.WATCH_DIR)
         self._build_ui()
     def _load_settings(self):
         """
@@ -101,14 +117,219 @@ class App(tk.Tk):
         self.att_frame = ttk.Frame(nb)
         self.sep_frame = ttk.Frame(nb)
         self.exam_frame = ttk.Frame(nb)
+        self.dash_frame = ttk.Frame(nb)
         nb.add(self.emp_frame, text="Employees")
         nb.add(self.att_frame, text="Attendance")
         nb.add(self.sep_frame, text="Separation")
         nb.add(self.exam_frame, text="Exams")
+        nb.add(self.dash_frame, text="Dashboard")
         self._build_employee_tab()
         self._build_attendance_tab()
         self._build_separation_tab()
         self._build_exam_tab()
+        self._build_dashboard_tab()
+        nb.bind("<<NotebookTabChanged>>", lambda e: self.refresh_dashboard() if nb.select() == str(self.dash_frame) else None)
+        self._build_menu()
+    def _build_menu(self):
+        menubar = tk.Menu(self)
+        if self.is_admin:
+            admin_menu = tk.Menu(menubar, tearoff=0)
+            admin_menu.add_command(label="Diagnostics", command=self.open_diagnostics)
+            admin_menu.add_separator()
+            admin_menu.add_command(label="Backup Now", command=self.backup_now)
+            admin_menu.add_command(label="Restore Backup...", command=self.restore_backup)
+            admin_menu.add_separator()
+            admin_menu.add_command(label="Archive Old Records...", command=self.archive_old_records)
+            admin_menu.add_command(label="Import History...", command=self.open_import_history)
+            menubar.add_cascade(label="Admin", menu=admin_menu)
+        self.config(menu=menubar)
+    def backup_now(self):
+        """
+        Admin-only: page-incremental backup in a background thread; the status bar of the dialog is polled.
+        """
+        if not self.is_admin:
+            messagebox.showwarning("Permission", "Only admin can back up the database.")
+            return
+        job = backup.start_backup("manual")
+        win = tk.Toplevel(self)
+        win.title("Backup")
+        status = ttk.Label(win, text="Starting backup...", width=60)
+        status.pack(padx=12, pady=12)
+        def poll():
+            if job.done:
+                if job.error:
+                    status.configure(text=f"Backup failed: {job.error}")
+                else:
+                    status.configure(text=f"Backup saved to:\n{job.path}")
+                return
+            if job.total:
+                status.configure(text=f"Copying pages: {job.total - job.remaining}/{job.total}")
+            win.after(100, poll)
+        poll()
+    def restore_backup(self):
+        """
+        Admin-only: restore the database from a backup file (a 'pre-restore' snapshot is taken first).
+        """
+        if not self.is_admin:
+            messagebox.showwarning("Permission", "Only admin can restore backups.")
+            return
+        path = filedialog.askopenfilename(title="Select backup", initialdir=backup.BACKUP_DIR,
+                                          filetypes=[("SQLite backup", "*.db")])
+        if not path:
+            return
+        if not messagebox.askyesno("Confirm restore",
+                                   f"Replace ALL current data with the backup\n{path}?\n\n"
+                                   "A snapshot of the current data is taken first."):
+            return
+        try:
+            safety = backup.restore(path)
+        except Exception as e:
+            messagebox.showerror("Restore failed", str(e))
+            return
+        messagebox.showinfo("Restored", f"Backup restored.\nPrevious data saved to: {safety}")
+        self.refresh_employee_list()
+        self.refresh_attendance_view()
+        self.refresh_separation_list()
+        self.refresh_exam_view()
+    def archive_old_records(self):
+        """
+        Admin-only: move old attendance and long-separated employees to the archive database.
+        Reports still include archived rows when their date range reaches back that far.
+        """
+        if not self.is_admin:
+            messagebox.showwarning("Permission", "Only admin can archive records.")
+            return
+        if not messagebox.askyesno("Archive old records",
+                                   f"Move attendance older than {archive.ARCHIVE_HORIZON_DAYS} days and employees "
+                                   f"separated more than {archive.SEPARATED_GRACE_DAYS} days ago to\n"
+                                   f"{archive.archive_path()}?"):
+            return
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            emps = archive.archive_separated()
+            rows = archive.archive_attendance()
+        except Exception as e:
+            messagebox.showerror("Archive failed", str(e))
+            return
+        finally:
+            self.config(cursor="")
+        messagebox.showinfo("Archived", f"Archived {emps} separated employees and {rows} attendance rows.")
+        self.refresh_employee_list()
+        self.refresh_attendance_view()
+        self.refresh_separation_list()
+        self.refresh_exam_view()
+    def open_import_history(self):
+        """
+        Admin-only window listing bulk upload batches; the selected batch can be rolled back.
+        """
+        if not self.is_admin:
+            messagebox.showwarning("Permission", "Only admin can roll back imports.")
+            return
+        win = tk.Toplevel(self)
+        win.title("Import History")
+        win.geometry("900x420")
+        cols = ("batch_id", "kind", "rows", "status", "created_at", "rolled_back_at", "source")
+        tv = ttk.Treeview(win, columns=cols, show="headings", selectmode="browse")
+        for c in cols:
+            tv.heading(c, text=c)
+            tv.column(c, width=90 if c != "source" else 320, anchor="w")
+        tv.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+        def populate():
+            for r in tv.get_children():
+                tv.delete(r)
+            for b in import_batch.list_batches(limit=200):
+                tv.insert("", "end", values=tuple("" if b[c] is None else b[c] for c in cols))
+        def rollback():
+            sel = tv.selection()
+            if not sel:
+                messagebox.showwarning("Select", "Select a batch to roll back.", parent=win)
+                return
+            values = tv.item(sel[0], "values")
+            batch_id, kind, rows = int(values[0]), values[1], values[2]
+            try:
+                preview = import_batch.rollback_preview(batch_id)
+            except Exception as e:
+                messagebox.showerror("Rollback failed", str(e), parent=win)
+                return
+            msg = f"Undo {kind} batch {batch_id} ({rows} rows)?\nRows edited since the upload keep their current values."
+            if preview["employees"]:
+                msg += f"\n{preview['employees']} employee(s) created by this upload will be deleted."
+            if preview["employees_kept"]:
+                msg += (f"\n{preview['employees_kept']} employee(s) created by this upload have "
+                        f"{preview['later_rows']} record(s) entered since and will be kept.")
+            if not messagebox.askyesno("Roll back import", msg, parent=win):
+                return
+            try:
+                backup.snapshot("before-rollback")
+                counts = import_batch.rollback_batch(batch_id)
+            except Exception as e:
+                messagebox.showerror("Rollback failed", str(e), parent=win)
+                return
+            messagebox.showinfo("Rolled back", "\n".join(f"{k}: {v}" for k, v in counts.items() if v) or "Nothing to undo.",
+                                parent=win)
+            populate()
+            self.refresh_employee_list()
+            self.refresh_attendance_view()
+            self.refresh_separation_list()
+            self.refresh_exam_view()
+        btns = ttk.Frame(win)
+        btns.pack(fill="x", padx=8, pady=6)
+        ttk.Button(btns, text="Refresh", command=populate).pack(side="left", padx=4)
+        ttk.Button(btns, text="Roll Back Selected", command=rollback).pack(side="left", padx=4)
+        populate()
+    def open_diagnostics(self):
+        """
+        Admin-only window listing the slowest / most frequent SQL statements recorded by query_profiler.
+        """
+        if not self.is_admin:
+            messagebox.showwarning("Permission", "Only admin can open diagnostics.")
+            return
+        win = tk.Toplevel(self)
+        win.title("Diagnostics - Query Profiler")
+        win.geometry("1100x500")
+        ctrl = ttk.Frame(win)
+        ctrl.pack(side="top", fill="x", padx=8, pady=6)
+        ttk.Label(ctrl, text="Order by").pack(side="left")
+        order_cb = ttk.Combobox(ctrl, values=["total_ms", "max_ms", "mean_ms", "calls", "rows"], state="readonly", width=10)
+        order_cb.set("total_ms")
+        order_cb.pack(side="left", padx=4)
+        cols = ("calls", "total_ms", "mean_ms", "p95_ms", "max_ms", "rows", "top_caller", "sql")
+        tv = ttk.Treeview(win, columns=cols, show="headings")
+        for c in cols:
+            tv.heading(c, text=c)
+            tv.column(c, width=80 if c not in ("top_caller", "sql") else 220, anchor="w")
+        tv.column("sql", width=420)
+        tv.pack(fill="both", expand=True, padx=8)
+        profiler_note = (f"Slow log (>= {query_profiler.SLOW_QUERY_MS:.0f} ms): {query_profiler.SLOW_LOG_FILE}"
+                         if query_profiler.ENABLED else "Query profiling is off; start the app with EMP_QUERY_PROFILER=1 to record statements.")
+        ttk.Label(win, text=profiler_note).pack(anchor="w", padx=8, pady=4)
+        cache_lbl = ttk.Label(win, text="")
+        cache_lbl.pack(anchor="w", padx=8, pady=(0, 4))
+        writer_lbl = ttk.Label(win, text="")
+        writer_lbl.pack(anchor="w", padx=8, pady=(0, 4))
+        def populate(*_):
+            rc = result_cache.cache_stats()
+            cache_lbl.config(text=f"Result cache: {rc['entries']} entries, hit rate {rc['hit_rate']:.0%} "
+                                  f"({rc['hits']} hits, {rc['misses']} misses, {rc['evictions']} evictions)")
+            ws = writer.writer_stats()
+            writer_lbl.config(text=f"Writer: {ws['ops']} writes in {ws['groups']} commits "
+                                   f"({ws['ops_per_group']:g} per commit, largest {ws['largest_group']}), "
+                                   f"{ws['failed']} failed, {ws['queued']} queued")
+            for r in tv.get_children():
+                tv.delete(r)
+            for st in query_profiler.top_statements(n=50, order_by=order_cb.get()):
+                tv.insert("", "end", values=(st["calls"], f"{st['total_ms']:.1f}", f"{st['mean_ms']:.2f}",
+                                             f"{st['p95_ms']:g}", f"{st['max_ms']:.1f}", st["rows"],
+                                             st["top_caller"], st["sql"]))
+        def reset():
+            query_profiler.reset_stats()
+            result_cache.reset_stats()
+            populate()
+        order_cb.bind("<<ComboboxSelected>>", populate)
+        ttk.Button(ctrl, text="Refresh", command=populate).pack(side="left", padx=4)
+        ttk.Button(ctrl, text="Reset Stats", command=reset).pack(side="left", padx=4)
+        populate()
     def _build_employee_tab(self):
         f = self.emp_frame
         left = ttk.Frame(f, width=360)
@@ -177,6 +398,13 @@ class App(tk.Tk):
             self.emp_bulk_btn.configure(state="disabled")
             self.emp_delete_btn.configure(state="disabled")
             self.emp_delete_all_btn.configure(state="disabled")
+        search_frame = ttk.Frame(right)
+        search_frame.pack(fill="x", pady=(0, 6))
+        ttk.Label(search_frame, text="Search (P. No / name / phone / ticket)").pack(side="left")
+        self.emp_search = ttk.Entry(search_frame)
+        self.emp_search.pack(side="left", fill="x", expand=True, padx=6)
+        self.emp_search.bind("<KeyRelease>", self._on_emp_search_key)
+        self._emp_search_job = None
         cols = ("p_no", "name", "phone", "dob", "doj", "end_date", "ticket_no", "shop", "category")
         self.emp_tree = ttk.Treeview(right, columns=cols, show="headings", selectmode="extended")
         for c in cols:
@@ -220,6 +448,7 @@ class App(tk.Tk):
     def clear_employee_filters(self):
         self.filter_shop.set("")
         self.filter_category.set("")
+        self.emp_search.delete(0, "end")
         self.refresh_employee_list()
     def add_update_employee(self):
         pno = self.e_pno.get().strip()
@@ -249,7 +478,11 @@ class App(tk.Tk):
             self.emp_tree.delete(r)
         shop_filter = self.filter_shop.get().strip() or None
         category_filter = self.filter_category.get().strip() or None
-        rows = employee.list_employees(shop=shop_filter, category=category_filter)
+        query = self.emp_search.get().strip()
+        if query:
+            rows = employee.search_employees(query, limit=EMPLOYEE_SEARCH_LIMIT, shop=shop_filter, category=category_filter)
+        else:
+            rows = employee.list_employees(shop=shop_filter, category=category_filter)
         for row in rows:
             self.emp_tree.insert("", "end", values=(
                 row.get("p_no"),
@@ -262,6 +495,16 @@ class App(tk.Tk):
                 row.get("shop"),
                 row.get("category", "")
             ))
+    def _on_emp_search_key(self, event=None):
+        """
+        Debounce search-as-you-type: the list refreshes once typing pauses for EMPLOYEE_SEARCH_DELAY_MS.
+        """
+        if self._emp_search_job is not None:
+            self.after_cancel(self._emp_search_job)
+        self._emp_search_job = self.after(EMPLOYEE_SEARCH_DELAY_MS, self._run_emp_search)
+    def _run_emp_search(self):
+        self._emp_search_job = None
+        self.refresh_employee_list()
     def on_emp_double_click(self, event):
         item = self.emp_tree.selection()
         if not item:
@@ -303,8 +546,9 @@ class App(tk.Tk):
         pno = vals[0]
         if messagebox.askyesno("Confirm", f"Delete employee {pno} and all related records?"):
             try:
+                snap = backup.snapshot("before-delete-employee")
                 employee.delete_employee(pno)
-                messagebox.showinfo("OK", "Deleted.")
+                messagebox.showinfo("OK", f"Deleted.\nSnapshot saved to: {snap}")
                 self.refresh_employee_list()
                 self.refresh_attendance_view()
                 self.refresh_separation_list()
@@ -331,17 +575,11 @@ class App(tk.Tk):
             messagebox.showinfo("Cancelled", "Delete all employees cancelled.")
             return
         try:
-            try:
-                ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_path = os.path.join(os.path.dirname(__file__), f"employees_backup_{ts}.csv")
-                employee.export_employees(backup_path)
-            except Exception:
-                backup_path = None
+            # full-database snapshot (attendance, exams and separations included); abort if it fails
+            backup_path = backup.snapshot("before-delete-all")
             employee.delete_all_employees()
-            msg = "All employees deleted."
-            if backup_path:
-                msg += f"\nBackup saved to: {backup_path}"
-            messagebox.showinfo("Done", msg)
+            messagebox.showinfo("Done", f"All employees deleted.\nSnapshot saved to: {backup_path}\n"
+                                        "Use Admin > Restore Backup to undo.")
             self.refresh_employee_list()
             self.refresh_attendance_view()
             self.refresh_separation_list()
@@ -355,12 +593,14 @@ class App(tk.Tk):
         path = filedialog.askopenfilename(title="Select employee file", filetypes=[("Data files", "*.csv *.xls *.xlsx *.json")])
         if not path:
             return
-        try:
-            count = employee.bulk_upload_employees(path)
-            messagebox.showinfo("Bulk Upload", f"Inserted/updated {count} records.")
-            self.refresh_employee_list()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def run(df):
+            try:
+                count = employee.bulk_upload_employees(df)
+                messagebox.showinfo("Bulk Upload", f"Inserted/updated {count} records.")
+                self.refresh_employee_list()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        import_preview.open_preview_dialog(self, path, "employees", run)
     def export_employees(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("JSON", "*.json")])
         if not path:
@@ -382,6 +622,7 @@ class App(tk.Tk):
         ttk.Label(top, text="Name (optional)").grid(row=0, column=2, sticky="w")
         self.att_single_name = ttk.Entry(top, width=20)
         self.att_single_name.grid(row=0, column=3, padx=4)
+        typeahead.attach_autocomplete(self.att_single_pno, name_entry=self.att_single_name)
         ttk.Label(top, text="Date").grid(row=0, column=4, sticky="w")
         self.att_date = DateEntry(top, date_pattern="yyyy-mm-dd")
         self.att_date.grid(row=0, column=5, padx=4)
@@ -399,6 +640,7 @@ class App(tk.Tk):
         self.view_date.set_date(datetime.date.today())
         self.view_date.grid(row=1, column=7, padx=4)
         ttk.Button(top, text="View Day Attendance", command=self.view_attendance_for_day).grid(row=1, column=8, padx=4)
+        ttk.Button(top, text="Muster Roll", command=self.open_muster_roll).grid(row=1, column=9, padx=4)
         ttk.Label(top, text="From").grid(row=2, column=0, sticky="w")
         self.filter_from = DateEntry(top, date_pattern="yyyy-mm-dd")
         self.filter_from.grid(row=2, column=1, padx=4)
@@ -478,10 +720,10 @@ class App(tk.Tk):
         if not status:
             messagebox.showerror("Required", "Status is required.")
             return
-        with db.get_conn() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM employees WHERE p_no = ?", (pno,))
-            exists = cur.fetchone()[0] > 0
+        resolved = typeahead.resolve(pno)
+        exists = resolved is not None
+        if exists:
+            pno = resolved
         create_missing = bool(self.create_missing_single_var.get())
         if not exists and create_missing:
             if not self.is_admin:
@@ -494,7 +736,10 @@ class App(tk.Tk):
                 messagebox.showerror("Error", f"Failed to create employee: {e}")
                 return
         if not exists and not create_missing:
-            messagebox.showwarning("Missing employee", "Employee not found. Either create the employee first or enable 'Create missing' checkbox (admin only).")
+            try:
+                typeahead.validate_p_no(pno)
+            except ValueError as e:
+                messagebox.showwarning("Missing employee", f"{e}\nEither create the employee first or enable 'Create missing' checkbox (admin only).")
             return
         try:
             attendance.update_attendance(pno, date, status)
@@ -509,16 +754,166 @@ class App(tk.Tk):
         date_from = self.filter_from.get_date()
         date_to = self.filter_to.get_date()
         sort_by = self.sort_by_cb.get().strip() or None
-        data = attendance.get_attendance_summary(date_from=date_from, date_to=date_to, sort_by=sort_by)
+        data = attendance.get_attendance_summary(date_from=date_from, date_to=date_to, sort_by=sort_by, form="tuples")
         for row in data:
-            self.att_tree.insert("", "end", values=(row["p_no"], row["name"], row["present"], row["absent"], row["leave"]))
+            self.att_tree.insert("", "end", values=row)
+    def _apply_attendance_delta(self, date_val, changes, names):
+        """Adjust the summary rows of the changed employees in place instead of re-running the summary."""
+        date_from = self.filter_from.get_date()
+        date_to = self.filter_to.get_date()
+        if (date_from and date_val < date_from) or (date_to and date_val > date_to):
+            return
+        col = {"Present": 2, "Absent": 3, "Leave": 4}
+        items = {str(self.att_tree.item(iid, "values")[0]): iid for iid in self.att_tree.get_children()}
+        for pno, (old, new) in changes.items():
+            iid = items.get(pno)
+            if iid is None:
+                if new not in col:
+                    continue
+                iid = self.att_tree.insert("", "end", values=(pno, names.get(pno, ""), 0, 0, 0))
+            values = list(self.att_tree.item(iid, "values"))
+            for c in (2, 3, 4):
+                values[c] = int(values[c])
+            if old in col:
+                values[col[old]] -= 1
+            if new in col:
+                values[col[new]] += 1
+            if values[2] + values[3] + values[4] == 0:
+                self.att_tree.delete(iid)
+            else:
+                self.att_tree.item(iid, values=values)
+    def open_muster_roll(self):
+        win = tk.Toplevel(self)
+        win.title("Muster Roll")
+        top = ttk.Frame(win)
+        top.pack(side="top", fill="x", padx=8, pady=8)
+        ttk.Label(top, text="Shop").grid(row=0, column=0, sticky="w")
+        shop_cb = ttk.Combobox(top, values=self.shops, state="readonly", width=18)
+        if self.shops:
+            shop_cb.set(self.shops[0])
+        shop_cb.grid(row=0, column=1, padx=4)
+        ttk.Label(top, text="Date").grid(row=0, column=2, sticky="w")
+        date_entry = DateEntry(top, date_pattern="yyyy-mm-dd")
+        date_entry.set_date(datetime.date.today())
+        date_entry.grid(row=0, column=3, padx=4)
+        cols = ("p_no", "name", "status")
+        tv = ttk.Treeview(win, columns=cols, show="headings", selectmode="extended")
+        for c in cols:
+            tv.heading(c, text=c)
+            tv.column(c, width=180, anchor="w")
+        tv.tag_configure("changed", background="#fff2b3")
+        tv.pack(fill="both", expand=True, padx=8)
+        ttk.Label(win, text="P / A / L: mark selected rows and move down    Delete: clear    Ctrl+S: save").pack(anchor="w", padx=8)
+        bottom = ttk.Frame(win)
+        bottom.pack(side="top", fill="x", padx=8, pady=8)
+        count_lbl = ttk.Label(bottom, text="")
+        count_lbl.pack(side="left")
+        # p_no -> status as loaded / as edited, for the date and shop currently shown
+        state = {"date": None, "original": {}, "current": {}, "names": {}}
+        def changed():
+            return {p: s for p, s in state["current"].items() if s != state["original"][p]}
+        def update_counts():
+            totals = {}
+            for s in state["current"].values():
+                totals[s] = totals.get(s, 0) + 1
+            count_lbl.configure(text="   ".join(f"{k}: {totals.get(k, 0)}" for k in ("Present", "Absent", "Leave", "Not Recorded"))
+                                + f"   |   unsaved changes: {len(changed())}")
+        def confirm_discard():
+            return not changed() or messagebox.askyesno("Unsaved changes", "Discard the unsaved muster changes?", parent=win)
+        def load():
+            if not confirm_discard():
+                return
+            date_val = date_entry.get_date()
+            rows = attendance.get_attendance_for_date(date_val, shop=shop_cb.get() or None, form="tuples")
+            tv.delete(*tv.get_children())
+            state.update(date=date_val, original={}, current={}, names={})
+            for pno, name, status in rows:
+                pno = str(pno)
+                state["original"][pno] = state["current"][pno] = status
+                state["names"][pno] = name
+                tv.insert("", "end", iid=pno, values=(pno, name, status))
+            first = tv.get_children()
+            if first:
+                tv.selection_set(first[0])
+                tv.focus(first[0])
+            tv.focus_set()
+            update_counts()
+        def set_row(pno, status):
+            state["current"][pno] = status
+            tv.item(pno, values=(pno, state["names"][pno], status),
+                    tags=("changed",) if status != state["original"][pno] else ())
+        def mark(status):
+            sel = tv.selection()
+            if not sel:
+                return "break"
+            for pno in sel:
+                set_row(pno, status)
+            nxt = tv.next(sel[-1])
+            if nxt:
+                tv.selection_set(nxt)
+                tv.focus(nxt)
+                tv.see(nxt)
+            update_counts()
+            return "break"
+        def on_key(event):
+            status = {"p": "Present", "a": "Absent", "l": "Leave"}.get(event.char.lower())
+            if status:
+                return mark(status)
+        def mark_rest_present():
+            # selected rows and rows already keyed in this session keep their status
+            skip = set(tv.selection())
+            for pno in tv.get_children():
+                if pno not in skip and state["current"][pno] == state["original"][pno]:
+                    set_row(pno, "Present")
+            update_counts()
+        def save():
+            changes = changed()
+            if not changes:
+                messagebox.showinfo("Muster Roll", "Nothing to save.", parent=win)
+                return "break"
+            try:
+                attendance.save_muster(state["date"], changes)
+            except Exception as e:
+                messagebox.showerror("Error", str(e), parent=win)
+                return "break"
+            self._apply_attendance_delta(state["date"], {p: (state["original"][p], s) for p, s in changes.items()},
+                                         state["names"])
+            state["original"].update(changes)
+            for pno in changes:
+                tv.item(pno, tags=())
+            update_counts()
+            messagebox.showinfo("Muster Roll", f"Saved {len(changes)} changes for {state['date']}.", parent=win)
+            return "break"
+        def close():
+            if confirm_discard():
+                win.destroy()
+        def export_register():
+            month = date_entry.get_date()
+            path = filedialog.asksaveasfilename(parent=win, defaultextension=".xlsx",
+                                                filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")])
+            if not path:
+                return
+            try:
+                attendance.export_muster_register(month, shop=shop_cb.get() or None, path=path)
+                messagebox.showinfo("Export", f"Muster register for {month:%Y-%m} exported to {path}", parent=win)
+            except Exception as e:
+                messagebox.showerror("Export error", str(e), parent=win)
+        tv.bind("<KeyPress>", on_key)
+        tv.bind("<Delete>", lambda e: mark("Not Recorded"))
+        win.bind("<Control-s>", lambda e: save())
+        win.protocol("WM_DELETE_WINDOW", close)
+        ttk.Button(top, text="Load", command=load).grid(row=0, column=4, padx=4)
+        ttk.Button(top, text="Export Month Register", command=export_register).grid(row=0, column=5, padx=4)
+        ttk.Button(bottom, text="Save", command=save).pack(side="right", padx=4)
+        ttk.Button(bottom, text="Mark all Present except selected", command=mark_rest_present).pack(side="right", padx=4)
+        load()
     def view_attendance_for_day(self):
         try:
             date_val = self.view_date.get_date()
         except Exception:
             messagebox.showerror("Date", "Select a valid date.")
             return
-        rows = attendance.get_attendance_for_date(date_val)
+        rows = attendance.get_attendance_for_date(date_val, form="tuples")
         if not rows:
             messagebox.showinfo("Result", "No employees found.")
             return
@@ -531,14 +926,14 @@ class App(tk.Tk):
             tv.column(c, width=180, anchor="w")
         tv.pack(fill="both", expand=True)
         for r in rows:
-            tv.insert("", "end", values=(r["p_no"], r["name"], r["status"]))
+            tv.insert("", "end", values=r)
         def export_day():
             path = filedialog.asksaveasfilename(defaultextension=".csv",
                                                 filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("JSON", "*.json")])
             if not path:
                 return
             import pandas as pd
-            df = pd.DataFrame(rows)
+            df = pd.DataFrame(rows, columns=cols)
             save_dataframe_to_file(df, path)
             messagebox.showinfo("Export", f"Day attendance exported to {path}")
         ttk.Button(win, text="Export", command=export_day).pack(pady=6)
@@ -561,7 +956,7 @@ class App(tk.Tk):
             t.heading(c, text=c)
         t.pack(fill="both", expand=True)
         for r in found:
-            t.insert("", "end", values=(r["p_no"], r["name"], r["leave_count"]))
+            t.insert("", "end", values=r)
     def filter_by_absent_count(self):
         try:
             target = int(self.absent_day_count.get())
@@ -581,7 +976,7 @@ class App(tk.Tk):
             t.heading(c, text=c)
         t.pack(fill="both", expand=True)
         for r in found:
-            t.insert("", "end", values=(r["p_no"], r["name"], r["absent_count"]))
+            t.insert("", "end", values=r)
     def bulk_upload_attendance(self):
         if not self.is_admin:
             messagebox.showwarning("Permission", "Only admin can bulk upload.")
@@ -589,17 +984,19 @@ class App(tk.Tk):
         path = filedialog.askopenfilename(title="Select attendance file", filetypes=[("Data files", "*.csv *.xls *.xlsx *.json")])
         if not path:
             return
-        create_missing = messagebox.askyesno(
-            "Create missing employees?",
-            "If the attendance file contains P.Nos that are not in Employees, do you want to automatically create minimal employee entries for them?\n\nYes = create missing employees (will use Name column if present)\nNo = skip attendance rows for unknown P.Nos"
-        )
-        try:
-            inserted, created = attendance.bulk_upload_attendance(path, create_missing=create_missing)
-            messagebox.showinfo("Bulk Upload", f"Inserted {inserted} attendance rows.\nCreated {created} new employee(s).")
-            self.refresh_attendance_view()
-            self.refresh_employee_list()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def run(df):
+            create_missing = messagebox.askyesno(
+                "Create missing employees?",
+                "If the attendance file contains P.Nos that are not in Employees, do you want to automatically create minimal employee entries for them?\n\nYes = create missing employees (will use Name column if present)\nNo = skip attendance rows for unknown P.Nos"
+            )
+            try:
+                inserted, created = attendance.bulk_upload_attendance(df, create_missing=create_missing)
+                messagebox.showinfo("Bulk Upload", f"Inserted {inserted} attendance rows.\nCreated {created} new employee(s).")
+                self.refresh_attendance_view()
+                self.refresh_employee_list()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        import_preview.open_preview_dialog(self, path, "attendance", run)
     def bulk_upload_employees_from_att_tab(self):
         if not self.is_admin:
             messagebox.showwarning("Permission", "Only admin can bulk upload employees.")
@@ -607,13 +1004,15 @@ class App(tk.Tk):
         path = filedialog.askopenfilename(title="Select employee file (CSV/XLSX/JSON)", filetypes=[("Data files", "*.csv *.xls *.xlsx *.json")])
         if not path:
             return
-        try:
-            count = employee.bulk_upload_employees(path)
-            messagebox.showinfo("Bulk Upload Employees", f"Inserted/updated {count} employee records.")
-            self.refresh_employee_list()
-            self.refresh_attendance_view()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def run(df):
+            try:
+                count = employee.bulk_upload_employees(df)
+                messagebox.showinfo("Bulk Upload Employees", f"Inserted/updated {count} employee records.")
+                self.refresh_employee_list()
+                self.refresh_attendance_view()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        import_preview.open_preview_dialog(self, path, "employees", run)
     def export_attendance_summary(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("JSON", "*.json")])
         if not path:
@@ -733,6 +1132,8 @@ class App(tk.Tk):
         self.sep_delete_btn = ttk.Button(top, text="Delete Selected Separation", command=self.delete_selected_separation)
         self.sep_delete_btn.grid(row=2, column=2, padx=4, pady=6)
         ttk.Button(top, text="Export Separations", command=self.export_separations).grid(row=2, column=3, padx=4, pady=6)
+        self.sep_more_btn = ttk.Button(top, text="Load More", command=self.load_more_separations)
+        self.sep_more_btn.grid(row=2, column=4, padx=4, pady=6)
         if not self.is_admin:
             self.sep_bulk_btn.configure(state="disabled")
             self.sep_delete_btn.configure(state="disabled")
@@ -758,8 +1159,17 @@ class App(tk.Tk):
     def refresh_separation_list(self):
         for r in self.sep_tree.get_children():
             self.sep_tree.delete(r)
-        for row in separation.list_separations():
-            self.sep_tree.insert("", "end", values=(row["id"], row["p_no"], row["name"], row["separation_date"], row["reason"]))
+        self._sep_cursor = None
+        self.load_more_separations()
+    def load_more_separations(self):
+        """
+        Append the next page of separations (newest first) to the list.
+        """
+        page = separation.query_separations(page_size=500, cursor=getattr(self, "_sep_cursor", None))
+        for row in page["rows"]:
+            self.sep_tree.insert("", "end", values=row)
+        self._sep_cursor = page["next_cursor"]
+        self.sep_more_btn.configure(state="normal" if self._sep_cursor else "disabled")
     def delete_selected_separation(self):
         if not self.is_admin:
             messagebox.showwarning("Permission", "Only admin can delete separation records.")
@@ -780,12 +1190,20 @@ class App(tk.Tk):
         path = filedialog.askopenfilename(title="Select separation file", filetypes=[("Data files", "*.csv *.xls *.xlsx *.json")])
         if not path:
             return
-        try:
-            count = separation.bulk_upload_separations(path)
-            messagebox.showinfo("Bulk Upload", f"Inserted {count} separation rows.")
-            self.refresh_separation_list()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def run(df):
+            set_end_date = messagebox.askyesno(
+                "Set end date?",
+                "Also set each employee's End Date to the uploaded separation date?"
+            )
+            try:
+                count = separation.bulk_upload_separations(df, set_end_date=set_end_date)
+                messagebox.showinfo("Bulk Upload", f"Inserted {count} separation rows.")
+                self.refresh_separation_list()
+                if set_end_date:
+                    self.refresh_employee_list()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        import_preview.open_preview_dialog(self, path, "separations", run)
     def export_separations(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("JSON", "*.json")])
         if not path:
@@ -805,6 +1223,7 @@ class App(tk.Tk):
         self.exam_bulk_btn.grid(row=0, column=0, padx=4, pady=6)
         ttk.Button(top, text="Export Exam Summary", command=self.export_exam_summary).grid(row=0, column=1, padx=4, pady=6)
         ttk.Button(top, text="Refresh Summary", command=self.refresh_exam_view).grid(row=0, column=2, padx=4, pady=6)
+        ttk.Button(top, text="Exam Stats", command=lambda: exam_analytics.open_stats_window(self)).grid(row=0, column=3, padx=4, pady=6)
         if not self.is_admin:
             self.exam_bulk_btn.configure(state="disabled")
         group_btn_frame = ttk.Frame(top)
@@ -856,10 +1275,10 @@ class App(tk.Tk):
         if not widgets:
             messagebox.showwarning("No panel", "No inputs found for group.")
             return
-        pno = simpledialog.askstring("P. No", "Enter P. No (employee ID):", parent=self)
-        if not pno:
+        picked = typeahead.ask_employee(self, title="P. No", prompt="Enter P. No or ticket (or type a name and pick):")
+        if not picked:
             return
-        name = simpledialog.askstring("Name (optional)", "Enter Name (optional):", parent=self)
+        pno, name = picked
         written = 0
         errors = []
         for part, w in widgets.items():
@@ -911,12 +1330,17 @@ class App(tk.Tk):
         path = filedialog.askopenfilename(title="Select exams file", filetypes=[("Data files", "*.csv *.xls *.xlsx *.json")])
         if not path:
             return
-        try:
-            count = exam.bulk_upload_exams(path)
-            messagebox.showinfo("Bulk Upload", f"Inserted {count} exam rows.")
-            self.refresh_exam_view()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def run(df):
+            try:
+                report = exam.ingest_exams(df)
+                msg = f"Inserted {report['inserted']} exam rows."
+                if report["rejected"]:
+                    msg += "\n\n" + exam.format_rejected_report(report["rejected"])
+                messagebox.showinfo("Bulk Upload", msg)
+                self.refresh_exam_view()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+        import_preview.open_preview_dialog(self, path, "exams", run)
     def export_exam_summary(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("JSON", "*.json")])
         if not path:
@@ -926,6 +1350,81 @@ class App(tk.Tk):
             messagebox.showinfo("Export", f"Exam summary exported to {path}")
         except Exception as e:
             messagebox.showerror("Export error", str(e))
+    def _build_dashboard_tab(self):
+        """
+        Daily present / absent / leave % per shop or category (from the daily_shop_stats aggregate).
+        """
+        f = self.dash_frame
+        top = ttk.Frame(f)
+        top.pack(side="top", fill="x", padx=8, pady=8)
+        ttk.Label(top, text="From").grid(row=0, column=0, sticky="w")
+        self.dash_from = DateEntry(top, date_pattern="yyyy-mm-dd")
+        self.dash_from.set_date(datetime.date.today() - datetime.timedelta(days=365))
+        self.dash_from.grid(row=0, column=1, padx=4)
+        ttk.Label(top, text="To").grid(row=0, column=2, sticky="w")
+        self.dash_to = DateEntry(top, date_pattern="yyyy-mm-dd")
+        self.dash_to.grid(row=0, column=3, padx=4)
+        ttk.Label(top, text="Group by").grid(row=0, column=4, sticky="w")
+        self.dash_group = ttk.Combobox(top, values=dashboard.GROUP_BY_CHOICES, state="readonly", width=10)
+        self.dash_group.set("shop")
+        self.dash_group.grid(row=0, column=5, padx=4)
+        ttk.Label(top, text="Metric").grid(row=0, column=6, sticky="w")
+        self.dash_metric = ttk.Combobox(top, values=dashboard.METRICS, state="readonly", width=12)
+        self.dash_metric.set("present_pct")
+        self.dash_metric.grid(row=0, column=7, padx=4)
+        ttk.Label(top, text="Shop").grid(row=1, column=0, sticky="w")
+        self.dash_shop = ttk.Combobox(top, values=["All"] + self.shops, state="readonly", width=18)
+        self.dash_shop.set("All")
+        self.dash_shop.grid(row=1, column=1, padx=4, pady=4)
+        ttk.Label(top, text="Category").grid(row=1, column=2, sticky="w")
+        self.dash_category = ttk.Combobox(top, values=["All"] + self.categories, state="readonly", width=12)
+        self.dash_category.set("All")
+        self.dash_category.grid(row=1, column=3, padx=4, pady=4)
+        ttk.Button(top, text="Refresh", command=self.refresh_dashboard).grid(row=1, column=4, padx=4, pady=4)
+        for cb in (self.dash_group, self.dash_metric, self.dash_shop, self.dash_category):
+            cb.bind("<<ComboboxSelected>>", lambda e: self.refresh_dashboard())
+        body = ttk.Frame(f)
+        body.pack(side="top", fill="both", expand=True, padx=8, pady=8)
+        self.dash_canvas = tk.Canvas(body, background="white", height=380)
+        self.dash_canvas.pack(side="top", fill="both", expand=True)
+        self.dash_canvas.bind("<Configure>", lambda e: self._draw_dashboard())
+        cols = ("group", "present", "absent", "leave", "total", "present_pct", "absent_pct", "leave_pct")
+        self.dash_tree = ttk.Treeview(body, columns=cols, show="headings", height=8)
+        for c in cols:
+            self.dash_tree.heading(c, text=c)
+            self.dash_tree.column(c, width=110)
+        self.dash_tree.pack(side="top", fill="x", pady=(8, 0))
+        self._dash_data = None
+    def refresh_dashboard(self):
+        group_by = self.dash_group.get()
+        shop = self.dash_shop.get()
+        category = self.dash_category.get()
+        args = dict(date_from=self.dash_from.get_date(), date_to=self.dash_to.get_date(), group_by=group_by,
+                    shop=None if shop == "All" else shop, category=None if category == "All" else category)
+        try:
+            daily = dashboard.daily_shop_stats(**args)
+            period = dashboard.period_shop_stats(**args)
+        except Exception as e:
+            messagebox.showerror("Dashboard", str(e))
+            return
+        preferred = {"shop": self.shops, "category": self.categories}.get(group_by)
+        groups = dashboard.order_groups(period[group_by].tolist(), preferred)
+        self._dash_data = (daily, group_by, groups)
+        self._draw_dashboard()
+        for r in self.dash_tree.get_children():
+            self.dash_tree.delete(r)
+        rows = period.set_index(group_by)
+        for g in groups:
+            r = rows.loc[g]
+            self.dash_tree.insert("", "end", values=(g or "(none)", int(r["present"]), int(r["absent"]), int(r["leave"]),
+                                                     int(r["total"]), r["present_pct"], r["absent_pct"], r["leave_pct"]))
+    def _draw_dashboard(self):
+        if not self._dash_data:
+            return
+        daily, group_by, groups = self._dash_data
+        metric = self.dash_metric.get()
+        dashboard.draw_trend_chart(self.dash_canvas, daily, group_by, metric, groups=groups,
+                                   title=f"{metric.replace('_pct', '').title()} % by {group_by}")
 if __name__ == "__main__":
     app = App()
     app.mainloop()
\ No newline at end of file
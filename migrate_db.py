@@ -1,58 +1,52 @@
 # migrate_db.py
-import sqlite3
-import sys
+"""
+Bring a database file to the current schema (see migrations.py).
+
+Usage:
+    python migrate_db.py [DB_FILE ...]      migrate (default: the application database)
+    python migrate_db.py --status [DB_FILE ...]
+"""
+import argparse
 import os
+import sys
+import db
+import migrations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pending schema migrations.")
+    parser.add_argument("db_files", nargs="*", help="database files (default: the application database)")
+    parser.add_argument("--status", action="store_true", help="only show the schema version of each file")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for path in args.db_files or [db.DB_FILE]:
+        if not os.path.exists(path):
+            print(f"Database file '{path}' not found.")
+            status = 1
+            continue
+        conn = db._connect(path)
+        try:
+            version = migrations.current_version(conn)
+        finally:
+            conn.close()
+        if args.status:
+            pending = [v for v, _, _ in migrations.MIGRATIONS if v > version]
+            print(f"{path}: schema version {version}, {len(pending)} pending (latest {migrations.LATEST_VERSION})")
+            continue
+        if version == migrations.LATEST_VERSION:
+            print(f"{path}: up to date (version {version}).")
+            continue
+        print(f"{path}: migrating from version {version} to {migrations.LATEST_VERSION}")
+        try:
+            db.init_db(path, progress=print)
+        except Exception as e:
+            print("Migration failed:", e)
+            status = 1
+            continue
+        print(f"{path}: migration complete.")
+    return status
 
-DB_FILE = "employees.db"
-REQUIRED = [
-    ("p_no", "TEXT"),
-    ("name", "TEXT"),
-    ("phone", "TEXT"),
-    ("date_of_joining", "TEXT"),
-    ("end_date", "TEXT"),
-    ("dob", "TEXT"),
-    ("ticket_no", "TEXT"),
-    ("shop", "TEXT")
-]
-
-def get_columns(conn, table):
-    cur = conn.execute(f"PRAGMA table_info({table})")
-    return [row[1] for row in cur.fetchall()]
-
-def main():
-    if not os.path.exists(DB_FILE):
-        print(f"Database file '{DB_FILE}' not found in this folder.")
-        sys.exit(1)
-
-    try:
-        conn = sqlite3.connect(DB_FILE)
-    except Exception as e:
-        print("Failed to open DB:", e)
-        sys.exit(1)
-
-    try:
-        existing = get_columns(conn, "employees")
-    except Exception as e:
-        print("Error reading table info. Table 'employees' may not exist yet.")
-        print("Original error:", e)
-        conn.close()
-        sys.exit(1)
-
-    added = []
-    cur = conn.cursor()
-    for col, coltype in REQUIRED:
-        if col not in existing:
-            sql = f"ALTER TABLE employees ADD COLUMN {col} {coltype}"
-            print("Adding column:", col)
-            cur.execute(sql)
-            added.append(col)
-    conn.commit()
-    conn.close()
-
-    if added:
-        print("Migration complete. Added columns:", ", ".join(added))
-    else:
-        print("No missing columns found. Nothing to do.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,717 @@
+# migrations.py
+"""
+Versioned schema migrations for the employee database.
+
+The schema version lives in PRAGMA user_version. migrate() runs every migration newer than
+that, in order, each in its own transaction that also bumps user_version, so a failed step
+leaves the database at the previous version. A database already at LATEST_VERSION costs one
+PRAGMA read at startup.
+
+Migrations must be idempotent (IF NOT EXISTS, column checks) because databases created before
+versioning start at user_version 0 with parts of the schema already in place.
+Foreign keys are switched off while migrating so rebuild_table() can replace referenced tables.
+"""
+import db
+
+# rows copied per INSERT ... SELECT batch in rebuild_table()
+BATCH_SIZE = 50_000
+
+EMPLOYEE_COLUMNS = [("phone", "TEXT"), ("dob", "TEXT"), ("doj", "TEXT"), ("end_date", "TEXT"),
+                    ("ticket_no", "TEXT"), ("shop", "TEXT"), ("category", "TEXT")]
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+
+def _table_exists(cur, table):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
+
+def _columns(cur, table):
+    cur.execute(f"PRAGMA table_info({table})")
+    return [r[1] for r in cur.fetchall()]
+
+
+def _report(progress, message):
+    if progress:
+        progress(message)
+
+
+def rebuild_table(cur, table, create_sql, column_map=None, where=None, drop_indexes=(),
+                  batch_size=BATCH_SIZE, progress=None):
+    """
+    Replace table with a new definition (constraints, column types, keys):
+      1. create {table}__new from create_sql (a CREATE TABLE statement using "{table}" as the name)
+      2. copy the rows in rowid batches of batch_size, reporting progress
+      3. drop the old table, rename the new one, and recreate the old table's indexes and
+         triggers (except drop_indexes)
+    column_map: {new column: SQL expression over the old columns}; columns present in both
+                tables are copied as-is unless mapped.
+    where: optional filter over the old rows (e.g. keep the newest row per key).
+    Must run inside a migration (transaction open, foreign keys off). Returns rows copied.
+    """
+    tmp = f"{table}__new"
+    cur.execute(f"DROP TABLE IF EXISTS {tmp}")
+    cur.execute(create_sql.format(table=tmp))
+    cur.execute("SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+                "AND sql IS NOT NULL", (table,))
+    dependents = [(t, n, sql) for t, n, sql in cur.fetchall() if n not in drop_indexes]
+
+    old_cols = set(_columns(cur, table))
+    mapping = {c: c for c in _columns(cur, tmp) if c in old_cols}
+    mapping.update(column_map or {})
+    targets = ", ".join(mapping)
+    exprs = ", ".join(mapping.values())
+    filt = f" AND ({where})" if where else ""
+
+    cur.execute(f"SELECT COUNT(*) FROM {table}")
+    total = cur.fetchone()[0]
+    copied, last = 0, None
+    while True:
+        cur.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+                    (last if last is not None else -2 ** 63, batch_size))
+        upper = cur.fetchone()[0]
+        if upper is None:
+            break
+        cur.execute(f"INSERT INTO {tmp} ({targets}) SELECT {exprs} FROM {table} "
+                    f"WHERE rowid > ? AND rowid <= ?{filt}",
+                    (last if last is not None else -2 ** 63, upper))
+        copied += max(cur.rowcount, 0)
+        last = upper
+        _report(progress, f"  {table}: {copied:,} of {total:,} rows copied")
+
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {tmp} RENAME TO {table}")
+    for kind, name, sql in dependents:
+        try:
+            cur.execute(sql)
+        except Exception as e:
+            # e.g. an index on a column the new definition no longer has
+            print(f"rebuild_table {table}: could not recreate {kind} {name}:", e)
+    cur.execute(f"PRAGMA foreign_key_check({table})")
+    orphans = len(cur.fetchall())
+    if orphans:
+        print(f"rebuild_table {table}: {orphans} rows reference missing parents")
+    return copied
+
+
+# ---------------------------
+# Migrations (append only; never edit a released step, add a new one)
+# ---------------------------
+
+def _m001_base_tables(cur, progress):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS employees (
+        p_no TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        phone TEXT,
+        dob TEXT,
+        doj TEXT,
+        end_date TEXT,
+        ticket_no TEXT,
+        shop TEXT,
+        category TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS separation (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        name TEXT,
+        separation_date TEXT NOT NULL,
+        reason TEXT,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS exam_marks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        name TEXT,
+        exam_type TEXT NOT NULL,
+        exam_date TEXT,
+        marks REAL,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL
+    )
+    """)
+
+
+def _m002_employee_columns(cur, progress):
+    """Columns added over time (category) or named differently in old copies (date_of_joining, number)."""
+    cols = _columns(cur, "employees")
+    for col, coltype in EMPLOYEE_COLUMNS:
+        if col not in cols:
+            _report(progress, f"  employees: adding column {col}")
+            cur.execute(f"ALTER TABLE employees ADD COLUMN {col} {coltype}")
+    if "date_of_joining" in cols:
+        cur.execute("UPDATE employees SET doj = date_of_joining WHERE doj IS NULL AND date_of_joining IS NOT NULL")
+    if "number" in cols:
+        cur.execute("UPDATE employees SET phone = number WHERE phone IS NULL AND number IS NOT NULL")
+
+
+_CHILD_TABLES = {
+    "attendance": """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )""",
+    "separation": """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        name TEXT,
+        separation_date TEXT NOT NULL,
+        reason TEXT,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )""",
+    "exam_marks": """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        name TEXT,
+        exam_type TEXT NOT NULL,
+        exam_date TEXT,
+        marks REAL,
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )""",
+}
+_CHILD_REQUIRED = {"attendance": ("p_no", "date", "status"), "separation": ("p_no", "separation_date"),
+                   "exam_marks": ("p_no", "exam_type")}
+
+
+def _m003_legacy_tables(cur, progress):
+    """
+    Bring copies made by older versions of the app to the current table layout:
+      - users(password) -> users(password_hash)
+      - attendance / separation / exam_marks without an id column -> rebuilt
+      - wide exam_marks (induction_marks, sem1_marks, ...) -> kept as exam_marks_legacy
+      - rows of separations / exams / exam_entries -> separation / exam_marks
+    """
+    user_cols = _columns(cur, "users")
+    if "password_hash" not in user_cols and "password" in user_cols:
+        cur.connection.create_function("_hash_password", 2, db._hash_password)
+        rebuild_table(cur, "users", """
+        CREATE TABLE {table} (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL
+        )""", column_map={"password_hash": "_hash_password(username, IFNULL(password, ''))",
+                          "role": "IFNULL(role, 'user')"}, progress=progress)
+
+    for table, create_sql in _CHILD_TABLES.items():
+        cols = _columns(cur, table)
+        if "id" in cols:
+            continue
+        if table == "exam_marks" and "exam_type" not in cols:
+            _report(progress, "  exam_marks: keeping wide legacy table as exam_marks_legacy")
+            cur.execute("ALTER TABLE exam_marks RENAME TO exam_marks_legacy")
+            cur.execute(create_sql.format(table="exam_marks"))
+            continue
+        where = " AND ".join(f"{c} IS NOT NULL" for c in _CHILD_REQUIRED[table])
+        rebuild_table(cur, table, create_sql, where=where, progress=progress)
+
+    # rows kept in differently named tables by older builds
+    copies = (("separations", "separation", ("p_no", "name", "separation_date", "reason")),
+              ("exams", "exam_marks", ("p_no", "name", "exam_type", "exam_date", "marks")),
+              ("exam_entries", "exam_marks", ("p_no", "name", "exam_type", "exam_date", "marks")))
+    for src, dest, cols in copies:
+        if not _table_exists(cur, src):
+            continue
+        required = " AND ".join(f"{c} IS NOT NULL" for c in _CHILD_REQUIRED[dest])
+        cur.execute(f"INSERT INTO {dest} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM {src} "
+                    f"WHERE {required} AND p_no IN (SELECT p_no FROM employees)")
+        _report(progress, f"  {src}: {max(cur.rowcount, 0)} rows copied into {dest}")
+
+
+def _m004_attendance_unique(cur, progress):
+    """One attendance row per (p_no, date): keep the newest row of each duplicate set."""
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'attendance'")
+    if "UNIQUE" in (cur.fetchone()[0] or "").upper():
+        return
+    # seek index for the newest-row check below; superseded by the UNIQUE index afterwards
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_pno_date ON attendance(p_no, date)")
+    rebuild_table(cur, "attendance", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        p_no TEXT NOT NULL,
+        date TEXT NOT NULL,
+        status TEXT NOT NULL,
+        UNIQUE (p_no, date),
+        FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE
+    )""", where="NOT EXISTS (SELECT 1 FROM attendance a2 WHERE a2.p_no = attendance.p_no "
+                "AND a2.date = attendance.date AND a2.id > attendance.id)",
+        drop_indexes=("idx_attendance_pno_date",), progress=progress)
+
+
+def _m005_exam_latest(cur, progress):
+    # Latest attempt per (p_no, exam_type), maintained by triggers on exam_marks.
+    # "Latest" = greatest (exam_date, id); rows without a date sort first.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS exam_latest (
+        p_no TEXT NOT NULL,
+        exam_type TEXT NOT NULL,
+        mark_id INTEGER NOT NULL,
+        name TEXT,
+        exam_date TEXT,
+        marks REAL,
+        PRIMARY KEY (p_no, exam_type)
+    )
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_exam_latest_insert AFTER INSERT ON exam_marks
+    BEGIN
+        INSERT INTO exam_latest (p_no, exam_type, mark_id, name, exam_date, marks)
+        VALUES (NEW.p_no, NEW.exam_type, NEW.id, NEW.name, NEW.exam_date, NEW.marks)
+        ON CONFLICT(p_no, exam_type) DO UPDATE SET
+            mark_id = excluded.mark_id, name = excluded.name,
+            exam_date = excluded.exam_date, marks = excluded.marks
+        WHERE (IFNULL(excluded.exam_date, ''), excluded.mark_id)
+              > (IFNULL(exam_latest.exam_date, ''), exam_latest.mark_id);
+    END
+    """)
+    # recompute lookups seek by p_no ("+exam_type" keeps the low-selectivity exam_type index out);
+    # recreated so databases with the earlier trigger bodies pick this up
+    cur.execute("DROP TRIGGER IF EXISTS trg_exam_latest_delete")
+    cur.execute("DROP TRIGGER IF EXISTS trg_exam_latest_update")
+    cur.execute("""
+    CREATE TRIGGER trg_exam_latest_delete AFTER DELETE ON exam_marks
+    WHEN EXISTS (SELECT 1 FROM exam_latest
+                 WHERE p_no = OLD.p_no AND exam_type = OLD.exam_type AND mark_id = OLD.id)
+    BEGIN
+        DELETE FROM exam_latest WHERE p_no = OLD.p_no AND exam_type = OLD.exam_type;
+        INSERT INTO exam_latest (p_no, exam_type, mark_id, name, exam_date, marks)
+        SELECT p_no, exam_type, id, name, exam_date, marks FROM exam_marks
+        WHERE p_no = OLD.p_no AND +exam_type = OLD.exam_type
+        ORDER BY IFNULL(exam_date, '') DESC, id DESC LIMIT 1;
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER trg_exam_latest_update AFTER UPDATE ON exam_marks
+    BEGIN
+        DELETE FROM exam_latest
+        WHERE (p_no = OLD.p_no AND exam_type = OLD.exam_type) OR (p_no = NEW.p_no AND exam_type = NEW.exam_type);
+        INSERT OR REPLACE INTO exam_latest (p_no, exam_type, mark_id, name, exam_date, marks)
+        SELECT p_no, exam_type, id, name, exam_date, marks FROM exam_marks
+        WHERE p_no = OLD.p_no AND +exam_type = OLD.exam_type
+        ORDER BY IFNULL(exam_date, '') DESC, id DESC LIMIT 1;
+        INSERT OR REPLACE INTO exam_latest (p_no, exam_type, mark_id, name, exam_date, marks)
+        SELECT p_no, exam_type, id, name, exam_date, marks FROM exam_marks
+        WHERE p_no = NEW.p_no AND +exam_type = NEW.exam_type
+        ORDER BY IFNULL(exam_date, '') DESC, id DESC LIMIT 1;
+    END
+    """)
+    # backfill once for databases that already had exam history
+    cur.execute("SELECT EXISTS (SELECT 1 FROM exam_latest)")
+    if not cur.fetchone()[0]:
+        cur.execute("""
+        INSERT INTO exam_latest (p_no, exam_type, mark_id, name, exam_date, marks)
+        SELECT p_no, exam_type, id, name, exam_date, marks FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY p_no, exam_type
+                                         ORDER BY IFNULL(exam_date, '') DESC, id DESC) AS rn
+            FROM exam_marks
+        ) WHERE rn = 1
+        """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_exam_latest_type ON exam_latest(exam_type)")
+
+
+def _m006_query_indexes(cur, progress):
+    # Indexes backing the keyset-paginated exam / separation queries
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_exam_marks_date ON exam_marks(IFNULL(exam_date, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_exam_marks_pno_date ON exam_marks(p_no, IFNULL(exam_date, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_exam_marks_type_date ON exam_marks(exam_type, IFNULL(exam_date, ''))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_separation_date ON separation(separation_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_separation_pno_date ON separation(p_no, separation_date)")
+
+
+def _m007_table_versions(cur, progress):
+    # Per-table change counters, bumped by triggers on every row change. Callers that cache
+    # derived results (e.g. exam_analytics) key them on these versions.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    for table in db.VERSIONED_TABLES:
+        cur.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,))
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{op.lower()} AFTER {op} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+            END
+            """)
+
+
+def _m008_change_journal(cur, progress):
+    # Change journal: one row per local insert/update/delete on the data tables, keyed by
+    # natural key, used by sync.py to exchange deltas between office databases.
+    # db_state.mode gates journaling: 'normal' = journal local writes; any other mode
+    # (e.g. 'sync' while applying a peer's changes) writes without journaling.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS db_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        site_id TEXT NOT NULL,
+        mode TEXT NOT NULL DEFAULT 'normal'
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS change_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_key TEXT NOT NULL,
+        op TEXT NOT NULL CHECK (op IN ('upsert', 'delete')),
+        changed_at INTEGER NOT NULL,
+        site_id TEXT NOT NULL
+    )
+    """)
+    # how far each peer's journal has been applied here (sync.pull)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        site_id TEXT PRIMARY KEY,
+        last_seq INTEGER NOT NULL DEFAULT 0,
+        last_path TEXT,
+        last_sync_at TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_change_journal_key ON change_journal(table_name, row_key, changed_at)")
+    now_ms = db._NOW_MS_SQL
+    site_sql = "(SELECT site_id FROM db_state WHERE id = 1)"
+    for table, keys in db.JOURNAL_KEYS.items():
+        new_key = "json_array(" + ", ".join("NEW." + k for k in keys) + ")"
+        old_key = "json_array(" + ", ".join("OLD." + k for k in keys) + ")"
+        key_changed = " OR ".join(f"OLD.{k} IS NOT NEW.{k}" for k in keys)
+        for name, event, when, key, op in (
+                ("insert", "INSERT", "", new_key, "upsert"),
+                ("update", "UPDATE", "", new_key, "upsert"),
+                ("rekey", "UPDATE", f" AND ({key_changed})", old_key, "delete"),
+                ("delete", "DELETE", "", old_key, "delete")):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_journal_{name} AFTER {event} ON {table}
+            WHEN (SELECT mode FROM db_state WHERE id = 1) = 'normal'{when}
+            BEGIN
+                INSERT INTO change_journal (table_name, row_key, op, changed_at, site_id)
+                VALUES ('{table}', {key}, '{op}', {now_ms}, {site_sql});
+            END
+            """)
+    cur.execute("SELECT 1 FROM db_state WHERE id = 1")
+    if cur.fetchone() is None:
+        # new site: journal the rows that predate the journal so the first sync ships them
+        cur.execute("INSERT INTO db_state (id, site_id, mode) VALUES (1, ?, 'normal')", (db.new_site_id(),))
+        for table, keys in db.JOURNAL_KEYS.items():
+            cur.execute(f"""
+            INSERT INTO change_journal (table_name, row_key, op, changed_at, site_id)
+            SELECT '{table}', json_array({", ".join(keys)}), 'upsert', {now_ms}, {site_sql} FROM {table}
+            """)
+
+
+def _m009_archive_state(cur, progress):
+    # archive.py bookkeeping: newest date moved to the archive database per table, so reports
+    # know whether a date range needs the archive attached
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS archive_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date)")
+
+
+# per-row 0/1 counters for a status; used by the daily_shop_stats triggers and backfill
+_STATUS_COUNTS = "{r}.status = 'Present', {r}.status = 'Absent', {r}.status = 'Leave', 1"
+_ADD_COUNTS = ("ON CONFLICT(date, shop, category) DO UPDATE SET present = present + excluded.present, "
+               "absent = absent + excluded.absent, leave = leave + excluded.leave, total = total + excluded.total")
+
+
+def _m010_daily_shop_stats(cur, progress):
+    # Present / absent / leave counts per (date, shop, category) of existing employees, kept in
+    # step by triggers on attendance and employees. Archive moves (db_state.mode = 'archive')
+    # leave the counts alone: archived attendance still counts towards the plant history.
+    # Missing shop / category are stored as ''.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS daily_shop_stats (
+        date TEXT NOT NULL,
+        shop TEXT NOT NULL,
+        category TEXT NOT NULL,
+        present INTEGER NOT NULL DEFAULT 0,
+        absent INTEGER NOT NULL DEFAULT 0,
+        leave INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, shop, category)
+    ) WITHOUT ROWID
+    """)
+    not_archiving = "(SELECT mode FROM db_state WHERE id = 1) <> 'archive'"
+    add_row = f"""
+        INSERT INTO daily_shop_stats (date, shop, category, present, absent, leave, total)
+        SELECT {{r}}.date, IFNULL(e.shop, ''), IFNULL(e.category, ''), {_STATUS_COUNTS.format(r="{r}")}
+        FROM employees e WHERE e.p_no = {{r}}.p_no
+        {_ADD_COUNTS};"""
+    sub_row = """
+        UPDATE daily_shop_stats SET present = present - ({r}.status = 'Present'),
+            absent = absent - ({r}.status = 'Absent'), leave = leave - ({r}.status = 'Leave'), total = total - 1
+        FROM employees e
+        WHERE e.p_no = {r}.p_no AND (daily_shop_stats.date, daily_shop_stats.shop, daily_shop_stats.category)
+              = ({r}.date, IFNULL(e.shop, ''), IFNULL(e.category, ''));"""
+    # all of one employee's attendance, per date
+    per_date = """(SELECT date, SUM(status = 'Present') AS present, SUM(status = 'Absent') AS absent,
+                     SUM(status = 'Leave') AS leave, COUNT(*) AS total
+              FROM attendance WHERE p_no = {r}.p_no GROUP BY date)"""
+    sub_employee = f"""
+        UPDATE daily_shop_stats SET
+            present = daily_shop_stats.present - m.present, absent = daily_shop_stats.absent - m.absent,
+            leave = daily_shop_stats.leave - m.leave, total = daily_shop_stats.total - m.total
+        FROM {per_date.format(r="OLD")} AS m
+        WHERE daily_shop_stats.date = m.date
+          AND daily_shop_stats.shop = IFNULL(OLD.shop, '') AND daily_shop_stats.category = IFNULL(OLD.category, '');"""
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_insert AFTER INSERT ON attendance
+    WHEN {not_archiving}
+    BEGIN {add_row.format(r="NEW")}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_delete AFTER DELETE ON attendance
+    WHEN {not_archiving}
+    BEGIN {sub_row.format(r="OLD")}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_stats_update AFTER UPDATE OF p_no, date, status ON attendance
+    WHEN {not_archiving} AND (OLD.p_no, OLD.date, OLD.status) IS NOT (NEW.p_no, NEW.date, NEW.status)
+    BEGIN {sub_row.format(r="OLD")} {add_row.format(r="NEW")}
+    END
+    """)
+    # cascaded attendance deletes run after the employee row is gone (sub_row finds no group),
+    # so a deleted employee's counts are taken out up front
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_employees_stats_delete BEFORE DELETE ON employees
+    WHEN {not_archiving}
+    BEGIN {sub_employee}
+    END
+    """)
+    # an employee changing shop / category takes their (hot) attendance history along
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_employees_stats_move AFTER UPDATE OF shop, category ON employees
+    WHEN (IFNULL(OLD.shop, ''), IFNULL(OLD.category, '')) IS NOT (IFNULL(NEW.shop, ''), IFNULL(NEW.category, ''))
+    BEGIN {sub_employee}
+        INSERT INTO daily_shop_stats (date, shop, category, present, absent, leave, total)
+        SELECT m.date, IFNULL(NEW.shop, ''), IFNULL(NEW.category, ''), m.present, m.absent, m.leave, m.total
+        FROM {per_date.format(r="NEW")} AS m WHERE true
+        {_ADD_COUNTS};
+    END
+    """)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM daily_shop_stats)")
+    if not cur.fetchone()[0]:
+        backfill_daily_shop_stats(cur)
+
+
+def backfill_daily_shop_stats(cur, attendance="attendance", employees="employees"):
+    """Recount daily_shop_stats from scratch (table expressions may be archive unions)."""
+    cur.execute("DELETE FROM daily_shop_stats")
+    cur.execute(f"""
+    INSERT INTO daily_shop_stats (date, shop, category, present, absent, leave, total)
+    SELECT a.date, IFNULL(e.shop, ''), IFNULL(e.category, ''), SUM(a.status = 'Present'),
+           SUM(a.status = 'Absent'), SUM(a.status = 'Leave'), COUNT(*)
+    FROM {attendance} a JOIN {employees} e ON e.p_no = a.p_no WHERE true
+    GROUP BY a.date, IFNULL(e.shop, ''), IFNULL(e.category, '')
+    """)
+
+
+def fts5_available(cur):
+    cur.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if cur.fetchone()[0]:
+        return True
+    try:
+        cur.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cur.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def _m011_employees_fts(cur, progress):
+    # Full-text index over the employee identifiers (employee.search_employees). External
+    # content: the index stores tokens only and reads the columns back from employees by rowid.
+    # SQLite builds without FTS5 skip this; search then falls back to LIKE.
+    if not fts5_available(cur):
+        print("SQLite has no FTS5: employee search will use LIKE scans")
+        return
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+        p_no, name, phone, ticket_no,
+        content = 'employees', content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+    """)
+    cols = "p_no, name, phone, ticket_no"
+    new_vals = "NEW.rowid, NEW.p_no, NEW.name, NEW.phone, NEW.ticket_no"
+    old_vals = "'delete', OLD.rowid, OLD.p_no, OLD.name, OLD.phone, OLD.ticket_no"
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_employees_fts_insert AFTER INSERT ON employees
+    BEGIN
+        INSERT INTO employees_fts (rowid, {cols}) VALUES ({new_vals});
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_employees_fts_delete AFTER DELETE ON employees
+    BEGIN
+        INSERT INTO employees_fts (employees_fts, rowid, {cols}) VALUES ({old_vals});
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_employees_fts_update AFTER UPDATE OF {cols} ON employees
+    BEGIN
+        INSERT INTO employees_fts (employees_fts, rowid, {cols}) VALUES ({old_vals});
+        INSERT INTO employees_fts (rowid, {cols}) VALUES ({new_vals});
+    END
+    """)
+    cur.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+
+
+def _m012_ingest_log(cur, progress):
+    # ingest.py checkpoints: one row per watched file. offset is the byte position up to which
+    # rows were applied; prefix_sha256 hashes bytes [0, offset), so an appended file is told
+    # apart from a rewritten one. sha256 is the hash of the whole file when last seen.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT,
+        prefix_sha256 TEXT,
+        size INTEGER NOT NULL DEFAULT 0,
+        mtime REAL,
+        offset INTEGER NOT NULL DEFAULT 0,
+        header TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        status TEXT,
+        error TEXT,
+        updated_at TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ingest_log_sha256 ON ingest_log(sha256)")
+
+
+# tables whose rows carry the import_batch id that wrote them (import_batch.py)
+BATCH_TABLES = ("employees", "attendance", "separation", "exam_marks")
+
+
+def _m013_import_batches(cur, progress):
+    # Provenance for bulk uploads: every row written by a bulk_upload_* run is stamped with its
+    # batch_id, and the values it replaced go to the *_undo tables (only employees and
+    # attendance are upserted; separations and exams are insert-only), so a whole batch can be
+    # reverted with a few set-based statements (import_batch.rollback_batch).
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS import_batch (
+        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        source TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at TEXT,
+        rolled_back_at TEXT
+    )
+    """)
+    for table in BATCH_TABLES:
+        if "batch_id" not in _columns(cur, table):
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN batch_id INTEGER")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_batch ON {table}(batch_id) WHERE batch_id IS NOT NULL")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS attendance_undo (
+        batch_id INTEGER NOT NULL,
+        p_no TEXT NOT NULL,
+        date TEXT NOT NULL,
+        status TEXT,
+        prev_batch_id INTEGER,
+        PRIMARY KEY (batch_id, p_no, date)
+    ) WITHOUT ROWID
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS employees_undo (
+        batch_id INTEGER NOT NULL,
+        p_no TEXT NOT NULL,
+        name TEXT, phone TEXT, dob TEXT, doj TEXT, end_date TEXT,
+        ticket_no TEXT, shop TEXT, category TEXT,
+        prev_batch_id INTEGER,
+        PRIMARY KEY (batch_id, p_no)
+    ) WITHOUT ROWID
+    """)
+
+
+MIGRATIONS = [
+    (1, "base tables", _m001_base_tables),
+    (2, "employee columns", _m002_employee_columns),
+    (3, "legacy table layouts", _m003_legacy_tables),
+    (4, "unique attendance per p_no and date", _m004_attendance_unique),
+    (5, "exam_latest table and triggers", _m005_exam_latest),
+    (6, "query indexes", _m006_query_indexes),
+    (7, "table_versions counters", _m007_table_versions),
+    (8, "change journal", _m008_change_journal),
+    (9, "archive state", _m009_archive_state),
+    (10, "daily_shop_stats aggregate", _m010_daily_shop_stats),
+    (11, "employee full-text search", _m011_employees_fts),
+    (12, "ingest log", _m012_ingest_log),
+    (13, "import batches", _m013_import_batches),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, progress=None):
+    """
+    Run the pending migrations on conn. progress: optional callable(message).
+    Returns the list of versions applied (empty when already current).
+    Raises ValueError if the database was written by a newer version of the app.
+    """
+    version = current_version(conn)
+    if version == LATEST_VERSION:
+        return []
+    if version > LATEST_VERSION:
+        raise ValueError(f"Database schema version {version} is newer than this application ({LATEST_VERSION})")
+    conn.commit()
+    cur = conn.cursor()
+    cur.execute("PRAGMA foreign_keys = OFF")
+    applied = []
+    try:
+        for v, description, fn in MIGRATIONS:
+            if v <= version:
+                continue
+            _report(progress, f"Migration {v}: {description}")
+            cur.execute("BEGIN")
+            try:
+                fn(cur, progress)
+                cur.execute(f"PRAGMA user_version = {v}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(v)
+    finally:
+        cur.execute("PRAGMA foreign_keys = ON")
+    return applied
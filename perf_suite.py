@@ -0,0 +1,467 @@
+# perf_suite.py
+"""
+Micro-benchmark / load-test harness for the data modules.
+
+Builds a synthetic database (employees, attendance, exams, separations) in a
+scratch directory, times the read APIs, every bulk_upload_* function and every
+exporter, and compares the timings with a saved JSON baseline.
+
+Standalone usage:
+    python perf_suite.py --tier 10k
+    python perf_suite.py --tier 100k --attendance-rows 10000000 --save-baseline
+    python perf_suite.py --tier 1k --threshold 0.3
+    python perf_suite.py --row-forms 1000000
+
+The pytest entry point (test_performance.py) runs the small "smoke" tier when
+EMP_PERF_TESTS=1 is set; it is skipped in a plain pytest run.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+import db
+import employee
+import attendance
+import separation
+import exam
+import exam_analytics
+import dashboard
+import import_preview
+import import_batch
+import result_cache
+import typeahead
+from testing import reset_module_state
+import writer
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baselines")
+
+# allowed slowdown relative to baseline before a case counts as a regression (1.0 -> twice as slow)
+DEFAULT_THRESHOLD = float(os.environ.get("PERF_REGRESSION_THRESHOLD", "1.0"))
+# timings below this many seconds are dominated by noise; never flag them
+NOISE_FLOOR = 0.02
+
+# employees, days of attendance per employee, exam rows, separations, rows per upload file
+TIERS = {
+    "smoke": {"employees": 200, "attendance_days": 10, "exam_rows": 400, "separations": 20, "upload_rows": 300},
+    "1k": {"employees": 1000, "attendance_days": 30, "exam_rows": 3000, "separations": 100, "upload_rows": 1000},
+    "10k": {"employees": 10000, "attendance_days": 90, "exam_rows": 30000, "separations": 1000, "upload_rows": 10000},
+    "100k": {"employees": 100000, "attendance_days": 100, "exam_rows": 300000, "separations": 10000, "upload_rows": 100000},
+}
+
+SHOPS = ["Paint Shop", "Press Shop", "Body Shop", "Assembly Shop", "Welding Shop", "Quality"]
+CATEGORIES = ["NEEM", "NTTF", "BTECH", "MTECH", "Other"]
+START_DATE = date(2024, 1, 1)
+INSERT_CHUNK = 50000
+
+
+# ---------------------------
+# Synthetic data generator
+# ---------------------------
+
+def _pno(i, prefix="P"):
+    return f"{prefix}{i:07d}"
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_dataset(db_file, employees, attendance_days, exam_rows=0, separations=0,
+                     attendance_rows=None, seed=42):
+    """
+    Create a fresh database at db_file and fill it with synthetic rows.
+    attendance_rows: optional cap on total attendance rows (e.g. 10_000_000); by default
+                     every employee gets one row per day for attendance_days days.
+    Rows are written with executemany in large chunks so 10M rows stay practical.
+    Returns a dict describing what was generated.
+    """
+    rnd = random.Random(seed)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    db.DB_FILE = db_file
+    db.init_db()
+
+    statuses = ["Present"] * 17 + ["Absent"] * 2 + ["Leave"]
+    dates = [(START_DATE + timedelta(days=d)).isoformat() for d in range(attendance_days)]
+    exam_types = [exam._exam_type_key(g, p) for g, p in exam._all_part_keys()]
+
+    def employee_rows():
+        for i in range(employees):
+            yield (_pno(i), f"Employee {i}", f"9{i:09d}", "1995-06-15",
+                   (START_DATE - timedelta(days=rnd.randint(30, 2000))).isoformat(), None,
+                   f"T{i:06d}", SHOPS[i % len(SHOPS)], CATEGORIES[i % len(CATEGORIES)])
+
+    def attendance_rows_gen():
+        written = 0
+        for d in dates:
+            for i in range(employees):
+                if attendance_rows is not None and written >= attendance_rows:
+                    return
+                yield (_pno(i), d, rnd.choice(statuses))
+                written += 1
+
+    def exam_rows_gen():
+        for _ in range(exam_rows):
+            i = rnd.randrange(employees)
+            d = START_DATE + timedelta(days=rnd.randrange(max(attendance_days, 1)))
+            yield (_pno(i), f"Employee {i}", rnd.choice(exam_types), d.isoformat(), round(rnd.uniform(20, 100), 1))
+
+    def separation_rows_gen():
+        for i in rnd.sample(range(employees), min(separations, employees)):
+            d = START_DATE + timedelta(days=rnd.randrange(max(attendance_days, 1)))
+            yield (_pno(i), f"Employee {i}", d.isoformat(), rnd.choice(["Resigned", "Completed", "Terminated"]))
+
+    counts = {}
+    conn = sqlite3.connect(db_file)
+    try:
+        cur = conn.cursor()
+        plan = [
+            ("employees", "INSERT INTO employees (p_no, name, phone, dob, doj, end_date, ticket_no, shop, category) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", employee_rows()),
+            ("attendance", "INSERT INTO attendance (p_no, date, status) VALUES (?, ?, ?)", attendance_rows_gen()),
+            ("exam_marks", "INSERT INTO exam_marks (p_no, name, exam_type, exam_date, marks) VALUES (?, ?, ?, ?, ?)",
+             exam_rows_gen()),
+            ("separation", "INSERT INTO separation (p_no, name, separation_date, reason) VALUES (?, ?, ?, ?)",
+             separation_rows_gen()),
+        ]
+        for table, sql, rows in plan:
+            n = 0
+            for chunk in _chunked(rows, INSERT_CHUNK):
+                cur.executemany(sql, chunk)
+                n += len(chunk)
+            conn.commit()
+            counts[table] = n
+    finally:
+        conn.close()
+    counts["dates"] = dates
+    return counts
+
+
+def write_upload_files(workdir, rows, employees, attendance_days, seed=7):
+    """
+    Write one CSV per bulk uploader into workdir.
+    Upload employees use a separate p_no range so they never collide with the seeded rows;
+    upload attendance targets the day after the seeded range.
+    Returns dict: kind -> file path.
+    """
+    rnd = random.Random(seed)
+    paths = {}
+    upload_day = (START_DATE + timedelta(days=attendance_days)).strftime("%d-%m-%Y")
+
+    emp = pd.DataFrame({
+        "P_No": [_pno(i, "U") for i in range(rows)],
+        "Name": [f"Upload {i}" for i in range(rows)],
+        "Phone": [f"8{i:09d}" for i in range(rows)],
+        "DOJ": ["01/02/2023"] * rows,
+        "Shop": [SHOPS[i % len(SHOPS)] for i in range(rows)],
+        "Category": [CATEGORIES[i % len(CATEGORIES)] for i in range(rows)],
+    })
+    att = pd.DataFrame({
+        "p_no": [_pno(i % employees) for i in range(rows)],
+        "date": [upload_day] * rows,
+        "status": [rnd.choice(["P", "A", "L", "present"]) for _ in range(rows)],
+    })
+    parts = exam._all_part_keys()
+    exm = pd.DataFrame({
+        "p_no": [_pno(rnd.randrange(employees)) for _ in range(rows)],
+        "exam_type": [" ".join(parts[rnd.randrange(len(parts))]) for _ in range(rows)],
+        "exam_date": [upload_day] * rows,
+        "marks": [round(rnd.uniform(20, 100), 1) for _ in range(rows)],
+    })
+    sep_rows = max(1, rows // 10)
+    sep = pd.DataFrame({
+        "p_no": [_pno(rnd.randrange(employees)) for _ in range(sep_rows)],
+        "name": [None] * sep_rows,
+        "separation_date": [upload_day] * sep_rows,
+        "reason": ["Resigned"] * sep_rows,
+    })
+    for kind, df in (("employees", emp), ("attendance", att), ("exams", exm), ("separations", sep)):
+        path = os.path.join(workdir, f"upload_{kind}.csv")
+        df.to_csv(path, index=False)
+        paths[kind] = path
+    return paths
+
+
+# ---------------------------
+# Benchmark cases
+# ---------------------------
+
+def _build_cases(ctx):
+    """
+    Return ordered list of (name, callable, repeat). Read-only cases come first;
+    the mutating bulk uploads run once each at the end.
+    """
+    dates = ctx["dates"]
+    first, last = dates[0], dates[-1]
+    mid = dates[len(dates) // 2]
+    out = ctx["workdir"]
+    up = ctx["uploads"]
+    return [
+        ("list_employees", lambda: employee.list_employees(), 3),
+        ("list_employees_filtered", lambda: employee.list_employees(shop=SHOPS[0], category=CATEGORIES[0]), 3),
+        ("list_employees_frame", lambda: employee.list_employees(form="frame"), 3),
+        ("search_employees", lambda: [employee.search_employees(q, 50) for q in ("Employee 1", "P00001", "T0000")], 3),
+        ("typeahead_rebuild_suggest", lambda: (typeahead.refresh(),
+                                               [typeahead.suggest(q) for q in ("employee 1", "p00001", "t0000")]), 3),
+        ("get_attendance_summary", lambda: (result_cache.clear(), attendance.get_attendance_summary(first, last)), 3),
+        ("get_attendance_summary_sorted",
+         lambda: (result_cache.clear(), attendance.get_attendance_summary(first, last, sort_by="absent")), 3),
+        ("get_attendance_summary_cached", lambda: attendance.get_attendance_summary(first, last), 3),
+        ("get_attendance_summary_frame",
+         lambda: (result_cache.clear(), attendance.get_attendance_summary(first, last, form="frame")), 3),
+        ("get_attendance_for_date", lambda: (result_cache.clear(), attendance.get_attendance_for_date(mid)), 3),
+        ("get_attendance_for_date_shop",
+         lambda: (result_cache.clear(), attendance.get_attendance_for_date(mid, shop=SHOPS[0])), 3),
+        ("muster_register", lambda: (result_cache.clear(), attendance.muster_register(first)), 3),
+        ("pivot_exam_summary", lambda: (result_cache.clear(), exam.pivot_exam_summary()), 3),
+        ("pivot_exam_group", lambda: (result_cache.clear(), exam.pivot_exam_group("Induction")), 3),
+        ("exam_stats_by_shop", lambda: (exam_analytics.clear_cache(), exam_analytics.exam_stats("shop")), 3),
+        ("dashboard_daily_by_shop", lambda: dashboard.daily_shop_stats(first, last, "shop"), 3),
+        ("induction_improvement", lambda: (exam_analytics.clear_cache(), exam_analytics.induction_improvement()), 3),
+        ("query_exam_marks_walk", lambda: sum(len(p) for p in exam.iter_exam_marks(page_size=1000)), 3),
+        ("query_separations_walk", lambda: sum(len(p) for p in separation.iter_separations(page_size=1000)), 3),
+        ("export_employees", lambda: employee.export_employees(os.path.join(out, "employees.csv")), 2),
+        ("export_separations", lambda: separation.export_separations(os.path.join(out, "separations.csv")), 2),
+        ("export_exam_summary", lambda: exam.export_exam_summary(os.path.join(out, "exam_summary.csv")), 2),
+        ("export_attendance_summary",
+         lambda: attendance.export_attendance_summary(os.path.join(out, "attendance.csv"), first, last), 2),
+        ("export_muster_register_xlsx",
+         lambda: (result_cache.clear(), attendance.export_muster_register(first, path=os.path.join(out, "muster.xlsx"))), 2),
+        ("import_preview_attendance", lambda: import_preview.preview_file(up["attendance"], "attendance"), 3),
+        ("bulk_upload_employees", lambda: employee.bulk_upload_employees(up["employees"]), 1),
+        ("bulk_upload_attendance", lambda: attendance.bulk_upload_attendance(up["attendance"]), 1),
+        ("bulk_upload_exams", lambda: exam.bulk_upload_exams(up["exams"]), 1),
+        ("bulk_upload_separations", lambda: separation.bulk_upload_separations(up["separations"]), 1),
+        ("rollback_attendance_batch", lambda: _rollback_latest("attendance"), 1),
+        ("writer_group_commit_2k", lambda: _queued_attendance_writes(dates, 2000), 1),
+        ("save_muster_shop", lambda: _save_muster_day(mid), 1),
+        ("row_forms_20k", lambda: benchmark_row_forms(20_000), 1),
+    ]
+
+
+def benchmark_row_forms(rows=1_000_000, forms=("dicts", "records", "tuples"), seed=42):
+    """
+    Memory and speed of the row shapes db.rows_to_form() hands out, on `rows` attendance-like
+    row tuples (id, p_no, date, status, batch_id). Per form: build seconds, bytes held by the
+    row containers (the column values are shared by every form), and the seconds of a pass
+    reading three columns of every row the form's fastest way (dict key, attribute, index).
+    Records also report key_read_seconds for the dict-compatible row["col"] path.
+    Returns {form: {"build_seconds", "bytes", "bytes_per_row", "read_seconds"[, "key_read_seconds"]}}.
+    """
+    rnd = random.Random(seed)
+    columns = ["id", "p_no", "date", "status", "batch_id"]
+    p_nos = [f"P{i:07d}" for i in range(max(1, rows // 100))]
+    days = [(date(2024, 1, 1) + timedelta(days=i)).isoformat() for i in range(100)]
+    statuses = ("Present", "Absent", "Leave")
+    data = [(i, p_nos[i % len(p_nos)], days[i % 100], rnd.choice(statuses), None) for i in range(rows)]
+    results = {}
+    for form in forms:
+        t0 = time.perf_counter()
+        out = db.rows_to_form(data, columns, form)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        if form == "tuples":
+            for r in out:
+                (r[1], r[2], r[3])
+        elif form == "records":
+            for r in out:
+                (r.p_no, r.date, r.status)
+        else:
+            for r in out:
+                (r["p_no"], r["date"], r["status"])
+        read = time.perf_counter() - t0
+        stats = {}
+        if form == "records":
+            t0 = time.perf_counter()
+            for r in out:
+                (r["p_no"], r["date"], r["status"])
+            stats["key_read_seconds"] = round(time.perf_counter() - t0, 3)
+        del out
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            out = db.rows_to_form(data, columns, form)
+            held = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        del out
+        results[form] = dict({"build_seconds": round(build, 3), "bytes": held,
+                              "bytes_per_row": round(held / rows, 1) if rows else 0.0,
+                              "read_seconds": round(read, 3)}, **stats)
+    return results
+
+
+def _queued_attendance_writes(dates, n):
+    """n single-row attendance edits queued without waiting, then awaited (writer group commits)."""
+    p_nos = [e.p_no for e in employee.list_employees()[:50]]
+    futures = [attendance.update_attendance(p_nos[i % len(p_nos)], dates[i % len(dates)], "Leave", wait=False)
+               for i in range(n)]
+    for f in futures:
+        f.result()
+    return writer.writer_stats()
+
+
+def _save_muster_day(day):
+    """Load one shop's muster roll for a day, flip every row between Present and Absent, save it in one write."""
+    rows = attendance.get_attendance_for_date(day, shop=SHOPS[0])
+    return attendance.save_muster(day, {r.p_no: "Absent" if r.status == "Present" else "Present" for r in rows})
+
+
+def _rollback_latest(kind):
+    batches = import_batch.list_batches(limit=1, kind=kind)
+    return import_batch.rollback_batch(batches[0]["batch_id"]) if batches else None
+
+
+def _time_case(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {"seconds": min(samples), "median": statistics.median(samples), "runs": repeat}
+
+
+def run_suite(tier="smoke", workdir=None, attendance_rows=None, only=None, verbose=False):
+    """
+    Generate the tier's dataset, run every case and return
+    {"tier": ..., "dataset": {...}, "results": {case: {"seconds", "median", "runs"}}}.
+    only: optional iterable of case names to restrict the run.
+    db.DB_FILE is restored afterwards; the scratch directory is removed unless workdir was given.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown tier '{tier}'. Choose from: {', '.join(TIERS)}")
+    spec = TIERS[tier]
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix=f"perf_{tier}_")
+    original_db = db.DB_FILE
+    reset_module_state()
+    try:
+        t0 = time.perf_counter()
+        gen = generate_dataset(os.path.join(workdir, "perf.db"), spec["employees"], spec["attendance_days"],
+                               exam_rows=spec["exam_rows"], separations=spec["separations"],
+                               attendance_rows=attendance_rows)
+        gen_seconds = time.perf_counter() - t0
+        uploads = write_upload_files(workdir, spec["upload_rows"], spec["employees"], spec["attendance_days"])
+        ctx = {"dates": gen.pop("dates"), "workdir": workdir, "uploads": uploads}
+        results = {}
+        for name, fn, repeat in _build_cases(ctx):
+            if only and name not in only:
+                continue
+            results[name] = _time_case(fn, repeat)
+            if verbose:
+                print(f"  {name:<32} {results[name]['seconds'] * 1000:10.1f} ms")
+        dataset = dict(gen, generate_seconds=round(gen_seconds, 3), upload_rows=spec["upload_rows"])
+        return {"tier": tier, "dataset": dataset, "results": results}
+    finally:
+        reset_module_state()
+        db.DB_FILE = original_db
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------
+# Baselines
+# ---------------------------
+
+def baseline_path(tier, baseline_dir=None):
+    return os.path.join(baseline_dir or BASELINE_DIR, f"{tier}.json")
+
+
+def load_baseline(tier, baseline_dir=None):
+    path = baseline_path(tier, baseline_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(report, baseline_dir=None):
+    path = baseline_path(report["tier"], baseline_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare_to_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return list of regression dicts (case, baseline, current, ratio) for every case that is
+    more than `threshold` slower than the baseline. Cases missing from either side are ignored.
+    """
+    regressions = []
+    if not baseline:
+        return regressions
+    base_results = baseline.get("results", {})
+    for name, cur in report["results"].items():
+        base = base_results.get(name)
+        if not base:
+            continue
+        allowed = max(base["seconds"] * (1 + threshold), base["seconds"] + NOISE_FLOOR)
+        if cur["seconds"] > allowed:
+            regressions.append({
+                "case": name,
+                "baseline": base["seconds"],
+                "current": cur["seconds"],
+                "ratio": cur["seconds"] / base["seconds"] if base["seconds"] else float("inf"),
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the employee data modules.")
+    parser.add_argument("--tier", default="smoke", choices=list(TIERS))
+    parser.add_argument("--attendance-rows", type=int, default=None,
+                        help="cap on generated attendance rows (default: employees x days)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown vs baseline, e.g. 0.5 = 50%%")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--baseline-dir", default=None)
+    parser.add_argument("--only", nargs="*", default=None, help="run only these case names")
+    parser.add_argument("--row-forms", type=int, default=None, metavar="ROWS",
+                        help="only benchmark the dict / record / tuple row shapes on ROWS rows")
+    args = parser.parse_args(argv)
+
+    if args.row_forms:
+        print(f"Row forms at {args.row_forms:,} rows:")
+        for form, r in benchmark_row_forms(args.row_forms).items():
+            print(f"  {form:<8} build {r['build_seconds'] * 1000:8.1f} ms  read {r['read_seconds'] * 1000:8.1f} ms  "
+                  f"{r['bytes'] / 1e6:8.1f} MB ({r['bytes_per_row']:.0f} B/row)"
+                  + (f"  row[\"col\"] read {r['key_read_seconds'] * 1000:.1f} ms" if "key_read_seconds" in r else ""))
+        return 0
+
+    print(f"Running tier '{args.tier}' ...")
+    report = run_suite(args.tier, attendance_rows=args.attendance_rows, only=args.only, verbose=True)
+    baseline = load_baseline(args.tier, args.baseline_dir)
+    regressions = compare_to_baseline(report, baseline, args.threshold)
+
+    if args.save_baseline or baseline is None:
+        print("Baseline saved to", save_baseline(report, args.baseline_dir))
+    if regressions:
+        print("\nRegressions:")
+        for r in regressions:
+            print(f"  {r['case']}: {r['baseline'] * 1000:.1f} ms -> {r['current'] * 1000:.1f} ms (x{r['ratio']:.2f})")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
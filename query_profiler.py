@@ -0,0 +1,305 @@
+# query_profiler.py
+"""
+Query instrumentation for db.get_conn().
+
+ProfiledConnection / ProfiledCursor are drop-in sqlite3 subclasses that time every
+statement (execute + the fetchone / fetchmany / fetchall calls that follow it), and record:
+  - normalized SQL text
+  - parameter shape (never the values)
+  - row count (rowcount for DML, rows returned by the fetch calls for SELECT)
+  - wall time
+  - the calling function outside the db layer
+
+Rows read by iterating the cursor are not timed or counted: that would put a Python call
+on every row.
+
+Per-statement stats and a latency histogram are kept in memory (see top_statements());
+statements slower than SLOW_QUERY_MS are written to a rotating slow log in the user data
+directory.
+
+Profiling is off unless EMP_QUERY_PROFILER=1 is set.
+"""
+import logging
+import logging.handlers
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+
+
+
+def _user_data_dir():
+    """Per-user directory for logs: $EMP_DATA_DIR, else %LOCALAPPDATA% / $XDG_STATE_HOME / ~/.local/state."""
+    if os.environ.get("EMP_DATA_DIR"):
+        return os.environ["EMP_DATA_DIR"]
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "EmployeeApp")
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "employee_app")
+
+
+ENABLED = os.environ.get("EMP_QUERY_PROFILER", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("EMP_SLOW_QUERY_MS", "250"))
+SLOW_LOG_FILE = os.environ.get("EMP_SLOW_LOG") or os.path.join(_user_data_dir(), "slow_queries.log")
+SLOW_LOG_MAX_BYTES = 1_000_000
+SLOW_LOG_BACKUPS = 3
+
+# histogram bucket upper bounds (ms); the last bucket is "slower than BUCKETS_MS[-1]"
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# frames from these files are skipped when looking for the calling function
+_SKIP_FILES = {os.path.abspath(__file__).lower(),
+               os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.py").lower()}
+
+_lock = threading.Lock()
+_stats = {}
+_slow_logger = None
+
+_WS_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\?(\s*,\s*\?)+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and placeholder lists so dynamic IN (?, ?, ...) share one entry."""
+    s = _WS_RE.sub(" ", str(sql)).strip()
+    return _IN_LIST_RE.sub("?, ...", s)
+
+
+def _params_shape(params):
+    if params is None:
+        return "-"
+    if isinstance(params, dict):
+        return f"named[{len(params)}]"
+    try:
+        return f"[{len(params)}]"
+    except TypeError:
+        return type(params).__name__
+
+
+def _caller():
+    f = sys._getframe(2)
+    while f is not None:
+        fn = f.f_code.co_filename
+        if fn.lower() not in _SKIP_FILES and not fn.endswith("contextlib.py"):
+            mod = os.path.splitext(os.path.basename(fn))[0]
+            return f"{mod}.{f.f_code.co_name}:{f.f_lineno}"
+        f = f.f_back
+    return "?"
+
+
+def _bucket_index(ms):
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        logger = logging.getLogger("employee_app.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            os.makedirs(os.path.dirname(SLOW_LOG_FILE), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                SLOW_LOG_FILE, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        except Exception:
+            # unwritable data dir etc. -> keep in-memory stats only
+            logger.addHandler(logging.NullHandler())
+        _slow_logger = logger
+    return _slow_logger
+
+
+def record(sql, shape, rows, elapsed, caller):
+    """Add one statement execution to the in-memory stats (and slow log if needed)."""
+    key = normalize_sql(sql)
+    ms = elapsed * 1000.0
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            st = {"sql": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                  "buckets": [0] * (len(BUCKETS_MS) + 1), "callers": Counter(), "shapes": Counter()}
+            _stats[key] = st
+        st["calls"] += 1
+        st["total_ms"] += ms
+        st["rows"] += rows
+        if ms > st["max_ms"]:
+            st["max_ms"] = ms
+        st["buckets"][_bucket_index(ms)] += 1
+        st["callers"][caller] += 1
+        st["shapes"][shape] += 1
+    if ms >= SLOW_QUERY_MS:
+        _get_slow_logger().info("%.1f ms | rows=%d | params=%s | caller=%s | %s", ms, rows, shape, caller, key)
+
+
+def _percentile_ms(buckets, q):
+    """Approximate percentile from the histogram: upper bound of the bucket holding it."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    target = q * total
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+def top_statements(n=20, order_by="total_ms"):
+    """
+    Return up to n statement summaries sorted by order_by
+    (one of total_ms, max_ms, mean_ms, calls, rows), highest first.
+    """
+    with _lock:
+        snapshot = [dict(st, callers=Counter(st["callers"]), shapes=Counter(st["shapes"]),
+                         buckets=list(st["buckets"])) for st in _stats.values()]
+    out = []
+    for st in snapshot:
+        st["mean_ms"] = st["total_ms"] / st["calls"] if st["calls"] else 0.0
+        st["p95_ms"] = _percentile_ms(st["buckets"], 0.95)
+        st["top_caller"] = st["callers"].most_common(1)[0][0] if st["callers"] else ""
+        out.append(st)
+    out.sort(key=lambda s: s.get(order_by, 0), reverse=True)
+    return out[:n]
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+# ---------------------------
+# sqlite3 subclasses
+# ---------------------------
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times execute() plus the fetches belonging to the same statement."""
+
+    def _flush(self):
+        pending = getattr(self, "_pending", None)
+        if pending is not None:
+            self._pending = None
+            record(*pending)
+
+    def _begin(self, sql, shape):
+        self._flush()
+        return [sql, shape, 0, 0.0, _caller()]
+
+    def _finish_execute(self, pending, t0):
+        pending[3] = time.perf_counter() - t0
+        if self.rowcount and self.rowcount > 0:
+            pending[2] = self.rowcount
+        self._pending = pending
+
+    def _add_fetch(self, nrows, t0):
+        pending = getattr(self, "_pending", None)
+        if pending is not None:
+            pending[2] += nrows
+            pending[3] += time.perf_counter() - t0
+
+    def execute(self, sql, parameters=()):
+        pending = self._begin(sql, _params_shape(parameters))
+        t0 = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._finish_execute(pending, t0)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # generators are passed through as they are; only sized sequences report their length
+        if isinstance(seq_of_parameters, (list, tuple)):
+            width = _params_shape(seq_of_parameters[0]) if seq_of_parameters else "-"
+            shape = f"many{len(seq_of_parameters)}x{width}"
+        else:
+            shape = "many"
+        pending = self._begin(sql, shape)
+        t0 = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish_execute(pending, t0)
+        return self
+
+    def executescript(self, sql_script):
+        pending = self._begin(sql_script, "script")
+        t0 = time.perf_counter()
+        try:
+            super().executescript(sql_script)
+        finally:
+            self._finish_execute(pending, t0)
+        return self
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        self._add_fetch(0 if row is None else 1, t0)
+        return row
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add_fetch(len(rows), t0)
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        self._add_fetch(len(rows), t0)
+        return rows
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are ProfiledCursor."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self, factory=ProfiledCursor):
+        cur = super().cursor(factory)
+        self._cursors.add(cur)
+        return cur
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        t0 = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record("COMMIT", "-", 0, time.perf_counter() - t0, _caller())
+
+    def close(self):
+        for cur in list(self._cursors):
+            if isinstance(cur, ProfiledCursor):
+                cur._flush()
+        super().close()
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect() returning a ProfiledConnection when profiling is enabled."""
+    if ENABLED:
+        kwargs.setdefault("factory", ProfiledConnection)
+    return sqlite3.connect(path, **kwargs)
@@ -0,0 +1,166 @@
+# result_cache.py
+"""
+Memoized report results, validated against the database rather than timers.
+
+@cached("attendance", "employees") memoizes a function per argument set in a bounded LRU.
+Each lookup first reads PRAGMA data_version on a long-lived probe connection: the value only
+changes when another connection (in any process) commits to the database, so while nothing was
+written the entry is served straight away. After a commit, the table_versions counters of the
+tables the function reads decide: unchanged counters revalidate the entry, anything else
+recomputes it. Saving an exam mark therefore leaves cached attendance summaries alone.
+
+Results are copied on the way out (lists of dicts row by row, frames and arrays whole), so callers
+may modify them.
+"""
+import functools
+import sqlite3
+import threading
+from collections import OrderedDict
+import db
+
+RESULT_CACHE_MAX = 128
+
+# key -> [data_version, table_versions, result]
+_entries = OrderedDict()
+_lock = threading.RLock()
+_stats = {"hits": 0, "misses": 0, "revalidations": 0, "evictions": 0}
+_by_name = {}
+_probe = {"db_file": None, "conn": None}
+
+
+def _probe_conn():
+    # plain sqlite3 connection: probes should not show up in the query profiler
+    if _probe["conn"] is None or _probe["db_file"] != db.DB_FILE:
+        if _probe["conn"] is not None:
+            _probe["conn"].close()
+        _probe.update(db_file=db.DB_FILE, conn=sqlite3.connect(db.DB_FILE, check_same_thread=False))
+    return _probe["conn"]
+
+
+def close_probe():
+    """Close the probe connection (reopened on the next lookup), e.g. before the database file is replaced."""
+    with _lock:
+        if _probe["conn"] is not None:
+            _probe["conn"].close()
+        _probe.update(db_file=None, conn=None)
+
+
+def _versions(tables):
+    """(data_version, (table version, ...)) read on the probe connection; call with _lock held."""
+    conn = _probe_conn()
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    found = dict(conn.execute("SELECT table_name, version FROM table_versions WHERE table_name IN ("
+                              + ", ".join("?" * len(tables)) + ")", tables).fetchall())
+    return data_version, tuple(found.get(t, 0) for t in tables)
+
+
+def _copy(result):
+    if isinstance(result, list):
+        return [dict(r) if isinstance(r, dict) else r for r in result]
+    if isinstance(result, dict):
+        # column arrays (db.fetch(form="arrays")) are copied too; other values shallowly
+        return {k: v.copy() if hasattr(v, "dtype") else v for k, v in result.items()}
+    if hasattr(result, "copy"):
+        return result.copy()
+    return result
+
+
+def _count(name, field):
+    _stats[field] += 1
+    per = _by_name.setdefault(name, {"hits": 0, "misses": 0})
+    if field in per:
+        per[field] += 1
+
+
+def memoize(name, tables, args, compute):
+    """
+    Return compute() for (name, args), reusing the stored result while none of tables changed.
+    args must be hashable.
+    """
+    tables = tuple(tables)
+    key = (db.DB_FILE, name, args)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            conn = _probe_conn()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == entry[0]:
+                _entries.move_to_end(key)
+                _count(name, "hits")
+                return _copy(entry[2])
+            data_version, versions = _versions(tables)
+            if versions == entry[1]:
+                entry[0] = data_version
+                _entries.move_to_end(key)
+                _stats["revalidations"] += 1
+                _count(name, "hits")
+                return _copy(entry[2])
+        else:
+            data_version, versions = _versions(tables)
+        _count(name, "misses")
+    # versions are read before computing: a write landing meanwhile makes the entry stale, not wrong
+    result = compute()
+    with _lock:
+        _entries[key] = [data_version, versions, result]
+        _entries.move_to_end(key)
+        while len(_entries) > RESULT_CACHE_MAX:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return _copy(result)
+
+
+def cached(*tables):
+    """
+    Decorator: memoize a report function that reads the given data tables (db.VERSIONED_TABLES).
+    Calls with unhashable arguments bypass the cache. The undecorated function is .uncached.
+    """
+    def wrap(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            return memoize(name, tables, key, lambda: fn(*args, **kwargs))
+
+        inner.uncached = fn
+        return inner
+    return wrap
+
+
+def clear(prefix=None):
+    """Drop every entry, or those whose function name starts with prefix (e.g. 'exam_analytics.')."""
+    with _lock:
+        if prefix is None:
+            _entries.clear()
+        else:
+            for key in [k for k in _entries if k[1].startswith(prefix)]:
+                del _entries[key]
+
+
+def cache_stats(prefix=None):
+    """
+    Totals (hits, misses, revalidations, evictions, entries, hit_rate) plus per-function hit rates.
+    prefix: only count the functions whose name starts with it (hits / misses / entries / hit_rate).
+    """
+    with _lock:
+        functions = {n: dict(s, hit_rate=round(s["hits"] / (s["hits"] + s["misses"]), 3) if s["hits"] + s["misses"] else 0.0)
+                     for n, s in sorted(_by_name.items()) if prefix is None or n.startswith(prefix)}
+        if prefix is None:
+            totals = dict(_stats, entries=len(_entries))
+        else:
+            totals = {"hits": sum(f["hits"] for f in functions.values()),
+                      "misses": sum(f["misses"] for f in functions.values()),
+                      "entries": sum(1 for k in _entries if k[1].startswith(prefix))}
+        lookups = totals["hits"] + totals["misses"]
+        return dict(totals, hit_rate=round(totals["hits"] / lookups, 3) if lookups else 0.0, functions=functions)
+
+
+def reset_stats():
+    with _lock:
+        for k in _stats:
+            _stats[k] = 0
+        _by_name.clear()
@@ -1,37 +1,97 @@
 
 import pandas as pd
+import db
 from db import get_conn, ensure_date_str
-from utils import load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_to_file
+import employee
+import archive
+import import_batch
+import writer
+from utils import load_dataframe_from_file, map_columns_case_insensitive, save_dataframe_chunks_to_file, normalize_date_series, normalize_id_series
 
-def add_separation(p_no, name, separation_date, reason=None):
-    """Insert a single separation record"""
+def add_separation(p_no, name, separation_date, reason=None, wait=True):
+    """
+    Insert a single separation record (name defaults to the employee's stored name).
+    Returns the new row id; wait=False returns the writer Future instead.
+    """
     sd = ensure_date_str(separation_date)
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO separation (p_no, name, separation_date, reason) VALUES (?, ?, ?, ?)",
-            (str(p_no), name, sd, reason)
-        )
+    if not name:
+        name = employee.get_employee_name(p_no)
+    params = (str(p_no), name, sd, reason)
+    return writer.execute(lambda cur: cur.execute(
+        "INSERT INTO separation (p_no, name, separation_date, reason) VALUES (?, ?, ?, ?)", params
+    ).lastrowid, wait=wait)
+
+SEPARATION_COLUMNS = ["id", "p_no", "name", "separation_date", "reason"]
+# sort key -> SQL expression (backed by idx_separation_date / idx_separation_pno_date)
+SEPARATION_SORT_KEYS = {"separation_date": "separation_date", "p_no": "p_no", "id": "id"}
+
+def query_separations(p_no=None, date_from=None, date_to=None, reason=None,
+                      sort_by="separation_date", descending=True, page_size=500, cursor=None, form="records"):
+    """
+    Keyset-paginated, filtered separation records.
+    - p_no: exact employee id
+    - date_from / date_to: inclusive separation_date range
+    - reason: case-insensitive substring match
+    - sort_by: one of SEPARATION_SORT_KEYS; ties broken by id
+    - cursor: next_cursor from the previous page (None for the first page)
+    - form: row shape, 'records' (db.Record, with dict-style row["col"] / .get()) by default; see db.rows_to_form()
+    Returns {"rows": [row, ...], "next_cursor": str or None}.
+    """
+    if sort_by not in SEPARATION_SORT_KEYS:
+        raise ValueError(f"Unsupported sort key: {sort_by}. Use one of {sorted(SEPARATION_SORT_KEYS)}")
+    where, params = [], []
+    if p_no:
+        where.append("p_no = ?")
+        params.append(str(p_no))
+    if date_from:
+        where.append("separation_date >= ?")
+        params.append(ensure_date_str(date_from))
+    if date_to:
+        where.append("separation_date <= ?")
+        params.append(ensure_date_str(date_to))
+    if reason:
+        where.append("reason LIKE ?")
+        params.append(f"%{reason}%")
+    # archived separations are included only when the range overlaps the archived dates
+    attach, sources = archive.report_sources(date_from, "separation", date_to)
+    rows, next_cursor = db.fetch_keyset_page(sources["separation"], SEPARATION_COLUMNS, where, params,
+                                             sort_by, SEPARATION_SORT_KEYS[sort_by], descending=descending,
+                                             cursor=cursor, page_size=page_size, attach=attach, form=form)
+    return {"rows": rows, "next_cursor": next_cursor}
+
+def iter_separations(page_size=5000, **filters):
+    """Yield pages (lists of rows) of query_separations() until the history is exhausted."""
+    cursor = None
+    while True:
+        page = query_separations(page_size=page_size, cursor=cursor, **filters)
+        if page["rows"]:
+            yield page["rows"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
 
 def list_separations():
     """Return all separation records"""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, p_no, name, separation_date, reason FROM separation ORDER BY separation_date DESC")
-        rows = cur.fetchall()
-    cols = ["id", "p_no", "name", "separation_date", "reason"]
-    return [dict(zip(cols, r)) for r in rows]
-
-def delete_separation(rec_id):
+    return [r for page in iter_separations() for r in page]
+
+def delete_separation(rec_id, wait=True):
     """Delete a separation record by ID"""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM separation WHERE id = ?", (rec_id,))
+    return writer.execute(lambda cur: cur.execute("DELETE FROM separation WHERE id = ?", (rec_id,)).rowcount,
+                          wait=wait)
 
-def bulk_upload_separations(filepath):
+def bulk_upload_separations(filepath, set_end_date=False):
     """
     Bulk upload separations from CSV, Excel, or JSON file.
     Expected columns (case-insensitive): p_no, name, separation_date, reason
+
+    The file is processed column-wise in one pass:
+      - rows without p_no / separation_date are dropped
+      - p_no is validated against the employees table with one set lookup
+      - dates are normalized for the whole column
+      - (p_no, separation_date) pairs already stored, or repeated in the file, are skipped
+      - everything is inserted with one executemany in a single writer op (one transaction)
+    set_end_date=True also sets employees.end_date to the separation date in the same op.
+    Returns number of inserted rows.
     """
     df = load_dataframe_from_file(filepath)
     if df is None or df.empty:
@@ -40,31 +100,91 @@ def bulk_upload_separations(filepath):
 
     # Normalize and map columns
     mapping = map_columns_case_insensitive(df, ["p_no", "name", "separation_date", "reason"])
-    inserted = 0
-
-    for i, row in df.iterrows():
-        try:
-            p = row[mapping.get("p_no")] if mapping.get("p_no") in row else None
-            name = row[mapping.get("name")] if mapping.get("name") else None
-            sd = row[mapping.get("separation_date")] if mapping.get("separation_date") else None
-            reason = row[mapping.get("reason")] if mapping.get("reason") else None
-
-            if pd.isna(p) or pd.isna(sd):
-                continue  # skip invalid rows
-
-            add_separation(p, name, sd, reason)
-            inserted += 1
-        except Exception as e:
-            print(f"bulk_upload_separations skip row {i}: {e}")
-
-    return inserted
-
-def export_separations(path):
-    """Export separation records to file (CSV, Excel, JSON supported)"""
-    rows = list_separations()
-    df = pd.DataFrame(rows)
-    if df.empty:
+    if not mapping.get("p_no") or not mapping.get("separation_date"):
+        missing = [k for k in ("p_no", "separation_date") if not mapping.get(k)]
+        raise ValueError(f"bulk_upload_separations: required columns missing or not detected: {missing}")
+
+    def column(key):
+        col = mapping.get(key)
+        return df[col] if col else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    frame = pd.DataFrame({
+        "p_no": column("p_no"),
+        "name": column("name"),
+        "separation_date": column("separation_date"),
+        "reason": column("reason"),
+    })
+    total = len(frame)
+    frame = frame[frame["p_no"].notna() & frame["separation_date"].notna()]
+    frame["p_no"] = normalize_id_series(frame["p_no"])
+    frame["separation_date"] = normalize_date_series(frame["separation_date"])
+    frame = frame[frame["separation_date"].notna() & (frame["p_no"] != "")]
+    invalid = total - len(frame)
+
+    known = employee.known_p_nos()
+    valid = frame["p_no"].isin(known)
+    unknown = int((~valid).sum())
+    known_frame = frame[valid].drop_duplicates(subset=["p_no", "separation_date"], keep="first").copy()
+
+    # fill missing names from the employee directory (cached, no per-row queries)
+    names = known_frame["name"].where(known_frame["name"].notna(), None).astype(object)
+    missing_name = names.isna()
+    if missing_name.any():
+        names[missing_name] = known_frame.loc[missing_name, "p_no"].map(employee.get_employee_name)
+    known_frame["name"] = names.map(lambda v: None if v is None or pd.isna(v) else str(v).strip())
+    known_frame["reason"] = known_frame["reason"].map(lambda v: None if v is None or pd.isna(v) else str(v))
+
+    def write(cur):
+        frame = known_frame
+        cur.execute("SELECT p_no, separation_date FROM separation")
+        existing = set(cur.fetchall())
+        if existing:
+            pairs = pd.Series(list(zip(frame["p_no"], frame["separation_date"])), index=frame.index, dtype=object)
+            frame = frame[~pairs.isin(existing)]
+
+        batch_id = import_batch.begin_batch(cur, "separations", import_batch.source_name(filepath))
+        rows = list(zip(frame["p_no"], frame["name"], frame["separation_date"], frame["reason"],
+                        [batch_id] * len(frame)))
+        cur.executemany(
+            "INSERT INTO separation (p_no, name, separation_date, reason, batch_id) VALUES (?, ?, ?, ?, ?)", rows)
+        written = len(rows)
+        if set_end_date and rows:
+            # old end dates go to employees_undo so rollback_batch() restores them
+            latest = frame.groupby("p_no")["separation_date"].max()
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS _end_date_stage (p_no TEXT, end_date TEXT)")
+            cur.execute("DELETE FROM temp._end_date_stage")
+            cur.executemany("INSERT INTO temp._end_date_stage VALUES (?, ?)", list(latest.items()))
+            import_batch.capture_employees(cur, batch_id, "temp._end_date_stage", columns=["end_date"])
+            cur.execute("""
+                UPDATE employees SET end_date = s.end_date, batch_id = ?
+                FROM temp._end_date_stage s
+                WHERE employees.p_no = s.p_no AND employees.end_date IS NOT s.end_date
+            """, (batch_id,))
+            written += cur.rowcount
+            cur.execute("DROP TABLE temp._end_date_stage")
+        import_batch.close_batch(cur, batch_id, written)
+        return frame, rows
+
+    # the duplicate check and the inserts run in one writer op, so no other write lands in between
+    frame, rows = writer.execute(write)
+    duplicates = total - invalid - unknown - len(frame)
+    if set_end_date and rows:
+        employee.refresh_employee_cache(frame["p_no"].unique())
+    skipped = invalid + unknown + duplicates
+    if skipped:
+        print(f"bulk_upload_separations: inserted={len(rows)}, skipped={skipped} "
+              f"(invalid={invalid}, unknown p_no={unknown}, duplicate={duplicates})")
+    return len(rows)
+
+def export_separations(path, **filters):
+    """
+    Export separation records to file (CSV, Excel, JSON supported).
+    Records are read page by page; CSV output is streamed without holding the whole table.
+    Optional filters are passed to query_separations().
+    """
+    pages = (pd.DataFrame(rows, columns=SEPARATION_COLUMNS) for rows in iter_separations(form="tuples", **filters))
+    written = save_dataframe_chunks_to_file(pages, path, columns=SEPARATION_COLUMNS)
+    if not written:
         print("No separations to export")
         return None
-    save_dataframe_to_file(df, path)
     return path
@@ -0,0 +1,268 @@
+# sync.py
+"""
+Incremental sync between office databases using the change journal (see db.init_db()).
+
+Every local insert/update/delete on employees, attendance, separation and exam_marks is
+journaled as (table, natural key, op, changed_at ms, site_id). pull(source, target) reads only
+the source journal entries after the watermark stored for that source site, collapses them to
+the latest entry per key, and applies those newer than what the target already has for the key
+(last-writer-wins on (changed_at, site_id)). Applied entries are journaled in the target with
+their original stamps, so changes propagate through intermediate offices and re-running a sync
+is a no-op. A deleted employee is moved to the target's archive with its history
+(archive_reason 'deleted'), as employee.delete_employee() does locally.
+
+Usage:
+    python sync.py PEER_DB [--db LOCAL_DB] [--pull-only | --push-only]
+    python sync.py --status [--db LOCAL_DB]
+    python sync.py --compact [--db LOCAL_DB]
+"""
+import argparse
+import os
+import sys
+import time
+import db
+import employee
+import archive
+import writer
+
+# apply order: parents before children for upserts; employee deletes are archived in between
+_APPLY_ORDER = ("employees", "attendance", "separation", "exam_marks")
+
+
+def _columns(cur, schema, table):
+    cur.execute(f"PRAGMA {schema}.table_info({table})")
+    return [r[1] for r in cur.fetchall()]
+
+
+def site_id(path=None):
+    """Return the site id of path (default DB_FILE)."""
+    conn = db._connect(path)
+    try:
+        return conn.execute("SELECT site_id FROM db_state WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _apply_table(cur, table, common_cols):
+    """Apply the winning _sync_delta rows for one table; returns the number of rows written."""
+    keys = db.JOURNAL_KEYS[table]
+    # seek rows by p_no and filter the rest ("+" keeps low-cardinality columns such as
+    # exam_type from being chosen as the lookup index)
+    key_match = " AND ".join(f"{'' if i == 0 else '+'}t.{k} IS k.k{i}" for i, k in enumerate(keys))
+    src_match = " AND ".join(f"{'' if i == 0 else '+'}s.{k} IS k.k{i}" for i, k in enumerate(keys))
+    cols = ", ".join(common_cols)
+    written = 0
+    if table == "employees":
+        updates = ", ".join(f"{c} = excluded.{c}" for c in common_cols if c != "p_no")
+        cur.execute(f"""
+            INSERT INTO main.employees ({cols})
+            SELECT {", ".join("s." + c for c in common_cols)}
+            FROM _sync_delta k JOIN src.employees s ON {src_match}
+            WHERE k.table_name = 'employees' AND k.op = 'upsert'
+            ON CONFLICT(p_no) DO UPDATE SET {updates}
+        """)
+        return cur.rowcount
+    # child tables: replace all rows of the key with the source's current rows. Keys are not
+    # unique (e.g. two exam rows on one date), so a 'delete' entry may still leave source rows.
+    cur.execute(f"""
+        DELETE FROM main.{table}
+        WHERE rowid IN (SELECT t.rowid FROM _sync_delta k JOIN main.{table} t ON {key_match}
+                        WHERE k.table_name = '{table}')
+    """)
+    written += cur.rowcount
+    cur.execute(f"""
+        INSERT INTO main.{table} ({cols})
+        SELECT {", ".join("s." + c for c in common_cols)}
+        FROM _sync_delta k JOIN src.{table} s ON {src_match}
+        WHERE k.table_name = '{table}'
+          AND EXISTS (SELECT 1 FROM main.employees e WHERE e.p_no = s.p_no)
+    """)
+    written += cur.rowcount
+    return written
+
+
+def _apply_pull(source_path, target_path):
+    """One pull in one transaction on its own connection; returns (source_site, received, applied, watermark)."""
+    conn = db._connect(target_path)
+    try:
+        cur = conn.cursor()
+        cur.execute("PRAGMA foreign_keys = ON")
+        cur.execute("ATTACH DATABASE ? AS src", (source_path,))
+        # journaled employee deletes are replayed as archive moves (history kept, as locally)
+        archive.attach_archive(cur, target_path)
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT site_id FROM src.db_state WHERE id = 1")
+        source_site = cur.fetchone()[0]
+        cur.execute("SELECT last_seq FROM sync_peers WHERE site_id = ?", (source_site,))
+        row = cur.fetchone()
+        watermark = row[0] if row else 0
+        cur.execute("SELECT IFNULL(MAX(seq), 0) FROM src.change_journal")
+        new_watermark = cur.fetchone()[0]
+
+        # latest source entry per key since the watermark ...
+        cur.execute("DROP TABLE IF EXISTS temp._sync_delta")
+        cur.execute("""
+            CREATE TEMP TABLE _sync_delta AS
+            SELECT table_name, row_key, op, changed_at, site_id, MAX(seq) AS seq
+            FROM src.change_journal WHERE seq > ? AND seq <= ?
+            GROUP BY table_name, row_key
+        """, (watermark, new_watermark))
+        cur.execute("SELECT COUNT(*) FROM _sync_delta")
+        received = cur.fetchone()[0]
+        # ... minus keys where the target already holds an equal or newer change (last-writer-wins)
+        cur.execute("""
+            DELETE FROM _sync_delta
+            WHERE EXISTS (SELECT 1 FROM main.change_journal j
+                          WHERE j.table_name = _sync_delta.table_name AND j.row_key = _sync_delta.row_key
+                            AND (j.changed_at, j.site_id) >= (_sync_delta.changed_at, _sync_delta.site_id))
+        """)
+        cur.execute("SELECT COUNT(*) FROM _sync_delta")
+        applied = cur.fetchone()[0]
+        if applied:
+            max_keys = max(len(k) for k in db.JOURNAL_KEYS.values())
+            for i in range(max_keys):
+                cur.execute(f"ALTER TABLE _sync_delta ADD COLUMN k{i}")
+                cur.execute(f"UPDATE _sync_delta SET k{i} = json_extract(row_key, '$[{i}]')")
+            cur.execute("CREATE INDEX temp.idx_sync_delta_key ON _sync_delta(table_name, k0, k1, k2)")
+
+            # apply without journaling, then journal the winners with their original stamps
+            cur.execute("UPDATE main.db_state SET mode = 'sync' WHERE id = 1")
+            for table in _APPLY_ORDER:
+                # batch ids are local to each database (import_batch.py)
+                common = [c for c in _columns(cur, "main", table)
+                          if c not in ("id", "batch_id") and c in set(_columns(cur, "src", table))]
+                _apply_table(cur, table, common)
+                if table == "employees":
+                    # before the child tables: their journaled deletes then find nothing left to drop
+                    archive.move_employees_in(cur, "SELECT k0 FROM _sync_delta WHERE table_name = 'employees' "
+                                                   "AND op = 'delete'", "deleted")
+            cur.execute("UPDATE main.db_state SET mode = 'normal' WHERE id = 1")
+            cur.execute("""
+                INSERT INTO main.change_journal (table_name, row_key, op, changed_at, site_id)
+                SELECT table_name, row_key, op, changed_at, site_id FROM _sync_delta ORDER BY seq
+            """)
+        cur.execute("""
+            INSERT INTO sync_peers (site_id, last_seq, last_path, last_sync_at) VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT(site_id) DO UPDATE SET
+                last_seq = excluded.last_seq, last_path = excluded.last_path, last_sync_at = excluded.last_sync_at
+        """, (source_site, new_watermark, os.path.abspath(source_path)))
+        cur.execute("DROP TABLE temp._sync_delta")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return source_site, received, applied, new_watermark
+
+
+def pull(source_path, target_path=None):
+    """
+    Apply the changes journaled in source_path since the last pull into target_path (default DB_FILE).
+    Both databases are brought to the current schema first.
+    Returns dict: source_site, received (distinct keys since watermark), applied, skipped, watermark, seconds.
+    """
+    target_path = target_path or db.DB_FILE
+    if not os.path.exists(source_path):
+        raise ValueError(f"Database file not found: {source_path}")
+    if os.path.abspath(source_path) == os.path.abspath(target_path):
+        raise ValueError("Source and target are the same database")
+    db.init_db(source_path)
+    db.init_db(target_path)
+    t0 = time.perf_counter()
+    # on the writer thread, so the apply never races the app's own writes for the lock
+    source_site, received, applied, new_watermark = writer.call(_apply_pull, source_path, target_path).result()
+
+    if applied and os.path.abspath(target_path) == os.path.abspath(db.DB_FILE):
+        employee.invalidate_employee_cache()
+    return {"source_site": source_site, "received": received, "applied": applied,
+            "skipped": received - applied, "watermark": new_watermark,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def sync(peer_path, local_path=None):
+    """Two-way sync: pull peer -> local, then local -> peer. Returns {"pulled": ..., "pushed": ...}."""
+    local_path = local_path or db.DB_FILE
+    pulled = pull(peer_path, local_path)
+    pushed = pull(local_path, peer_path)
+    return {"pulled": pulled, "pushed": pushed}
+
+
+def sync_status(path=None):
+    """Return dict: site_id, journal_rows, last_seq and the peers with their watermarks."""
+    db.init_db(path)
+    conn = db._connect(path)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT site_id FROM db_state WHERE id = 1")
+        site = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*), IFNULL(MAX(seq), 0) FROM change_journal")
+        rows, last_seq = cur.fetchone()
+        cur.execute("SELECT site_id, last_seq, last_path, last_sync_at FROM sync_peers ORDER BY last_sync_at DESC")
+        peers = [dict(zip(("site_id", "last_seq", "last_path", "last_sync_at"), r)) for r in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    return {"site_id": site, "journal_rows": rows, "last_seq": last_seq, "peers": peers}
+
+
+def compact_journal(path=None):
+    """
+    Drop journal entries superseded by a later entry for the same key. Peers never need them:
+    the surviving entry has a higher seq than any superseded one. Returns rows removed.
+    """
+    conn = db._connect(path)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM change_journal
+            WHERE seq NOT IN (SELECT MAX(seq) FROM change_journal GROUP BY table_name, row_key)
+        """)
+        removed = cur.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync employee databases through their change journals.")
+    parser.add_argument("peer", nargs="?", help="peer database file")
+    parser.add_argument("--db", default=None, help="local database (default: the application database)")
+    direction = parser.add_mutually_exclusive_group()
+    direction.add_argument("--pull-only", action="store_true", help="only apply the peer's changes locally")
+    direction.add_argument("--push-only", action="store_true", help="only apply local changes to the peer")
+    parser.add_argument("--status", action="store_true", help="show site id, journal size and peer watermarks")
+    parser.add_argument("--compact", action="store_true", help="drop superseded journal entries")
+    args = parser.parse_args(argv)
+    local = args.db or db.DB_FILE
+
+    if args.status:
+        st = sync_status(local)
+        print(f"Site {st['site_id']}: {st['journal_rows']} journal rows, last seq {st['last_seq']}")
+        for p in st["peers"]:
+            print(f"  peer {p['site_id']} seq {p['last_seq']} at {p['last_sync_at']} ({p['last_path']})")
+        return 0
+    if args.compact:
+        print("Removed", compact_journal(local), "superseded journal rows.")
+        return 0
+    if not args.peer:
+        parser.error("peer database is required")
+
+    try:
+        results = []
+        if not args.push_only:
+            results.append(("pulled", pull(args.peer, local)))
+        if not args.pull_only:
+            results.append(("pushed", pull(local, args.peer)))
+    except Exception as e:
+        print("Sync failed:", e)
+        return 1
+    for label, r in results:
+        print(f"{label}: {r['applied']} applied, {r['skipped']} skipped of {r['received']} changes "
+              f"(watermark {r['watermark']}, {r['seconds']}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Archive watermarks and backup / restore of the archive database.
+"""
+import os
+import pytest
+import archive
+import attendance
+import backup
+import employee
+import separation
+
+
+def _statuses(date_value):
+    return {r["p_no"]: r["status"] for r in attendance.get_attendance_for_date(date_value)}
+
+
+@pytest.fixture
+def backups(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    return backup.BACKUP_DIR
+
+
+def test_archived_separated_staff_stay_in_reports_over_their_dates(temp_db):
+    employee.add_employee("1", "Asha")
+    employee.add_employee("2", "Ravi")
+    attendance.update_attendance("1", "2024-03-01", "Present")
+    attendance.update_attendance("2", "2024-03-01", "Present")
+    separation.add_separation("2", "Ravi", "2024-03-02")
+
+    assert archive.archive_separated(before="2024-06-01") == 1
+    assert archive.archive_stats()["state"] == {
+        "attendance_min_date": "2024-03-01", "attendance_max_date": "2024-03-01",
+        "separation_min_date": "2024-03-02", "separation_max_date": "2024-03-02"}
+
+    both = [("1", "Asha", 1, 0, 0), ("2", "Ravi", 1, 0, 0)]
+    assert attendance.get_attendance_summary(form="tuples") == both
+    assert attendance.get_attendance_summary("2024-03-01", "2024-03-31", form="tuples") == both
+    register = attendance.muster_register("2024-03").set_index("p_no")
+    assert (register.loc["2", "01"], register.loc["2", "present"]) == ("P", 1)
+    assert _statuses("2024-03-01") == {"1": "Present", "2": "Present"}
+    assert [r["p_no"] for r in separation.query_separations()["rows"]] == ["2"]
+
+    # ranges outside the archived dates stay on the hot tables
+    hot = (None, {"employees": "employees", "attendance": "attendance"})
+    assert archive.report_sources("2024-03-02", "attendance") == hot
+    assert archive.report_sources("2024-01-01", "attendance", "2024-02-29") == hot
+
+
+def test_restoring_a_pre_archive_backup_does_not_count_rows_twice(backups):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2020-01-02", "Present")
+    attendance.update_attendance("1", "2024-01-02", "Absent")
+    saved = backup.backup_now("manual")
+    assert not os.path.exists(archive.archive_path(saved))
+
+    assert archive.archive_attendance(before="2021-01-01") == 1
+    backup.restore(saved)
+    assert attendance.get_attendance_summary("2019-01-01", form="tuples") == [("1", "Asha", 1, 1, 0)]
+    assert archive.archive_stats()["attendance"] == 0
+
+
+def test_backup_carries_the_archive_and_restore_brings_it_back(backups):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2020-01-02", "Present")
+    archive.archive_attendance(before="2021-01-01")
+    saved = backup.backup_now("manual")
+    assert os.path.exists(archive.archive_path(saved))
+    assert [b["path"] for b in backup.list_backups()] == [saved]
+
+    os.remove(archive.archive_path())
+    backup.restore(saved)
+    assert archive.archive_stats()["attendance"] == 1
+    assert attendance.get_attendance_summary("2019-01-01", form="tuples") == [("1", "Asha", 1, 0, 0)]
+
+
+def test_rotation_removes_the_archive_copy_too(backups):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2020-01-02", "Present")
+    archive.archive_attendance(before="2021-01-01")
+    first = backup.backup_now("manual", keep=1)
+    backup.backup_now("manual", keep=1)
+    assert not os.path.exists(first)
+    assert not os.path.exists(archive.archive_path(first))
@@ -0,0 +1,70 @@
+"""
+Backup / restore against a scratch database and backup folder.
+"""
+import os
+import sqlite3
+import pytest
+import db
+import attendance
+import backup
+import employee
+import migrations
+
+
+@pytest.fixture
+def backups(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    return backup.BACKUP_DIR
+
+
+def test_restore_brings_data_back_and_invalidates_caches(backups):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2024-01-02", "Present")
+    saved = backup.backup_now("manual")
+
+    attendance.update_attendance("1", "2024-01-02", "Absent")
+    employee.add_employee("2", "Ravi")
+    before = db.get_table_versions()
+    # cached from here on
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 0, 1, 0), ("2", "Ravi", 0, 0, 0)]
+
+    safety = backup.restore(saved)
+    assert [b["path"] for b in backup.list_backups("pre-restore")] == [safety]
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 0, 0)]
+    assert employee.get_employee("2") is None
+    # counters only move forward across a restore
+    assert all(after > b for after, b in zip(db.get_table_versions(), before))
+    # the app keeps writing to the restored file
+    attendance.update_attendance("1", "2024-01-03", "Leave")
+    assert len(attendance.get_attendance_for_date("2024-01-03", form="tuples")) == 1
+
+
+def test_backup_from_a_newer_schema_leaves_the_live_database_alone(backups, tmp_path):
+    employee.add_employee("1", "Asha")
+    future = str(tmp_path / "future.db")
+    backup._copy(db.DB_FILE, future)
+    conn = sqlite3.connect(future)
+    conn.execute(f"PRAGMA user_version = {migrations.LATEST_VERSION + 1}")
+    conn.execute("DELETE FROM employees")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(ValueError, match="newer"):
+        backup.restore(future)
+    assert employee.get_employee("1")["name"] == "Asha"
+    assert backup.list_backups() == []
+
+
+def test_failed_migration_leaves_the_live_database_alone(backups, monkeypatch):
+    employee.add_employee("1", "Asha")
+    saved = backup.backup_now("manual")
+    employee.add_employee("2", "Ravi")
+
+    def fail(path=None, progress=None):
+        raise RuntimeError("migration failed")
+    with monkeypatch.context() as m:
+        m.setattr(db, "init_db", fail)
+        with pytest.raises(RuntimeError):
+            backup.restore(saved)
+    assert {employee.get_employee(p)["name"] for p in ("1", "2")} == {"Asha", "Ravi"}
+    assert not [n for n in os.listdir(os.path.dirname(db.DB_FILE)) if n.endswith(".restore")]
@@ -0,0 +1,28 @@
+"""
+db.Record rows: tuple semantics plus dict-style column access.
+"""
+import pytest
+import db
+
+
+def test_record_is_a_tuple_with_named_columns():
+    Row = db.record_type(["p_no", "name", "count"])
+    row = Row._make(("1", "Asha", 3))
+
+    # tuple side, as for a namedtuple: iteration, len and `in` see the values
+    assert list(row) == ["1", "Asha", 3]
+    assert len(row) == 3
+    assert "Asha" in row
+    assert "name" not in row
+    p_no, name, _ = row
+    assert (p_no, name, row[1], row.name) == ("1", "Asha", "Asha", "Asha")
+
+    # dict side: by column name
+    assert row["name"] == "Asha"
+    assert row.get("name") == "Asha" and row.get("missing", 0) == 0
+    assert "name" in row.keys()
+    assert dict(row) == {"p_no": "1", "name": "Asha", "count": 3}
+    with pytest.raises(KeyError):
+        row["missing"]
+    # columns clashing with tuple methods stay reachable by key
+    assert row["count"] == 3
@@ -0,0 +1,54 @@
+"""
+Employee directory cache and bulk_upload_employees against a scratch database.
+"""
+import pandas as pd
+import db
+import employee
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=["p_no", "name", "shop", "category", "doj"])
+
+
+def test_directory_cache_follows_writes(temp_db):
+    employee.add_employee("100", "Asha", shop="Paint Shop")
+    assert employee.get_employee("100")["name"] == "Asha"
+
+    # a write through the module updates the cached row
+    employee.add_employee("100", "Asha K", shop="Paint Shop")
+    assert employee.get_employee("100")["name"] == "Asha K"
+
+    # a write behind the module's back is only seen after invalidation
+    with db.get_conn() as conn:
+        conn.execute("UPDATE employees SET name = 'Changed' WHERE p_no = '100'")
+    assert employee.get_employee("100")["name"] == "Asha K"
+    employee.invalidate_employee_cache("100")
+    assert employee.get_employee("100")["name"] == "Changed"
+
+    employee.delete_employee("100")
+    assert employee.get_employee("100") is None
+    assert not employee.employee_exists("100")
+
+
+def test_bulk_upload_counts_only_rows_written(temp_db):
+    df = _frame([(1001.0, "A", "Paint Shop", None, "05/01/2024"),
+                 (1002.0, "B", "Press Shop", "neem", None),
+                 (None, "no p_no", None, None, None)])
+    assert employee.bulk_upload_employees(df) == 2
+    # the same file again changes nothing
+    assert employee.bulk_upload_employees(df) == 0
+
+    row = employee.get_employee("1001")
+    assert row["doj"] == "2024-01-05" and row["category"] == "Other"
+    assert employee.get_employee("1002")["category"] == "neem"
+
+    df.loc[1, "shop"] = "Body Shop"
+    assert employee.bulk_upload_employees(df) == 1
+    # the cache picked up the upload
+    assert employee.get_employee("1002")["shop"] == "Body Shop"
+
+
+def test_bulk_upload_last_row_wins(temp_db):
+    df = _frame([("7", "First", None, None, None), ("7", "Second", None, None, None)])
+    assert employee.bulk_upload_employees(df) == 1
+    assert employee.get_employee("7")["name"] == "Second"
@@ -0,0 +1,44 @@
+"""
+Exam pivots and uploads against a scratch database.
+"""
+import pytest
+import db
+import employee
+import exam
+
+
+def test_group_pivot_shows_legacy_exam_types_like_the_full_pivot(temp_db):
+    employee.add_employee("1", "Asha", shop="Paint Shop")
+    employee.add_employee("2", "Ravi", shop="Press Shop")
+    # a raw type as copied from the old exams tables, next to a canonical one
+    with db.get_conn() as conn:
+        conn.execute("INSERT INTO exam_marks (p_no, name, exam_type, exam_date, marks) "
+                     "VALUES ('1', 'Asha', 'induction pretest', '2024-01-05', 55)")
+    exam.add_exam_mark("2", "Ravi", "Induction_PostTest", "2024-01-06", 70)
+    exam.add_exam_mark("2", "Ravi", "NEEM_Sem1", "2024-01-07", 80)
+
+    full = {r["p_no"]: r for r in exam.pivot_exam_summary()}
+    assert full["1"]["Induction_PreTest_marks"] == 55.0
+    group = {r["p_no"]: r for r in exam.pivot_exam_group("Induction")}
+    assert (group["1"]["PreTest_marks"], group["1"]["PreTest_date"]) == (55.0, "2024-01-05")
+    assert (group["2"]["PostTest_marks"], group["2"]["PreTest_marks"]) == (70.0, None)
+    assert set(group["2"]) == {"p_no", "name", "PreTest_marks", "PreTest_date", "PostTest_marks", "PostTest_date"}
+
+    shop = exam.pivot_exam_group("Induction", shop="Paint Shop")
+    assert [(r["p_no"], r["PreTest_marks"]) for r in shop] == [("1", 55.0)]
+    assert exam.pivot_exam_group("NEEM", shop="Paint Shop")[0]["Sem1_marks"] is None
+
+
+def test_bulk_upload_wrappers_return_the_inserted_count(temp_db, tmp_path):
+    employee.add_employee("1", "Asha")
+    path = tmp_path / "pretest.csv"
+    path.write_text("p_no,exam_date,marks\n1,2024-01-05,55\n99,2024-01-05,60\n")
+    assert exam.bulk_upload_for("Induction", "PreTest", str(path)) == 1
+    assert exam.bulk_upload_exams(str(path), "Induction", "PostTest") == 1
+    report = exam.ingest_exams(str(path), "Induction", "PreTest")
+    assert (report["inserted"], [r["reason"] for r in report["rejected"]]) == (1, ["unknown p_no"])
+
+    no_dates = tmp_path / "no_dates.csv"
+    no_dates.write_text("p_no,marks\n1,55\n")
+    with pytest.raises(ValueError, match="exam_date"):
+        exam.bulk_upload_for("Induction", "PreTest", str(no_dates))
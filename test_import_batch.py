@@ -0,0 +1,50 @@
+"""
+Rolling back import batches against a scratch database.
+"""
+import pandas as pd
+import pytest
+import attendance
+import employee
+import exam
+import import_batch
+
+
+def _upload_new_staff():
+    df = pd.DataFrame({"p_no": ["8", "9"], "date": ["2024-01-01", "2024-01-01"], "status": ["P", "A"],
+                       "name": ["Meena", "Kiran"]})
+    attendance.bulk_upload_attendance(df, create_missing=True)
+    return import_batch.list_batches()[0]["batch_id"]
+
+
+def test_rollback_deletes_what_the_upload_created(temp_db):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2024-01-01", "Leave")
+    batch_id = _upload_new_staff()
+    assert import_batch.rollback_preview(batch_id)["employees"] == 2
+
+    counts = import_batch.rollback_batch(batch_id)
+    assert (counts["attendance"], counts["employees"], counts["employees_kept"]) == (2, 2, 0)
+    assert employee.get_employee("8") is None
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 0, 0, 1)]
+    with pytest.raises(ValueError, match="already"):
+        import_batch.rollback_batch(batch_id)
+    with pytest.raises(ValueError, match="Unknown"):
+        import_batch.rollback_batch(batch_id + 1)
+
+
+def test_rollback_keeps_created_employees_with_later_rows(temp_db):
+    batch_id = _upload_new_staff()
+    # entered by hand after the upload
+    attendance.update_attendance("8", "2024-01-02", "Present")
+    exam.add_exam_mark("8", "Meena", "Safety", "2024-01-05", 70)
+
+    preview = import_batch.rollback_preview(batch_id)
+    assert (preview["employees"], preview["employees_kept"], preview["later_rows"]) == (1, 1, 2)
+
+    counts = import_batch.rollback_batch(batch_id)
+    assert (counts["employees"], counts["employees_kept"]) == (1, 1)
+    assert employee.get_employee("8")["name"] == "Meena"
+    assert employee.get_employee("9") is None
+    # only the uploaded row went; the later ones survive
+    assert attendance.get_attendance_summary(form="tuples") == [("8", "Meena", 1, 0, 0)]
+    assert len(exam.query_exam_marks(p_no="8")["rows"]) == 1
@@ -0,0 +1,58 @@
+"""
+Watch-folder ingest against a scratch database and folder.
+"""
+import pytest
+import attendance
+import employee
+import ingest
+
+
+@pytest.fixture
+def drop(temp_db, tmp_path):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    employee.add_employee("1", "Asha")
+    return folder
+
+
+def test_appended_lines_are_applied_once(drop):
+    f = drop / "t1.csv"
+    f.write_text("p_no,date,status\n1,2024-01-02,Present\n")
+    assert [r["action"] for r in ingest.poll_once(str(drop))] == ["full"]
+    with open(f, "a") as fh:
+        fh.write("1,2024-01-03,Absent\n")
+    results = ingest.poll_once(str(drop))
+    assert [(r["action"], r["rows"]) for r in results] == [("appended", 1)]
+    assert ingest.poll_once(str(drop)) == []
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 1, 0)]
+
+
+def test_a_failed_file_is_retried_on_the_next_poll(drop, monkeypatch):
+    (drop / "t1.csv").write_text("p_no,date,status\n1,2024-01-02,Present\n")
+    with monkeypatch.context() as m:
+        def locked(df, create_missing=False):
+            raise RuntimeError("database is locked")
+        m.setattr(attendance, "bulk_upload_attendance", locked)
+        assert [r["action"] for r in ingest.poll_once(str(drop))] == ["error"]
+    assert ingest.ingest_status()[0]["status"] == "error"
+
+    # same bytes, same mtime: still picked up again
+    assert [(r["action"], r["rows"]) for r in ingest.poll_once(str(drop))] == [("full", 1)]
+    assert ingest.ingest_status()[0]["status"] == "done"
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 0, 0)]
+
+
+def test_a_failed_append_keeps_the_earlier_checkpoint(drop, monkeypatch):
+    f = drop / "t1.csv"
+    f.write_text("p_no,date,status\n1,2024-01-02,Present\n")
+    ingest.poll_once(str(drop))
+    with open(f, "a") as fh:
+        fh.write("1,2024-01-03,Absent\n")
+    with monkeypatch.context() as m:
+        def locked(df, create_missing=False):
+            raise RuntimeError("database is locked")
+        m.setattr(attendance, "bulk_upload_attendance", locked)
+        assert [r["action"] for r in ingest.poll_once(str(drop))] == ["error"]
+
+    assert [(r["action"], r["rows"]) for r in ingest.poll_once(str(drop))] == [("appended", 1)]
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 1, 0)]
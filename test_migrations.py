@@ -0,0 +1,76 @@
+"""
+Schema migrations from a pre-versioning database (PRAGMA user_version 0).
+"""
+import sqlite3
+import pytest
+import db
+import migrations
+
+
+def _legacy_db(path):
+    """The schema as the first release created it: no category column, duplicate attendance allowed."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE employees (p_no TEXT PRIMARY KEY, name TEXT NOT NULL, phone TEXT, dob TEXT, doj TEXT,
+                                end_date TEXT, ticket_no TEXT, shop TEXT);
+        CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, p_no TEXT NOT NULL, date TEXT NOT NULL,
+                                 status TEXT NOT NULL,
+                                 FOREIGN KEY(p_no) REFERENCES employees(p_no) ON DELETE CASCADE);
+        INSERT INTO employees (p_no, name, shop) VALUES ('1', 'Asha', 'Paint Shop');
+        INSERT INTO attendance (p_no, date, status) VALUES ('1', '2024-01-02', 'Absent');
+        INSERT INTO attendance (p_no, date, status) VALUES ('1', '2024-01-02', 'Present');
+        INSERT INTO attendance (p_no, date, status) VALUES ('1', '2024-01-03', 'Leave');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_database_is_brought_to_the_latest_version(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _legacy_db(path)
+    db.init_db(path)
+    conn = sqlite3.connect(path)
+    try:
+        assert migrations.current_version(conn) == migrations.LATEST_VERSION
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(employees)")]
+        assert "category" in cols and "batch_id" in cols
+        # the duplicate day collapsed to its newest row, other rows untouched
+        assert conn.execute("SELECT date, status FROM attendance ORDER BY date").fetchall() == [
+            ("2024-01-02", "Present"), ("2024-01-03", "Leave")]
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO attendance (p_no, date, status) VALUES ('1', '2024-01-03', 'Absent')")
+        # a current database costs nothing
+        assert migrations.migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_failed_step_keeps_the_previous_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    _legacy_db(path)
+
+    def broken(cur, progress):
+        cur.execute("CREATE TABLE half_done (x)")
+        raise RuntimeError("step failed")
+    steps = list(migrations.MIGRATIONS)
+    steps[2] = (3, "broken", broken)
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+    conn = sqlite3.connect(path)
+    try:
+        with pytest.raises(RuntimeError):
+            migrations.migrate(conn)
+        assert migrations.current_version(conn) == 2
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_newer_schema_is_refused(tmp_path):
+    path = str(tmp_path / "future.db")
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA user_version = {migrations.LATEST_VERSION + 1}")
+    try:
+        with pytest.raises(ValueError):
+            migrations.migrate(conn)
+    finally:
+        conn.close()
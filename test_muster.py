@@ -0,0 +1,52 @@
+"""
+Muster roll save and monthly register against a scratch database.
+"""
+import sqlite3
+import pytest
+import attendance
+import employee
+
+
+@pytest.fixture
+def staff(temp_db):
+    employee.add_employee("1", "Asha", shop="Paint Shop")
+    employee.add_employee("2", "Ravi", shop="Paint Shop")
+    employee.add_employee("3", "Meena", shop="Press Shop")
+
+
+def _day(date_value, shop=None):
+    return {r["p_no"]: r["status"] for r in attendance.get_attendance_for_date(date_value, shop=shop)}
+
+
+def test_save_muster_upserts_and_clears_in_one_write(staff):
+    attendance.update_attendance("2", "2024-01-02", "Leave")
+    result = attendance.save_muster("2024-01-02", {"1": "P", "2": "Not Recorded", "3": "absent"})
+    assert result == {"saved": 2, "cleared": 1}
+    assert _day("2024-01-02") == {"1": "Present", "2": "Not Recorded", "3": "Absent"}
+    assert _day("2024-01-02", shop="Paint Shop") == {"1": "Present", "2": "Not Recorded"}
+
+    # saving again overwrites rather than duplicating
+    assert attendance.save_muster("2024-01-02", {"1": "L", "3": None}) == {"saved": 1, "cleared": 1}
+    assert _day("2024-01-02") == {"1": "Leave", "2": "Not Recorded", "3": "Not Recorded"}
+
+
+def test_invalid_muster_writes_nothing(staff):
+    attendance.save_muster("2024-01-02", {"1": "P"})
+    with pytest.raises(ValueError, match="Invalid status for 2"):
+        attendance.save_muster("2024-01-02", {"1": None, "2": "Holiday"})
+    # an unknown employee fails the whole save, including the rows before it
+    with pytest.raises(sqlite3.IntegrityError):
+        attendance.save_muster("2024-01-02", {"1": "A", "99": "P"})
+    assert _day("2024-01-02") == {"1": "Present", "2": "Not Recorded", "3": "Not Recorded"}
+
+
+def test_muster_register_codes_and_totals(staff):
+    attendance.save_muster("2024-02-01", {"1": "P", "2": "A"})
+    attendance.save_muster("2024-02-29", {"1": "L"})
+    df = attendance.muster_register("2024-02", shop="Paint Shop").set_index("p_no")
+    assert list(df.index) == ["1", "2"]
+    # February 2024 has 29 day columns
+    assert list(df.columns[1:30]) == [f"{d:02d}" for d in range(1, 30)] and "30" not in df.columns
+    assert (df.loc["1", "01"], df.loc["1", "29"], df.loc["1", "02"], df.loc["2", "01"]) == ("P", "L", "", "A")
+    assert (df.loc["1", "present"], df.loc["1", "leave"], df.loc["2", "absent"]) == (1, 1, 1)
+    assert df.loc["2", "not_recorded"] == 28
@@ -0,0 +1,59 @@
+"""
+Keyset-paginated exam and separation queries against a scratch database.
+"""
+import pytest
+import employee
+import exam
+import separation
+
+
+@pytest.fixture
+def marks(temp_db):
+    for p in ("1", "2", "3"):
+        employee.add_employee(p, f"Emp {p}")
+    ids = []
+    # repeated dates so pages have to break ties on id
+    for i in range(25):
+        ids.append(exam.add_exam_mark(str(i % 3 + 1), None, "NEEM_Sem1", f"2024-01-{i % 5 + 1:02d}", 50 + i))
+    return ids
+
+
+def test_pages_cover_every_row_once_in_order(marks):
+    pages = list(exam.iter_exam_marks(page_size=4))
+    assert [len(p) for p in pages] == [4] * 6 + [1]
+    rows = [r for p in pages for r in p]
+    assert sorted(r.id for r in rows) == sorted(marks)
+    keys = [(r.exam_date, r.id) for r in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_apply_on_every_page(marks):
+    rows = [r for p in exam.iter_exam_marks(page_size=2, p_no="2", date_from="2024-01-02", date_to="2024-01-04")
+            for r in p]
+    assert rows and all(r.p_no == "2" and "2024-01-02" <= r.exam_date <= "2024-01-04" for r in rows)
+    expected = [i for i in range(25) if i % 3 == 1 and 2 <= i % 5 + 1 <= 4]
+    assert len(rows) == len(expected)
+
+
+def test_cursor_must_match_the_sort(marks):
+    page = exam.query_exam_marks(page_size=5)
+    assert page["next_cursor"]
+    with pytest.raises(ValueError):
+        exam.query_exam_marks(page_size=5, sort_by="p_no", cursor=page["next_cursor"])
+    with pytest.raises(ValueError):
+        exam.query_exam_marks(page_size=5, cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        exam.query_exam_marks(sort_by="marks")
+
+
+def test_separation_pages(temp_db):
+    for i in range(7):
+        employee.add_employee(str(i), f"Emp {i}")
+        separation.add_separation(str(i), None, f"2024-02-{i + 1:02d}", reason="Resigned" if i % 2 else "Retired")
+    first = separation.query_separations(page_size=3, descending=False)
+    second = separation.query_separations(page_size=3, descending=False, cursor=first["next_cursor"])
+    dates = [r.separation_date for r in first["rows"] + second["rows"]]
+    assert dates == [f"2024-02-{d:02d}" for d in range(1, 7)]
+    assert {r.p_no for r in separation.list_separations()} == {str(i) for i in range(7)}
+    resigned = [r for p in separation.iter_separations(page_size=2, reason="resign") for r in p]
+    assert len(resigned) == 3
@@ -0,0 +1,37 @@
+"""
+Performance regression test for the data modules.
+Runs the "smoke" tier of perf_suite and compares it with perf_baselines/smoke.json.
+Wall-clock timings depend on the machine, so the timed run is opt-in:
+    EMP_PERF_TESTS=1 python -m pytest test_performance.py
+The first run on a machine records the baseline; later runs fail on regressions
+above PERF_REGRESSION_THRESHOLD (default 1.0 = twice as slow).
+Larger tiers (1k / 10k / 100k, up to 10M attendance rows) are run via:
+    python perf_suite.py --tier 100k --attendance-rows 10000000
+"""
+import os
+import pytest
+import perf_suite
+
+
+@pytest.mark.skipif(os.environ.get("EMP_PERF_TESTS") != "1", reason="timed run; set EMP_PERF_TESTS=1")
+def test_smoke_tier_has_no_regressions(tmp_path):
+    report = perf_suite.run_suite("smoke", workdir=str(tmp_path))
+
+    # every read API, exporter and bulk uploader must have been timed
+    expected = {name for name, _, _ in perf_suite._build_cases({"dates": ["x"], "workdir": "", "uploads": {}})}
+    assert expected == set(report["results"])
+
+    baseline = perf_suite.load_baseline("smoke")
+    if baseline is None:
+        perf_suite.save_baseline(report)
+        return
+    regressions = perf_suite.compare_to_baseline(report, baseline)
+    assert not regressions, "performance regressions: " + ", ".join(
+        f"{r['case']} x{r['ratio']:.2f}" for r in regressions)
+
+
+def test_compare_to_baseline_flags_slowdowns():
+    baseline = {"results": {"fast": {"seconds": 0.1}, "noisy": {"seconds": 0.001}}}
+    report = {"results": {"fast": {"seconds": 0.2}, "noisy": {"seconds": 0.004}, "new": {"seconds": 1.0}}}
+    regressions = perf_suite.compare_to_baseline(report, baseline, threshold=0.5)
+    assert [r["case"] for r in regressions] == ["fast"]
@@ -0,0 +1,45 @@
+"""
+result_cache invalidation against a scratch database.
+"""
+import attendance
+import employee
+import exam
+import result_cache
+
+
+def _misses():
+    return result_cache.cache_stats("attendance.")["misses"]
+
+
+def test_report_is_recomputed_only_after_its_tables_change(temp_db):
+    employee.add_employee("1", "Asha")
+    attendance.update_attendance("1", "2024-01-02", "Present")
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 0, 0)]
+    assert _misses() == 1
+
+    # nothing written: served as is
+    attendance.get_attendance_summary(form="tuples")
+    assert _misses() == 1
+
+    # an exam mark touches neither attendance nor employees: revalidated, not recomputed
+    exam.add_exam_mark("1", "Asha", "Safety", "2024-01-05", 70)
+    before = result_cache.cache_stats()["revalidations"]
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 1, 0, 0)]
+    assert _misses() == 1
+    assert result_cache.cache_stats()["revalidations"] == before + 1
+
+    # a write to a table it reads: recomputed
+    attendance.update_attendance("1", "2024-01-02", "Absent")
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha", 0, 1, 0)]
+    assert _misses() == 2
+    employee.add_employee("1", "Asha K")
+    assert attendance.get_attendance_summary(form="tuples") == [("1", "Asha K", 0, 1, 0)]
+    assert _misses() == 3
+
+
+def test_callers_get_copies(temp_db):
+    employee.add_employee("1", "Asha")
+    rows = attendance.get_attendance_summary(form="dicts")
+    rows[0]["name"] = "changed"
+    rows.clear()
+    assert attendance.get_attendance_summary(form="dicts")[0]["name"] == "Asha"
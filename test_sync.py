@@ -0,0 +1,60 @@
+"""
+Journal-based sync between two scratch databases.
+"""
+import sqlite3
+import db
+import archive
+import attendance
+import employee
+import sync
+
+
+def _rows(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_round_trip_and_rerun_is_noop(temp_db, tmp_path):
+    peer = str(tmp_path / "peer.db")
+    db.init_db(peer)
+    employee.add_employee("1", "Asha", shop="Paint Shop")
+    attendance.update_attendance("1", "2024-01-02", "Present")
+
+    first = sync.pull(temp_db, peer)
+    assert first["applied"] == 2
+    assert _rows(peer, "SELECT p_no, name, shop FROM employees") == [("1", "Asha", "Paint Shop")]
+    assert _rows(peer, "SELECT p_no, date, status FROM attendance") == [("1", "2024-01-02", "Present")]
+    assert sync.pull(temp_db, peer)["applied"] == 0
+
+    # a later edit in the peer flows back; the older local value loses
+    conn = db._connect(peer)
+    conn.execute("UPDATE employees SET name = 'Asha K' WHERE p_no = '1'")
+    conn.commit()
+    conn.close()
+    back = sync.pull(peer, temp_db)
+    assert back["applied"] == 1
+    assert _rows(temp_db, "SELECT name FROM employees") == [("Asha K",)]
+    # the peer does not get its own change echoed back as new
+    assert sync.pull(temp_db, peer)["applied"] == 0
+
+
+def test_replayed_delete_archives_history(temp_db, tmp_path):
+    peer = str(tmp_path / "peer.db")
+    db.init_db(peer)
+    employee.add_employee("1", "Asha")
+    employee.add_employee("2", "Ravi")
+    for d in ("2024-01-02", "2024-01-03"):
+        attendance.update_attendance("1", d, "Present")
+    sync.pull(temp_db, peer)
+
+    employee.delete_employee("1")
+    sync.pull(temp_db, peer)
+    assert _rows(peer, "SELECT p_no FROM employees") == [("2",)]
+    assert _rows(peer, "SELECT COUNT(*) FROM attendance") == [(0,)]
+    # the peer keeps the history in its archive, like a local delete
+    peer_archive = archive.archive_path(peer)
+    assert _rows(peer_archive, "SELECT p_no, archive_reason FROM employees") == [("1", "deleted")]
+    assert _rows(peer_archive, "SELECT COUNT(*) FROM attendance WHERE p_no = '1'") == [(2,)]
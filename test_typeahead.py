@@ -0,0 +1,29 @@
+"""
+P. No resolution against a scratch database: exact keys only, prefixes are suggestions.
+"""
+import pytest
+import employee
+import typeahead
+
+
+@pytest.fixture
+def staff(temp_db):
+    employee.add_employee("1234", "Asha Kumari", ticket_no="T-77")
+
+
+def test_exact_p_no_and_ticket_resolve(staff):
+    assert typeahead.resolve("1234") == "1234"
+    assert typeahead.resolve(" t-77 ") == "1234"
+    # added after the index was built: found through the employee directory
+    employee.add_employee("5678", "Ravi")
+    assert typeahead.resolve("5678") == "5678"
+
+
+def test_partial_p_no_or_name_is_suggested_not_resolved(staff):
+    for text in ("12", "123", "as", "asha kumari", "12345"):
+        assert typeahead.resolve(text) is None
+        with pytest.raises(ValueError, match="Unknown P. No"):
+            typeahead.validate_p_no(text)
+    assert [s["p_no"] for s in typeahead.suggest("12")] == ["1234"]
+    with pytest.raises(ValueError, match=r"Did you mean: 1234 \(Asha Kumari\)"):
+        typeahead.validate_p_no("123")
@@ -0,0 +1,64 @@
+"""
+Bulk uploads are all-or-nothing: a failure inside the write transaction leaves no trace.
+"""
+import pandas as pd
+import pytest
+import db
+import attendance
+import employee
+import import_batch
+import separation
+
+
+def _count(table):
+    with db.get_conn() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_get_conn_rolls_back_when_the_block_raises(temp_db):
+    with pytest.raises(RuntimeError):
+        with db.get_conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO employees (p_no, name) VALUES ('1', 'A')")
+            raise RuntimeError("boom")
+    assert _count("employees") == 0
+    # and a clean exit still commits
+    with db.get_conn() as conn:
+        conn.execute("INSERT INTO employees (p_no, name) VALUES ('1', 'A')")
+    assert _count("employees") == 1
+
+
+def test_separation_upload_failing_midway_writes_nothing(temp_db, monkeypatch):
+    employee.add_employee("1", "A")
+    employee.add_employee("2", "B")
+    df = pd.DataFrame({"p_no": ["1", "2", "1"], "separation_date": ["2024-03-01", "2024-03-02", "2024-03-01"],
+                       "reason": ["Resigned", None, "Resigned"]})
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+    # fails after the separation INSERTs and the import_batch row
+    with monkeypatch.context() as m:
+        m.setattr(import_batch, "capture_employees", fail)
+        with pytest.raises(RuntimeError):
+            separation.bulk_upload_separations(df, set_end_date=True)
+    assert _count("separation") == 0
+    assert _count("import_batch") == 0
+    assert employee.get_employee("1")["end_date"] is None
+
+    assert separation.bulk_upload_separations(df, set_end_date=True) == 2
+    assert employee.get_employee("1")["end_date"] == "2024-03-01"
+
+
+def test_attendance_upload_failing_midway_writes_nothing(temp_db, monkeypatch):
+    df = pd.DataFrame({"p_no": ["9", "9"], "date": ["2024-01-01", "2024-01-02"], "status": ["P", "A"],
+                       "name": ["New", "New"]})
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+    # fails after the missing employee was created
+    monkeypatch.setattr(import_batch, "capture_attendance", fail)
+    with pytest.raises(RuntimeError):
+        attendance.bulk_upload_attendance(df, create_missing=True)
+    assert _count("employees") == 0
+    assert _count("attendance") == 0
+    assert _count("import_batch") == 0
@@ -0,0 +1,82 @@
+"""
+The single writer against a scratch database: group commit, per-op rollback, bulk writes.
+"""
+import threading
+import time
+import pandas as pd
+import pytest
+import db
+import attendance
+import employee
+import import_batch
+import writer
+
+
+def _hold_writer():
+    """Keep the writer thread busy until the returned event is set, so later ops queue up."""
+    release, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+    writer.call(hold)
+    started.wait(5)
+    return release
+
+
+def _insert(p_no):
+    return lambda cur: cur.execute("INSERT INTO employees (p_no, name) VALUES (?, ?)", (p_no, "E" + p_no)).rowcount
+
+
+def test_queued_ops_commit_as_one_group_and_fail_alone(temp_db):
+    before = writer.writer_stats()
+    release = _hold_writer()
+
+    def half_then_fail(cur):
+        cur.execute("INSERT INTO employees (p_no, name) VALUES ('x', 'partial')")
+        raise ValueError("bad row")
+    futures = [writer.submit(_insert("1")), writer.submit(half_then_fail), writer.submit(_insert("2"))]
+    release.set()
+
+    assert futures[0].result(5) == 1 and futures[2].result(5) == 1
+    with pytest.raises(ValueError, match="bad row"):
+        futures[1].result(5)
+    stats = writer.writer_stats()
+    assert stats["groups"] == before["groups"] + 1
+    assert stats["ops"] == before["ops"] + 2 and stats["failed"] == before["failed"] + 1
+    # the failed op's own insert was rolled back, its neighbours kept
+    with db.get_conn() as conn:
+        assert [r[0] for r in conn.execute("SELECT p_no FROM employees ORDER BY p_no")] == ["1", "2"]
+
+
+def test_bulk_upload_and_rollback_run_as_writer_ops(temp_db):
+    employee.add_employee("1", "Asha")
+    ops = writer.writer_stats()["ops"]
+    df = pd.DataFrame({"p_no": ["1"], "date": ["2024-01-02"], "status": ["P"]})
+    assert attendance.bulk_upload_attendance(df) == (1, 0)
+    assert writer.writer_stats()["ops"] == ops + 1
+
+    batch_id = import_batch.list_batches()[0]["batch_id"]
+    assert import_batch.rollback_batch(batch_id)["attendance"] == 1
+    assert writer.writer_stats()["ops"] == ops + 2
+    # a refused rollback is a failed op that wrote nothing
+    with pytest.raises(ValueError, match="already"):
+        import_batch.rollback_batch(batch_id)
+    assert import_batch.list_batches()[0]["status"] == "rolled_back"
+
+
+def test_connections_wait_for_a_lock(temp_db, monkeypatch):
+    monkeypatch.setattr(db, "BUSY_TIMEOUT_SECONDS", 0.05)
+    other = db._connect()
+    try:
+        other.execute("BEGIN IMMEDIATE")
+        conn = db._connect()
+        t0 = time.monotonic()
+        with pytest.raises(Exception, match="locked"):
+            conn.execute("BEGIN IMMEDIATE")
+        # gave up after the configured wait, not sqlite3's default 5 s
+        assert time.monotonic() - t0 < 2
+        conn.close()
+    finally:
+        other.rollback()
+        other.close()
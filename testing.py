@@ -0,0 +1,22 @@
+# testing.py
+"""
+Helpers for code that switches db.DB_FILE at runtime: the pytest fixtures (conftest.py) and the
+benchmark harness (perf_suite.py).
+"""
+import employee
+import result_cache
+import typeahead
+import writer
+
+
+def reset_module_state():
+    """
+    Drop everything the modules keep per database: the writer thread and its connection,
+    memoized results, the employee directory and the typeahead index. Call around a switch
+    of db.DB_FILE so nothing from one database leaks into the other.
+    """
+    writer.shutdown()
+    result_cache.clear()
+    result_cache.reset_stats()
+    employee.invalidate_employee_cache()
+    typeahead.refresh()
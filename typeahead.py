@@ -0,0 +1,259 @@
+# typeahead.py
+"""
+P. No / ticket / name autocomplete for data-entry forms.
+
+The index is an in-memory sorted array of lowercased keys (p_no, ticket_no, the full name
+and each name word) with a parallel array of p_no, so a prefix lookup is one bisect plus a
+short scan. It is rebuilt when the employees table version changes (db.get_table_versions),
+checked at most every VERSION_CHECK_SECONDS so keystrokes never wait on SQLite.
+resolve() accepts only an exact p_no or ticket_no, falling back to the employee directory on a
+miss so an employee added a moment ago still validates. Prefix and name matches are only offered
+by suggest() / the popup, where the operator picks one explicitly: a partial or mistyped P. No
+must never land on a different employee.
+"""
+import threading
+import time
+from bisect import bisect_left
+import db
+from db import get_conn
+import employee
+
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+VERSION_CHECK_SECONDS = 2.0
+SUGGEST_LIMIT = 10
+
+# match kinds in display priority
+_P_NO, _TICKET, _NAME = 0, 1, 2
+
+_index = {"db_file": None, "version": None, "checked_at": 0.0,
+          "keys": [], "entries": [], "records": {}}
+_index_lock = threading.Lock()
+
+
+def _build():
+    """Read employees and return (keys, entries, records); entries[i] = (kind, p_no) for keys[i]."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT p_no, name, ticket_no FROM employees")
+        rows = cur.fetchall()
+    pairs = []
+    records = {}
+    for p_no, name, ticket in rows:
+        records[p_no] = (name, ticket)
+        pairs.append((str(p_no).lower(), _P_NO, p_no))
+        if ticket:
+            pairs.append((str(ticket).strip().lower(), _TICKET, p_no))
+        if name:
+            full = " ".join(str(name).lower().split())
+            pairs.append((full, _NAME, p_no))
+            for word in full.split()[1:]:
+                pairs.append((word, _NAME, p_no))
+    pairs.sort()
+    return [k for k, _, _ in pairs], [(kind, p) for _, kind, p in pairs], records
+
+
+def _current():
+    """The index for DB_FILE, rebuilt if the employees version moved (checked at most every few seconds)."""
+    now = time.monotonic()
+    with _index_lock:
+        stale_file = _index["db_file"] != db.DB_FILE
+        if not stale_file and now - _index["checked_at"] < VERSION_CHECK_SECONDS:
+            return _index
+    version = db.get_table_versions("employees")
+    with _index_lock:
+        if stale_file or version != _index["version"]:
+            keys, entries, records = _build()
+            _index.update(db_file=db.DB_FILE, version=version, keys=keys, entries=entries, records=records)
+        _index["checked_at"] = now
+        return _index
+
+
+def refresh():
+    """Force a rebuild on the next lookup (e.g. right after a bulk upload)."""
+    with _index_lock:
+        _index.update(db_file=None, version=None, checked_at=0.0)
+
+
+def suggest(prefix, limit=SUGGEST_LIMIT):
+    """
+    Employees whose p_no, ticket_no, full name or any name word starts with prefix
+    (case-insensitive), p_no matches first. Returns up to limit dicts: p_no, name, ticket_no, match.
+    """
+    text = " ".join(str(prefix or "").lower().split())
+    if not text:
+        return []
+    idx = _current()
+    keys, entries, records = idx["keys"], idx["entries"], idx["records"]
+    found = {}
+    i = bisect_left(keys, text)
+    # scan a bounded window: enough to fill limit after de-duplicating per employee
+    while i < len(keys) and keys[i].startswith(text) and len(found) < limit * 4:
+        kind, p_no = entries[i]
+        if p_no not in found or kind < found[p_no]:
+            found[p_no] = kind
+        i += 1
+    ordered = sorted(found.items(), key=lambda kv: (kv[1], kv[0]))[:limit]
+    names = ("p_no", "ticket_no", "name")
+    return [{"p_no": p, "name": records[p][0], "ticket_no": records[p][1], "match": names[kind]}
+            for p, kind in ordered]
+
+
+def resolve(text):
+    """
+    Map operator input to a stored p_no: an exact p_no or ticket_no (case-insensitive), or a p_no
+    the employee directory knows. Returns None otherwise, including for prefixes and names that
+    match a single employee (see suggest()).
+    """
+    raw = str(text or "").strip()
+    if not raw:
+        return None
+    low = raw.lower()
+    idx = _current()
+    keys, entries = idx["keys"], idx["entries"]
+    i = bisect_left(keys, low)
+    exact = set()
+    while i < len(keys) and keys[i] == low:
+        kind, p_no = entries[i]
+        if kind in (_P_NO, _TICKET):
+            exact.add(p_no)
+        i += 1
+    if len(exact) == 1:
+        return exact.pop()
+    if employee.employee_exists(raw):
+        return raw
+    return None
+
+
+def validate_p_no(text):
+    """Return resolve(text) or raise ValueError naming the closest suggestions."""
+    p_no = resolve(text)
+    if p_no is not None:
+        return p_no
+    near = suggest(text, limit=5) or suggest(str(text or "")[:3], limit=5)
+    hint = (" Did you mean: " + ", ".join(f"{s['p_no']} ({s['name']})" for s in near) + "?") if near else ""
+    raise ValueError(f"Unknown P. No '{text}'.{hint}")
+
+
+# ---------------------------
+# Tk widget
+# ---------------------------
+
+def attach_autocomplete(entry, name_entry=None, on_pick=None, limit=SUGGEST_LIMIT):
+    """
+    Show a suggestion list under a ttk/tk Entry while typing. Up/Down move, Enter/Tab or a click
+    picks: the entry is set to the p_no, name_entry (if given) to the employee name, and
+    on_pick(suggestion) is called. Escape closes the list.
+    """
+    state = {"popup": None, "listbox": None, "items": []}
+
+    def close(*_):
+        if state["popup"] is not None:
+            state["popup"].destroy()
+        state.update(popup=None, listbox=None, items=[])
+
+    def pick(item):
+        entry.delete(0, "end")
+        entry.insert(0, item["p_no"])
+        if name_entry is not None and item.get("name"):
+            name_entry.delete(0, "end")
+            name_entry.insert(0, item["name"])
+        close()
+        if on_pick:
+            on_pick(item)
+
+    def show(items):
+        if state["popup"] is None:
+            popup = tk.Toplevel(entry)
+            popup.wm_overrideredirect(True)
+            lb = tk.Listbox(popup, height=min(limit, 10), activestyle="dotbox", exportselection=False)
+            lb.pack(fill="both", expand=True)
+            lb.bind("<ButtonRelease-1>", lambda e: state["items"] and lb.curselection()
+                    and pick(state["items"][lb.curselection()[0]]))
+            state.update(popup=popup, listbox=lb)
+        lb = state["listbox"]
+        lb.delete(0, "end")
+        for it in items:
+            lb.insert("end", f"{it['p_no']}  {it['name'] or ''}" + (f"  [{it['ticket_no']}]" if it["ticket_no"] else ""))
+        lb.selection_set(0)
+        lb.configure(width=max(30, entry.winfo_width() // 7))
+        state["items"] = items
+        state["popup"].geometry(f"+{entry.winfo_rootx()}+{entry.winfo_rooty() + entry.winfo_height()}")
+
+    def on_key(event):
+        if event.keysym in ("Up", "Down", "Return", "Tab", "Escape"):
+            return
+        items = suggest(entry.get(), limit)
+        if items:
+            show(items)
+        else:
+            close()
+
+    def move(delta):
+        lb = state["listbox"]
+        if lb is None or not state["items"]:
+            return
+        cur = lb.curselection()
+        i = max(0, min(len(state["items"]) - 1, (cur[0] if cur else -1) + delta))
+        lb.selection_clear(0, "end")
+        lb.selection_set(i)
+        lb.see(i)
+        return "break"
+
+    def on_enter(event):
+        lb = state["listbox"]
+        if lb is None or not state["items"]:
+            return
+        cur = lb.curselection()
+        pick(state["items"][cur[0] if cur else 0])
+        return "break"
+
+    entry.bind("<KeyRelease>", on_key, add="+")
+    entry.bind("<Down>", lambda e: move(1), add="+")
+    entry.bind("<Up>", lambda e: move(-1), add="+")
+    entry.bind("<Return>", on_enter, add="+")
+    entry.bind("<Tab>", on_enter, add="+")
+    entry.bind("<Escape>", close, add="+")
+    entry.bind("<FocusOut>", lambda e: entry.after(150, close), add="+")
+    entry.bind("<Destroy>", close, add="+")
+    return close
+
+
+def ask_employee(parent, title="P. No", prompt="Enter P. No or ticket (or type a name and pick):"):
+    """
+    Modal dialog with an autocompleting entry. Returns (p_no, name) of a validated employee,
+    or None if cancelled.
+    """
+    result = {}
+    win = tk.Toplevel(parent)
+    win.title(title)
+    win.transient(parent)
+    win.resizable(False, False)
+    ttk.Label(win, text=prompt).pack(anchor="w", padx=10, pady=(10, 2))
+    e = ttk.Entry(win, width=32)
+    e.pack(fill="x", padx=10)
+    info = ttk.Label(win, text="")
+    info.pack(anchor="w", padx=10, pady=2)
+
+    def ok(*_):
+        try:
+            p_no = validate_p_no(e.get())
+        except ValueError as ex:
+            messagebox.showerror("Unknown employee", str(ex), parent=win)
+            return
+        result["value"] = (p_no, employee.get_employee_name(p_no))
+        win.destroy()
+
+    attach_autocomplete(e, on_pick=lambda item: info.configure(text=f"{item['p_no']} - {item['name'] or ''}"))
+    # bound after the autocomplete: Return picks from an open list first (its handler breaks),
+    # a second Return confirms
+    e.bind("<Return>", ok, add="+")
+    btns = ttk.Frame(win)
+    btns.pack(pady=8)
+    ttk.Button(btns, text="OK", command=ok).pack(side="left", padx=4)
+    ttk.Button(btns, text="Cancel", command=win.destroy).pack(side="left", padx=4)
+    e.focus_set()
+    win.grab_set()
+    win.wait_window()
+    return result.get("value")
@@ -3,12 +3,18 @@ import pandas as pd
 import os
 
 SUPPORTED_EXT = [".csv", ".xls", ".xlsx", ".json"]
+# same order as db.ensure_date_str
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d")
 
 def load_dataframe_from_file(path):
     """
     Loads file into pandas DataFrame. Supports CSV, Excel (.xls/.xlsx), JSON.
+    A DataFrame is returned as-is, so uploaders also accept a frame parsed ahead of time
+    (see import_preview.start_full_parse).
     Returns DataFrame.
     """
+    if isinstance(path, pd.DataFrame):
+        return path
     _, ext = os.path.splitext(path.lower())
     if ext == ".csv":
         return pd.read_csv(path)
@@ -36,6 +42,59 @@ def map_columns_case_insensitive(df, required_cols):
             mapping[rc] = candidates.get(key)
     return mapping
 
+def normalize_id_series(series):
+    """
+    Convert an id column (p_no, ticket_no) to stripped strings.
+    Whole-number floats - which pandas produces for numeric columns with blanks - lose
+    their '.0' so 1001.0 and 1001 map to the same p_no. Missing values stay None.
+    """
+    s = pd.Series(series)
+    out = pd.Series([None] * len(s), index=s.index, dtype=object)
+    ok = s.notna()
+    vals = s[ok]
+    if pd.api.types.is_float_dtype(vals):
+        whole = (vals % 1 == 0)
+        out[whole[whole].index] = vals[whole].astype("int64").astype(str)
+        out[whole[~whole].index] = vals[~whole].astype(str)
+    else:
+        out[ok] = vals.map(lambda v: str(int(v)) if isinstance(v, float) and v.is_integer() else str(v).strip())
+    return out
+
+def normalize_date_series(series):
+    """
+    Column-wise equivalent of db.ensure_date_str for a whole pandas Series.
+    Returns an object Series of 'YYYY-MM-DD' strings (None for missing / empty values).
+    Strings are tried against DATE_FORMATS in order, date/datetime values are formatted directly,
+    anything unparseable is kept as its string form (like ensure_date_str's fallback).
+    """
+    s = pd.Series(series)
+    out = pd.Series([None] * len(s), index=s.index, dtype=object)
+    if s.empty:
+        return out
+    if pd.api.types.is_datetime64_any_dtype(s):
+        ok = s.notna()
+        out[ok] = s[ok].dt.strftime("%Y-%m-%d")
+        return out
+    present = s.notna() & (s.astype(str) != "")
+    is_str = present & s.map(lambda v: isinstance(v, str))
+    is_date = present & s.map(lambda v: hasattr(v, "strftime"))
+    other = present & ~is_str & ~is_date
+    if is_date.any():
+        out[is_date] = pd.to_datetime(s[is_date], errors="coerce").dt.strftime("%Y-%m-%d")
+    pending = s[is_str]
+    for fmt in DATE_FORMATS:
+        if pending.empty:
+            break
+        parsed = pd.to_datetime(pending, format=fmt, errors="coerce")
+        hit = parsed.notna()
+        out[hit[hit].index] = parsed[hit].dt.strftime("%Y-%m-%d")
+        pending = pending[~hit]
+    if not pending.empty:
+        out[pending.index] = pending
+    if other.any():
+        out[other] = s[other].astype(str)
+    return out
+
 def save_dataframe_to_file(df, path):
     """
     Save a pandas DataFrame to CSV / Excel / JSON depending on extension.
@@ -51,3 +110,53 @@ def save_dataframe_to_file(df, path):
         df.to_json(path, orient="records", date_format="iso")
     else:
         raise ValueError("Unsupported export extension. Use .csv, .xls/.xlsx or .json")
+
+def stream_dataframe_to_file(df, path, chunk_rows=5000):
+    """
+    Save a (wide) DataFrame to CSV / XLSX without building the file in memory: CSV is written
+    chunk_rows at a time, XLSX through an openpyxl write-only workbook row by row.
+    Other extensions fall back to save_dataframe_to_file(). Returns the number of rows written.
+    """
+    if df is None:
+        raise ValueError("DataFrame is None")
+    _, ext = os.path.splitext(path.lower())
+    if ext == ".csv":
+        df.to_csv(path, index=False, chunksize=chunk_rows)
+    elif ext == ".xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append([str(c) for c in df.columns])
+        # plain Python values: numpy scalars are not cell types openpyxl accepts
+        for row in df.astype(object).itertuples(index=False, name=None):
+            ws.append(row)
+        wb.save(path)
+    else:
+        save_dataframe_to_file(df, path)
+    return len(df)
+
+def save_dataframe_chunks_to_file(chunks, path, columns=None):
+    """
+    Save an iterable of DataFrames as one file. CSV is written incrementally (header once,
+    then appended chunk by chunk); Excel / JSON need the whole frame and are concatenated.
+    Returns the number of rows written (0 -> nothing written, file not created).
+    """
+    _, ext = os.path.splitext(path.lower())
+    if ext not in (".csv", ".xls", ".xlsx", ".json"):
+        raise ValueError("Unsupported export extension. Use .csv, .xls/.xlsx or .json")
+    total = 0
+    if ext == ".csv":
+        for chunk in chunks:
+            if chunk is None or chunk.empty:
+                continue
+            chunk.to_csv(path, index=False, mode="w" if total == 0 else "a", header=(total == 0))
+            total += len(chunk)
+        return total
+    frames = [c for c in chunks if c is not None and not c.empty]
+    if not frames:
+        return 0
+    df = pd.concat(frames, ignore_index=True)
+    if columns:
+        df = df[columns]
+    save_dataframe_to_file(df, path)
+    return len(df)
@@ -0,0 +1,248 @@
+# writer.py
+"""
+Single writer for the application's mutations: single-row edits, bulk uploads, archive moves, sync.
+
+Every mutating function hands its statements to submit() as an op: a callable op(cur)
+that runs inside a transaction it must not commit. One daemon thread owns a long-lived
+connection and works the queue:
+- ops queued together are applied in one BEGIN IMMEDIATE ... COMMIT (group commit), each
+  inside its own SAVEPOINT, so a failing op is rolled back and reported on its own future
+  without taking the rest of the group with it
+- while submissions keep arriving the group is held open for up to GROUP_WINDOW_SECONDS;
+  a lone write is committed straight away
+- a future resolves only after the commit, so a result means the write is durable
+
+Bulk uploads and rollback_batch() are ops too: one op per upload, so an upload still
+commits or rolls back as a unit (see import_batch). Writes that need their own connection
+(archive moves, sync pulls and the dashboard rebuild attach other databases) go through
+call(): they run on the same thread between groups, archive moves one batch per call.
+
+Only this thread takes the write lock for the app's writes, so GUI actions, background
+jobs and loops no longer race each other into "database is locked". Other processes
+(a second app instance, sync.py run by hand) are waited for up to db.BUSY_TIMEOUT_SECONDS.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import db
+
+# how long a group stays open while more ops keep arriving
+GROUP_WINDOW_SECONDS = 0.002
+MAX_GROUP_OPS = 1000
+
+_queue = queue.Queue()
+_state = {"thread": None, "conn": None, "db_file": None}
+_start_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"ops": 0, "failed": 0, "groups": 0, "largest_group": 0, "write_seconds": 0.0}
+# sentinel that stops the writer thread once everything queued before it is written
+_STOP = object()
+
+
+def _ensure_started():
+    with _start_lock:
+        t = _state["thread"]
+        if t is None or not t.is_alive():
+            t = threading.Thread(target=_run, name="db-writer", daemon=True)
+            _state["thread"] = t
+            t.start()
+
+
+def submit(op, after=None):
+    """
+    Queue op(cur) for the writer thread; returns a concurrent.futures.Future with op's return
+    value (or its exception). after(result), if given, runs on the writer thread once the group
+    has committed and before the future resolves (e.g. to update an in-memory cache).
+    The op runs against db.DB_FILE as it is at submit time.
+    """
+    return _enqueue(op, after, alone=False)
+
+
+def call(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the writer thread, outside any group, and return a Future.
+    For writes that manage their own connection and transaction (fn sees db.DB_FILE as it
+    is when it runs).
+    """
+    return _enqueue(lambda: fn(*args, **kwargs), None, alone=True)
+
+
+def _enqueue(op, after, alone):
+    fut = Future()
+    if threading.current_thread() is _state["thread"]:
+        # an op (or after hook) writing again: run inline instead of waiting on ourselves
+        _run_inline(op, after, alone, fut)
+        return fut
+    _ensure_started()
+    _queue.put((db.DB_FILE, op, after, fut, alone))
+    return fut
+
+
+def execute(op, after=None, wait=True):
+    """submit() and, with wait=True, block for the result (raising op's exception)."""
+    fut = submit(op, after)
+    return fut.result() if wait else fut
+
+
+def flush(timeout=None):
+    """Block until everything submitted so far is committed."""
+    submit(lambda cur: None).result(timeout)
+
+
+def _run_inline(op, after, alone, fut):
+    try:
+        if alone:
+            result = op()
+        else:
+            with db.get_conn() as conn:
+                result = op(conn.cursor())
+                conn.commit()
+        if after is not None:
+            after(result)
+    except BaseException as e:
+        fut.set_exception(e)
+    else:
+        fut.set_result(result)
+
+
+def _connection(db_file):
+    if _state["conn"] is None or _state["db_file"] != db_file:
+        if _state["conn"] is not None:
+            _state["conn"].close()
+        conn = db._connect(db_file)
+        # transactions are issued explicitly below
+        conn.isolation_level = None
+        conn.execute("PRAGMA foreign_keys = ON")
+        _state.update(conn=conn, db_file=db_file)
+    return _state["conn"]
+
+
+def _next_group(first):
+    """
+    first plus whatever else is queued for the same database, up to MAX_GROUP_OPS.
+    Returns (group, item that ended it early or None); call() items always stand alone.
+    """
+    group = [first]
+    deadline = time.monotonic() + GROUP_WINDOW_SECONDS
+    while len(group) < MAX_GROUP_OPS:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            # only linger while ops are still coming in
+            remaining = deadline - time.monotonic()
+            if len(group) == 1 or remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if item is _STOP or item[4] or item[0] != first[0]:
+            return group, item
+        group.append(item)
+    return group, None
+
+
+def _apply(group):
+    """Write one group in a single transaction; resolve every future after the commit."""
+    db_file = group[0][0]
+    done = []
+    try:
+        conn = _connection(db_file)
+        cur = conn.cursor()
+        t0 = time.perf_counter()
+        cur.execute("BEGIN IMMEDIATE")
+        for _, op, after, fut, _ in group:
+            if not fut.set_running_or_notify_cancel():
+                continue
+            cur.execute("SAVEPOINT op")
+            try:
+                result = op(cur)
+            except BaseException as e:
+                cur.execute("ROLLBACK TO op")
+                cur.execute("RELEASE op")
+                fut.set_exception(e)
+                with _stats_lock:
+                    _stats["failed"] += 1
+                continue
+            cur.execute("RELEASE op")
+            done.append((after, fut, result))
+        cur.execute("COMMIT")
+        elapsed = time.perf_counter() - t0
+    except BaseException as e:
+        # BEGIN or COMMIT failed: nothing of this group was written
+        try:
+            if _state["conn"] is not None and _state["conn"].in_transaction:
+                _state["conn"].execute("ROLLBACK")
+        except Exception:
+            pass
+        for _, _, _, fut, _ in group:
+            if not fut.done():
+                fut.set_exception(e)
+        return
+    with _stats_lock:
+        _stats["ops"] += len(done)
+        _stats["groups"] += 1
+        _stats["largest_group"] = max(_stats["largest_group"], len(group))
+        _stats["write_seconds"] += elapsed
+    for after, fut, result in done:
+        try:
+            if after is not None:
+                after(result)
+        except BaseException as e:
+            # committed, but the follow-up failed: report it to the caller
+            fut.set_exception(e)
+            continue
+        fut.set_result(result)
+
+
+def _run_alone(item):
+    fut = item[3]
+    if not fut.set_running_or_notify_cancel():
+        return
+    try:
+        result = item[1]()
+    except BaseException as e:
+        fut.set_exception(e)
+    else:
+        fut.set_result(result)
+
+
+def _run():
+    pending = None
+    while True:
+        item = pending if pending is not None else _queue.get()
+        pending = None
+        if item is _STOP:
+            break
+        if item[4]:
+            _run_alone(item)
+            continue
+        group, pending = _next_group(item)
+        _apply(group)
+    if _state["conn"] is not None:
+        _state["conn"].close()
+    _state.update(conn=None, db_file=None)
+
+
+def shutdown(timeout=5.0):
+    """Write everything still queued, then stop the thread (started again by the next submit)."""
+    t = _state["thread"]
+    if t is None or not t.is_alive():
+        return
+    _queue.put(_STOP)
+    t.join(timeout)
+
+
+def writer_stats():
+    """Totals: ops written, failed ops, groups committed, largest group, mean ops per group."""
+    with _stats_lock:
+        s = dict(_stats)
+    s["ops_per_group"] = round(s["ops"] / s["groups"], 2) if s["groups"] else 0.0
+    s["queued"] = _queue.qsize()
+    s["write_seconds"] = round(s["write_seconds"], 3)
+    return s
+
+
+atexit.register(shutdown)